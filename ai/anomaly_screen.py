@@ -0,0 +1,122 @@
+"""
+Supply Chain Analytics — Anomaly Pre-screen
+Evaluates the anomaly alert's checks locally, vectorized over the full
+history, so Claude is only called to narrate when something was found:
+  - rules:        suppliers below SUPPLIER_ON_TIME_MIN % on-time,
+                  carriers below CARRIER_ON_TIME_MIN %
+  - MoM growth:   robust z-score (median / MAD) of each month's revenue
+                  growth against all months (VW_MOM_GROWTH)
+  - daily revenue: deviation from a trailing rolling median, scaled by the
+                  trailing median absolute deviation
+
+Input is the result of report_generator.ANOMALY_QUERIES (name → DataFrame).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+SUPPLIER_ON_TIME_MIN = float(os.environ.get("ANOMALY_SUPPLIER_ON_TIME_MIN", "80"))
+CARRIER_ON_TIME_MIN  = float(os.environ.get("ANOMALY_CARRIER_ON_TIME_MIN", "85"))
+MOM_Z_MAX            = float(os.environ.get("ANOMALY_MOM_Z_MAX", "3.5"))
+DAILY_Z_MAX          = float(os.environ.get("ANOMALY_DAILY_Z_MAX", "4"))
+DAILY_WINDOW_DAYS    = int(os.environ.get("ANOMALY_DAILY_WINDOW_DAYS", "28"))
+# Statistical checks run over all history; only recent points are reported
+LOOKBACK_MONTHS = 3
+LOOKBACK_DAYS   = 7
+
+MAD_TO_SIGMA = 0.6745   # robust z = 0.6745 · (x − median) / MAD
+
+
+def _finding(rule, subject, metric, value, expected, score, severity) -> dict:
+    return {"rule": rule, "subject": str(subject), "metric": metric,
+            "value": None if pd.isna(value) else round(float(value), 2),
+            "expected": None if pd.isna(expected) else round(float(expected), 2),
+            "score": None if score is None or pd.isna(score) else round(float(score), 2),
+            "severity": severity}
+
+
+def threshold_findings(rollup: pd.DataFrame) -> list:
+    """Suppliers and carriers under their on-time floor (all of them, not a top-N)."""
+    out = []
+    for grain, present, col, floor in (
+            ("supplier", "delivered_shipments", "supplier_on_time_pct", SUPPLIER_ON_TIME_MIN),
+            ("carrier",  "tracked_shipments",   "carrier_on_time_pct",  CARRIER_ON_TIME_MIN)):
+        rows = rollup[(rollup["grain"] == grain) & (rollup[present] > 0)]
+        low  = rows[rows[col] < floor].sort_values(col)
+        out += [_finding(f"{grain}_on_time", key, "on_time_pct", pct, floor, None,
+                         "high" if pct < floor - 5 else "medium")
+                for key, pct in zip(low["key"], low[col])]
+    return out
+
+
+def robust_z(values: pd.Series) -> pd.Series:
+    median = values.median()
+    mad = (values - median).abs().median()
+    if not mad:
+        return pd.Series(0.0, index=values.index)
+    return MAD_TO_SIGMA * (values - median) / mad
+
+
+def mom_findings(mom: pd.DataFrame) -> list:
+    """Months whose revenue growth is an outlier against every month on record."""
+    mom = mom.dropna(subset=["mom_revenue_growth_pct"]).sort_values("month")
+    if len(mom) < 6:
+        return []
+    growth = mom["mom_revenue_growth_pct"].astype(float)
+    z = robust_z(growth)
+    recent = mom.index.isin(mom.index[-LOOKBACK_MONTHS:])
+    hits = mom[recent & (z.abs() > MOM_Z_MAX).to_numpy()]
+    return [_finding("mom_revenue_growth", pd.Timestamp(m).strftime("%b %Y"), "mom_revenue_growth_pct",
+                     g, growth.median(), z[i], "high" if abs(z[i]) > 2 * MOM_Z_MAX else "medium")
+            for i, m, g in zip(hits.index, hits["month"], hits["mom_revenue_growth_pct"])]
+
+
+def daily_findings(daily: pd.DataFrame) -> list:
+    """Recent days far from their trailing baseline (days without sales count as 0)."""
+    if daily.empty:
+        return []
+    s = daily.assign(day=pd.to_datetime(daily["day"])).set_index("day")["revenue"].astype(float)
+    s = s.reindex(pd.date_range(s.index.min(), s.index.max(), freq="D"), fill_value=0.0)
+
+    # Baselines use only earlier days, so a spike cannot hide itself
+    past     = s.shift(1).rolling(DAILY_WINDOW_DAYS, min_periods=DAILY_WINDOW_DAYS // 2)
+    baseline = past.median()
+    resid    = (s - baseline).abs()
+    scale    = resid.shift(1).rolling(DAILY_WINDOW_DAYS, min_periods=DAILY_WINDOW_DAYS // 2).median()
+    z = MAD_TO_SIGMA * (s - baseline) / scale.replace(0, np.nan)
+
+    recent = z.iloc[-LOOKBACK_DAYS:]
+    hits = recent[recent.abs() > DAILY_Z_MAX]
+    return [_finding("daily_revenue", day.date().isoformat(), "revenue", s[day], baseline[day], zv,
+                     "high" if abs(zv) > 2 * DAILY_Z_MAX else "medium")
+            for day, zv in hits.items()]
+
+
+def risk_level(findings: list) -> str:
+    if any(f["severity"] == "high" for f in findings):
+        return "HIGH"
+    return "MEDIUM" if findings else "LOW"
+
+
+def context(frames) -> dict:
+    """Findings plus the headline KPIs — the anomaly alert's input."""
+    rollup = frames["kpi_rollup"]
+    findings = (threshold_findings(rollup) + mom_findings(frames["mom_history"])
+                + daily_findings(frames["daily_revenue"]))
+    total = rollup[rollup["grain"] == "total"]
+    kpis = total[["revenue", "margin_pct", "total_orders"]].iloc[0].to_dict() if len(total) else {}
+    return {"risk_level": risk_level(findings), "findings": findings, "kpis": kpis}
+
+
+def all_clear(data: dict) -> str:
+    """The alert when the screen found nothing — no model call needed."""
+    return (
+        "## Anomaly Scan — no findings\n"
+        f"- All suppliers at or above {SUPPLIER_ON_TIME_MIN:.0f}% on-time\n"
+        f"- All carriers at or above {CARRIER_ON_TIME_MIN:.0f}% on-time\n"
+        f"- Month-over-month revenue growth within {MOM_Z_MAX:g} robust σ of its history\n"
+        f"- Daily revenue over the last {LOOKBACK_DAYS} days within {DAILY_Z_MAX:g} robust σ "
+        f"of its {DAILY_WINDOW_DAYS}-day baseline\n"
+        f"- Overall risk level: {data.get('risk_level', 'LOW')}\n"
+    )
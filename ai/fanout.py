@@ -0,0 +1,220 @@
+"""
+Supply Chain Analytics — Fan-out Briefings
+One Claude briefing per region, supplier and customer segment. Each item
+builds its own scoped KPI snapshot (the report's SNAPSHOT_QUERIES with a
+scope predicate) and then its briefing, all on one asyncio event loop:
+
+    scope values ──► snapshot (≤ FANOUT_QUERY_CONCURRENCY at once)
+                 ──► briefing (≤ FANOUT_LLM_CONCURRENCY at once)
+                 ──► reports/fanout_<date>/<scope>_<value>.md
+
+A rate-limited or overloaded response pauses every worker until the
+server's retry-after (or an exponential backoff) has passed, and one failed
+item is recorded in the index without stopping the others.
+
+Usage:
+    python ai/fanout.py                          # region, supplier and segment
+    python ai/fanout.py --scopes region,segment
+    python ai/fanout.py --stub-llm               # offline client, no API key
+"""
+import os
+import re
+import sys
+import time
+import random
+import asyncio
+import argparse
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from etl import tracing, warehouse
+from ai import report_generator as rg
+
+QUERY_CONCURRENCY = int(os.environ.get("FANOUT_QUERY_CONCURRENCY", "8"))
+LLM_CONCURRENCY   = int(os.environ.get("FANOUT_LLM_CONCURRENCY", "8"))
+MAX_RETRIES       = int(os.environ.get("FANOUT_MAX_RETRIES", "5"))
+BACKOFF_BASE_S    = 1.0
+BACKOFF_MAX_S     = 60.0
+
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "reports")
+
+
+# ─────────────────────────────────────────
+# SCOPES
+# ─────────────────────────────────────────
+def scope_values(conn, scopes) -> list:
+    """(scope, value) for every distinct value of each scope column, in one query."""
+    sql = " UNION ALL ".join(
+        f"SELECT DISTINCT '{scope}' AS scope, {rg.SCOPES[scope]} AS value "
+        f"FROM ORDERS WHERE {rg.SCOPES[scope]} IS NOT NULL"
+        for scope in scopes)
+    df = warehouse.run_query(conn, sql + " ORDER BY 1, 2")
+    return list(df.itertuples(index=False, name=None))
+
+
+def slug(value) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", str(value).lower()).strip("-") or "blank"
+
+
+# ─────────────────────────────────────────
+# BACKOFF
+# ─────────────────────────────────────────
+def retry_after(exc):
+    """Seconds to wait before retrying exc (None = backoff), or False if it is not retryable."""
+    import anthropic
+    if isinstance(exc, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+        return None
+    if isinstance(exc, anthropic.APIStatusError) and exc.status_code in (429, 500, 502, 503, 529):
+        try:
+            return float(exc.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+    return False
+
+
+class RateGate:
+    """Shared pause: once any call is throttled, no worker calls again before `until`."""
+
+    def __init__(self):
+        self.until = 0.0
+        self.waits = 0
+
+    async def wait(self):
+        delay = self.until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def hold(self, seconds: float):
+        self.until = max(self.until, time.monotonic() + seconds)
+        self.waits += 1
+
+
+async def with_backoff(fn, gate: RateGate, max_retries: int = MAX_RETRIES):
+    for attempt in range(max_retries + 1):
+        await gate.wait()
+        try:
+            return await asyncio.to_thread(fn)
+        except Exception as e:
+            wait = retry_after(e)
+            if wait is False or attempt == max_retries:
+                raise
+            if wait is None:
+                wait = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt) * random.uniform(0.5, 1.0)
+            gate.hold(wait)
+
+
+# ─────────────────────────────────────────
+# PIPELINE
+# ─────────────────────────────────────────
+async def briefing(pool, client, scope, value, sems, gate, out_dir, use_cache) -> dict:
+    """Snapshot → briefing → file for one scope value. Never raises."""
+    item = {"scope": scope, "value": value, "file": None, "error": None}
+    t0 = time.perf_counter()
+    try:
+        with tracing.span("fanout.briefing", scope=scope, value=str(value)):
+            async with sems["query"]:
+                batch = await asyncio.to_thread(warehouse.fetch_many, pool, rg.snapshot_queries(scope, value))
+            data = {"scope": {scope: value}, **rg.snapshot_from_frames(batch.frames)}
+            item["snapshot_s"] = round(time.perf_counter() - t0, 2)
+
+            async with sems["llm"]:
+                text = await with_backoff(lambda: rg.generate_briefing(data, client, use_cache), gate)
+
+            path = os.path.join(out_dir, f"{scope}_{slug(value)}.md")
+            with open(path, "w") as f:
+                f.write(f"# {scope.title()} Briefing — {value} — {date.today()}\n\n")
+                f.write(text)
+            item["file"] = os.path.basename(path)
+    except Exception as e:
+        item["error"] = f"{type(e).__name__}: {e}"
+    item["total_s"] = round(time.perf_counter() - t0, 2)
+    return item
+
+
+def write_index(items, out_dir, wall_s) -> str:
+    path = os.path.join(out_dir, "index.md")
+    with open(path, "w") as f:
+        f.write(f"# Supply Chain Briefings — {date.today()}\n\n")
+        f.write(f"{sum(not i['error'] for i in items)}/{len(items)} generated in {wall_s:.1f}s\n\n")
+        f.write("| Scope | Value | Briefing | Seconds |\n|---|---|---|---|\n")
+        for i in items:
+            cell = f"[{i['file']}]({i['file']})" if i["file"] else f"FAILED — {i['error']}"
+            f.write(f"| {i['scope']} | {i['value']} | {cell} | {i['total_s']} |\n")
+    return path
+
+
+async def fan_out(pool, client, scopes=tuple(rg.SCOPES), use_cache: bool = True,
+                  query_concurrency: int = QUERY_CONCURRENCY,
+                  llm_concurrency: int = LLM_CONCURRENCY) -> dict:
+    loop = asyncio.get_running_loop()
+    # asyncio.to_thread uses the default executor; size it for both stages
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=query_concurrency + llm_concurrency,
+                                                 thread_name_prefix="fanout"))
+    t0 = time.perf_counter()
+    values = await asyncio.to_thread(pool.run, scope_values, scopes)
+
+    out_dir = os.path.join(REPORTS_DIR, f"fanout_{date.today().isoformat()}")
+    os.makedirs(out_dir, exist_ok=True)
+    sems = {"query": asyncio.Semaphore(query_concurrency), "llm": asyncio.Semaphore(llm_concurrency)}
+    gate = RateGate()
+    items = await asyncio.gather(*(briefing(pool, client, scope, value, sems, gate, out_dir, use_cache)
+                                   for scope, value in values))
+    wall_s = time.perf_counter() - t0
+    return {"items": items, "wall_s": wall_s, "throttled": gate.waits,
+            "index": write_index(items, out_dir, wall_s)}
+
+
+# ─────────────────────────────────────────
+# MAIN
+# ─────────────────────────────────────────
+@tracing.traced("fanout")
+def main(scopes=tuple(rg.SCOPES), use_cache: bool = True, stub_llm: bool = False):
+    if stub_llm:
+        from ai.stub_client import StubClient
+        client = StubClient()
+    else:
+        # Retries are ours (with_backoff), shared across workers through RateGate
+        import anthropic
+        client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"], max_retries=0)
+
+    print(f"\n🌐  Fan-out briefings by {', '.join(scopes)}")
+    pool = warehouse.ConnectionPool(size=QUERY_CONCURRENCY * len(rg.SNAPSHOT_QUERIES))
+    try:
+        result = asyncio.run(fan_out(pool, client, scopes, use_cache))
+    finally:
+        pool.close()
+
+    items = result["items"]
+    for i in sorted(items, key=lambda i: -i["total_s"]):
+        mark = "✅" if not i["error"] else "❌"
+        print(f"   {mark}  {i['scope']:<9} {str(i['value'])[:28]:<28} {i['total_s']:>6.1f}s"
+              + (f"  {i['error']}" if i["error"] else ""))
+    failed  = sum(bool(i["error"]) for i in items)
+    slowest = max((i["total_s"] for i in items), default=0.0)
+    throttled = f", throttled {result['throttled']}×" if result["throttled"] else ""
+    print(f"\n⏱️   {len(items)} briefings in {result['wall_s']:.1f}s "
+          f"(slowest {slowest:.1f}s, serial sum {sum(i['total_s'] for i in items):.1f}s{throttled})")
+    print(f"💾  Index: {os.path.relpath(result['index'])}")
+    if failed:
+        print(f"⚠️   {failed} briefing{'s' if failed != 1 else ''} failed — see the index")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate one Claude briefing per scope value")
+    parser.add_argument("--scopes", default=",".join(rg.SCOPES),
+                        help=f"Comma-separated subset of: {', '.join(rg.SCOPES)}")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call Claude (skip the response cache)")
+    parser.add_argument("--stub-llm", action="store_true",
+                        help="Use the offline stand-in client instead of the Anthropic API")
+    args = parser.parse_args()
+    unknown = set(args.scopes.split(",")) - set(rg.SCOPES)
+    if unknown:
+        parser.error(f"unknown scope(s): {', '.join(sorted(unknown))}")
+    main(tuple(args.scopes.split(",")), use_cache=not args.no_cache, stub_llm=args.stub_llm)
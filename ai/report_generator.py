@@ -2,114 +2,234 @@
 Supply Chain Analytics — AI Report Generator
 Uses Claude to generate natural-language weekly business intelligence reports
 from Snowflake data summaries.
+
+Credentials are read and anthropic / the Snowflake connector imported only
+when a report is actually generated, so the dashboard and the other tools
+can import the prompts and queries without either.
 """
 import os
 import sys
 import json
+import time
+import hashlib
+import argparse
 from datetime import date, datetime
-from typing import Optional
+from typing import TYPE_CHECKING, Iterator, Optional
 
-import anthropic
-import snowflake.connector
-import pandas as pd
 from dotenv import load_dotenv
 
 load_dotenv()
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from etl import tracing
+from etl.warehouse import connect, fetch_many
+from ai import response_cache, snapshot_encoding
+from ai.response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    import anthropic
 
 # ─────────────────────────────────────────
 # CONFIG
 # ─────────────────────────────────────────
-SNOWFLAKE_CONFIG = {
-    "account":   os.environ["SNOWFLAKE_ACCOUNT"],
-    "user":      os.environ["SNOWFLAKE_USER"],
-    "password":  os.environ["SNOWFLAKE_PASSWORD"],
-    "warehouse": os.environ.get("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH"),
-    "database":  os.environ.get("SNOWFLAKE_DATABASE", "SUPPLY_CHAIN"),
-    "schema":    os.environ.get("SNOWFLAKE_SCHEMA", "ANALYTICS"),
-}
-
 CLAUDE_MODEL = "claude-sonnet-4-6"
 
 
 # ─────────────────────────────────────────
 # DATA FETCHERS
 # ─────────────────────────────────────────
-def _run_query(conn, sql: str) -> pd.DataFrame:
-    cur = conn.cursor()
-    cur.execute(sql)
-    cols = [desc[0].lower() for desc in cur.description]
-    rows = cur.fetchall()
-    cur.close()
-    return pd.DataFrame(rows, columns=cols)
-
-
-def fetch_kpi_snapshot(conn) -> dict:
-    """Pull the key numbers needed to fill a report context."""
-
-    revenue_sql = """
+# Every query reads base tables only, so the same SQL also runs on the
+# dashboard's local working set (see streamlit/app.py, AI Report tab).
+#
+# kpi_rollup computes the overall KPIs and the per-product, per-region,
+# per-supplier and per-carrier aggregates in one pass over ORDERS ⟕ SHIPMENTS
+# with GROUPING SETS; snapshot_from_frames() picks the top-N rows. Each
+# measure carries the filter its section used to apply in WHERE:
+#   total / product / region — delivered orders
+#   supplier                 — shipments of delivered orders
+#   carrier                  — shipments with a delivery outcome (any status)
+# SHIPMENTS holds at most one row per order, so the join never fans out.
+#
+# {scope} is empty for the global report; snapshot_queries() fills it with a
+# predicate on ORDERS for the per-region / supplier / segment briefings.
+_SNAPSHOT_SQL = {
+    "kpi_rollup": """
         SELECT
-            ROUND(SUM(revenue),2)                                             AS gross_revenue,
-            ROUND(SUM(cogs),2)                                                AS total_cogs,
-            ROUND(SUM(revenue-cogs),2)                                        AS gross_profit,
-            ROUND(SUM(revenue-cogs)/NULLIF(SUM(revenue),0)*100,2)            AS margin_pct,
-            COUNT(DISTINCT order_id)                                          AS total_orders,
-            ROUND(AVG(revenue),2)                                             AS avg_order_value
+            CASE WHEN GROUPING(o.product_name)  = 0 THEN 'product'
+                 WHEN GROUPING(o.region)        = 0 THEN 'region'
+                 WHEN GROUPING(o.supplier_name) = 0 THEN 'supplier'
+                 WHEN GROUPING(sh.carrier)      = 0 THEN 'carrier'
+                 ELSE 'total' END                                                   AS grain,
+            COALESCE(o.product_name, o.region, o.supplier_name, sh.carrier)         AS key,
+
+            COUNT(DISTINCT CASE WHEN o.status='Delivered' THEN o.order_id END)      AS total_orders,
+            ROUND(SUM(CASE WHEN o.status='Delivered' THEN o.revenue END),2)         AS revenue,
+            ROUND(SUM(CASE WHEN o.status='Delivered' THEN o.cogs END),2)            AS total_cogs,
+            ROUND(SUM(CASE WHEN o.status='Delivered' THEN o.revenue-o.cogs END),2)  AS gross_profit,
+            ROUND(SUM(CASE WHEN o.status='Delivered' THEN o.revenue-o.cogs END)
+                  /NULLIF(SUM(CASE WHEN o.status='Delivered' THEN o.revenue END),0)*100,2) AS margin_pct,
+            ROUND(AVG(CASE WHEN o.status='Delivered' THEN o.revenue END),2)         AS avg_order_value,
+
+            COUNT(CASE WHEN o.status='Delivered' THEN sh.shipment_id END)           AS delivered_shipments,
+            ROUND(AVG(CASE WHEN o.status='Delivered' THEN sh.delay_days END),2)     AS avg_delay,
+            ROUND(SUM(CASE WHEN o.status='Delivered' AND sh.on_time THEN 1 ELSE 0 END)*100.0
+                  /NULLIF(COUNT(CASE WHEN o.status='Delivered' THEN sh.shipment_id END),0),1) AS supplier_on_time_pct,
+
+            COUNT(sh.on_time)                                                       AS tracked_shipments,
+            ROUND(SUM(CASE WHEN sh.on_time THEN 1 ELSE 0 END)*100.0
+                  /NULLIF(COUNT(sh.on_time),0),1)                                   AS carrier_on_time_pct,
+            ROUND(AVG(CASE WHEN sh.on_time IS NOT NULL THEN sh.shipment_cost END),2) AS avg_cost
+        FROM ORDERS o
+        LEFT JOIN SHIPMENTS sh ON o.order_id=sh.order_id
+        {scope}
+        GROUP BY GROUPING SETS ((), (o.product_name), (o.region), (o.supplier_name), (sh.carrier))
+    """,
+
+    # Same numbers as VW_MOM_GROWTH, computed from ORDERS
+    "mom_trend": """
+        WITH monthly AS (
+            SELECT DATE_TRUNC('month', order_date)::DATE AS month,
+                   SUM(revenue)                          AS revenue
+            FROM ORDERS o
+            WHERE status='Delivered' {scope}
+            GROUP BY 1
+        )
+        SELECT month,
+               ROUND(revenue, 2) AS revenue,
+               ROUND((revenue - LAG(revenue) OVER (ORDER BY month))
+                     / NULLIF(LAG(revenue) OVER (ORDER BY month), 0) * 100, 2) AS mom_revenue_growth_pct
+        FROM monthly
+        ORDER BY month DESC
+        LIMIT 3
+    """,
+}
+_SCOPE_CLAUSE = {"kpi_rollup": "WHERE o.{column} = ?", "mom_trend": "AND o.{column} = ?"}
+
+# Briefing scope → the ORDERS column it filters on
+SCOPES = {"region": "region", "supplier": "supplier_name", "segment": "segment"}
+
+
+def snapshot_queries(scope: Optional[str] = None, value=None) -> dict:
+    """SNAPSHOT_QUERIES, optionally restricted to ORDERS rows where scope = value."""
+    if scope is None:
+        return {name: sql.format(scope="") for name, sql in _SNAPSHOT_SQL.items()}
+    clause = {name: c.format(column=SCOPES[scope]) for name, c in _SCOPE_CLAUSE.items()}
+    return {name: (sql.format(scope=clause[name]), [value]) for name, sql in _SNAPSHOT_SQL.items()}
+
+
+SNAPSHOT_QUERIES = snapshot_queries()
+
+# Inputs of the local anomaly pre-screen (ai/anomaly_screen.py): every
+# supplier and carrier, and the full monthly and daily revenue history
+ANOMALY_QUERIES = {
+    "kpi_rollup": SNAPSHOT_QUERIES["kpi_rollup"],
+    "mom_history": """
+        WITH monthly AS (
+            SELECT DATE_TRUNC('month', order_date)::DATE AS month,
+                   SUM(revenue)                          AS revenue
+            FROM ORDERS
+            WHERE status='Delivered'
+            GROUP BY 1
+        )
+        SELECT month,
+               ROUND(revenue, 2) AS revenue,
+               ROUND((revenue - LAG(revenue) OVER (ORDER BY month))
+                     / NULLIF(LAG(revenue) OVER (ORDER BY month), 0) * 100, 2) AS mom_revenue_growth_pct
+        FROM monthly
+        ORDER BY month
+    """,
+    "daily_revenue": """
+        SELECT order_date::DATE AS day, ROUND(SUM(revenue), 2) AS revenue
         FROM ORDERS
         WHERE status='Delivered'
-    """
+        GROUP BY 1
+        ORDER BY 1
+    """,
+}
 
-    top_products_sql = """
-        SELECT product_name, ROUND(SUM(revenue),2) AS revenue
-        FROM ORDERS WHERE status='Delivered'
-        GROUP BY 1 ORDER BY revenue DESC LIMIT 5
-    """
 
-    top_regions_sql = """
-        SELECT region, ROUND(SUM(revenue),2) AS revenue
-        FROM ORDERS WHERE status='Delivered'
-        GROUP BY 1 ORDER BY revenue DESC
-    """
+def _top(rollup, grain: str, present: str, columns: dict, by: str,
+         ascending: bool = False, n: Optional[int] = None) -> list:
+    """Rows of one grouping set that had any qualifying rows, ordered and cut to n.
 
-    supplier_sql = """
-        SELECT
-            o.supplier_name,
-            ROUND(AVG(sh.delay_days),2) AS avg_delay,
-            ROUND(SUM(CASE WHEN sh.on_time THEN 1 ELSE 0 END)*100.0
-                  /NULLIF(COUNT(*),0),1) AS on_time_pct
-        FROM ORDERS o
-        JOIN SHIPMENTS sh ON o.order_id=sh.order_id
-        WHERE o.status='Delivered'
-        GROUP BY 1
-        ORDER BY on_time_pct ASC
-        LIMIT 5
+    `columns` maps rollup columns to the names the report context uses. Ties
+    are broken by the row key, so every engine yields the same order (and the
+    same response-cache key).
     """
+    rows = rollup[(rollup["grain"] == grain) & (rollup[present] > 0)]
+    rows = rows.sort_values([by, "key"], ascending=[ascending, True], kind="stable")
+    if n is not None:
+        rows = rows.head(n)
+    return rows[list(columns)].rename(columns=columns).to_dict(orient="records")
 
-    carrier_sql = """
-        SELECT carrier,
-               ROUND(SUM(CASE WHEN on_time THEN 1 ELSE 0 END)*100.0
-                     /NULLIF(COUNT(*),0),1) AS on_time_pct,
-               ROUND(AVG(shipment_cost),2) AS avg_cost
-        FROM SHIPMENTS
-        WHERE on_time IS NOT NULL
-        GROUP BY 1
-        ORDER BY on_time_pct DESC
-    """
 
-    mom_sql = """
-        SELECT month, revenue, mom_revenue_growth_pct
-        FROM VW_MOM_GROWTH
-        ORDER BY month DESC
-        LIMIT 3
-    """
+def _iso(value):
+    """Dates as ISO strings: DuckDB returns Timestamps where Snowflake returns dates."""
+    if isinstance(value, datetime):   # pd.Timestamp included
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def snapshot_from_frames(frames) -> dict:
+    """Shape SNAPSHOT_QUERIES results (name → DataFrame) into the report context.
 
-    return {
-        "kpis":         _run_query(conn, revenue_sql).to_dict(orient="records")[0],
-        "top_products": _run_query(conn, top_products_sql).to_dict(orient="records"),
-        "top_regions":  _run_query(conn, top_regions_sql).to_dict(orient="records"),
-        "suppliers":    _run_query(conn, supplier_sql).to_dict(orient="records"),
-        "carriers":     _run_query(conn, carrier_sql).to_dict(orient="records"),
-        "mom_trend":    _run_query(conn, mom_sql).to_dict(orient="records"),
+    Values are engine-neutral (dates as ISO strings), so the dashboard's local
+    working set and the warehouse produce identical snapshots. A scope or
+    window without delivered orders has no total row; its kpis are empty.
+    """
+    r = frames["kpi_rollup"]
+    total = _top(r, "total", "total_orders", {
+        "revenue": "gross_revenue", "total_cogs": "total_cogs",
+        "gross_profit": "gross_profit", "margin_pct": "margin_pct",
+        "total_orders": "total_orders", "avg_order_value": "avg_order_value",
+    }, "revenue")
+    snapshot = {
+        "kpis": total[0] if total else {},
+        "top_products": _top(r, "product", "total_orders",
+                             {"key": "product_name", "revenue": "revenue"}, "revenue", n=5),
+        "top_regions":  _top(r, "region", "total_orders",
+                             {"key": "region", "revenue": "revenue"}, "revenue"),
+        "suppliers":    _top(r, "supplier", "delivered_shipments",
+                             {"key": "supplier_name", "avg_delay": "avg_delay",
+                              "supplier_on_time_pct": "on_time_pct"},
+                             "supplier_on_time_pct", ascending=True, n=5),
+        "carriers":     _top(r, "carrier", "tracked_shipments",
+                             {"key": "carrier", "carrier_on_time_pct": "on_time_pct",
+                              "avg_cost": "avg_cost"},
+                             "carrier_on_time_pct"),
+        "mom_trend":    frames["mom_trend"].to_dict(orient="records"),
     }
+    return {name: [{k: _iso(v) for k, v in row.items()} for row in section]
+            if isinstance(section, list) else {k: _iso(v) for k, v in section.items()}
+            for name, section in snapshot.items()}
+
+
+def fetch_kpi_snapshot(conn, show_timings: bool = False) -> dict:
+    """Pull the key numbers needed to fill a report context.
+
+    The queries are submitted together (one cursor each), so the fetch costs
+    about as much as the slowest query instead of the sum of all six.
+    """
+    batch = fetch_many(conn, SNAPSHOT_QUERIES)
+    if show_timings:
+        for name, s in sorted(batch.timings.items(), key=lambda kv: -kv[1]):
+            print(f"   ⏱   {name:<13} {s*1000:>8,.0f} ms")
+        print(f"   wall {batch.wall_s*1000:,.0f} ms · slowest {batch.slowest_s*1000:,.0f} ms"
+              f" · serial sum {batch.serial_s*1000:,.0f} ms")
+    return snapshot_from_frames(batch.frames)
+
+
+def fetch_anomaly_context(conn) -> dict:
+    """Run ANOMALY_QUERIES and screen them locally (see ai/anomaly_screen.py)."""
+    from ai import anomaly_screen
+    batch = fetch_many(conn, ANOMALY_QUERIES)
+    t0 = time.perf_counter()
+    data = anomaly_screen.context(batch.frames)
+    print(f"   {len(data['findings'])} finding(s) · risk {data['risk_level']} · "
+          f"queries {batch.wall_s*1000:,.0f} ms · screen {(time.perf_counter() - t0)*1000:,.1f} ms")
+    return data
 
 
 # ─────────────────────────────────────────
@@ -120,11 +240,10 @@ Your job is to transform raw KPI data into clear, executive-level reports.
 Be specific with numbers, identify risks and opportunities, and keep each section concise.
 Use a professional but readable tone. Format output in clean Markdown."""
 
-REPORT_PROMPT_TEMPLATE = """
-Based on the following supply chain KPI snapshot, write a comprehensive Weekly Supply Chain Intelligence Report.
-
-DATA SNAPSHOT:
-{data}
+# The instructions go in the (cached) system prefix and the snapshot in the
+# user turn, so every call shares the same static prefix.
+REPORT_INSTRUCTIONS = """
+Based on the supply chain KPI snapshot in the user message, write a comprehensive Weekly Supply Chain Intelligence Report.
 
 Structure the report with these sections:
 
@@ -156,74 +275,317 @@ Provide 3-5 specific, actionable recommendations based on the data. Be direct.
 """
 
 
-def generate_report(data: dict, client: anthropic.Anthropic) -> str:
-    data_str = json.dumps(data, indent=2, default=str)
-    prompt = REPORT_PROMPT_TEMPLATE.format(data=data_str)
+ANOMALY_INSTRUCTIONS = """
+The user message lists anomalies already detected in the supply chain data by rule and
+statistical checks ("findings": suppliers or carriers under their on-time floor, outlier
+month-over-month revenue growth, days far from their rolling revenue baseline), with the
+computed overall risk level and headline KPIs.
+
+Return a brief alert summary (max 200 words) in Markdown:
+- Explain each finding in plain language, grouping related ones
+- Say what to look at first
+- Overall risk level: LOW / MEDIUM / HIGH (use the computed level)
+Do not report anomalies that are not in the findings.
+"""
+
+
+BRIEFING_INSTRUCTIONS = """
+The KPI snapshot in the user message covers only the orders in the scope named in its "scope" field
+(a single region, supplier or customer segment). Write a one-page briefing for the owner of that scope.
+
+Structure the briefing with these sections:
+
+## Headline
+One sentence on how this scope is doing.
 
-    message = client.messages.create(
-        model=CLAUDE_MODEL,
-        max_tokens=2048,
-        system=SYSTEM_PROMPT,
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return message.content[0].text
+## Revenue & Margin
+Gross revenue, gross profit, margin % and average order value for this scope.
 
+## Delivery Performance
+Supplier and carrier on-time rates and delays within this scope.
+Flag on-time rates below 85% as HIGH RISK.
+
+## Month-over-Month Trend
+Is revenue in this scope growing or shrinking?
 
-def generate_anomaly_alert(data: dict, client: anthropic.Anthropic) -> str:
-    """Quick anomaly scan — returns a short alert summary."""
-    prompt = f"""
-Scan the following supply chain data snapshot for anomalies, risks, or unusual patterns:
+## Actions
+2-3 specific actions for the owner of this scope.
+"""
 
-{json.dumps(data, indent=2, default=str)}
+DELTA_INSTRUCTIONS = """
+The user message is a structured diff between the previous and the current KPI snapshot:
+"changes" lists moved numbers (change is in % for amounts, percentage points for *_pct fields),
+"entered" / "left" list rows that joined or dropped out of a ranked list.
 
-Return a brief alert summary (max 200 words) in Markdown listing:
-- Any suppliers with on-time rate below 80%
-- Any carriers with on-time rate below 85%
-- Any unusual revenue patterns
-- Overall risk level: LOW / MEDIUM / HIGH
+Write a short "What changed" note (max 150 words) in Markdown:
+## What Changed
+3-5 bullets on the moves that matter most, with before → after numbers.
+## Watch
+One line on what to keep an eye on next.
 """
-    message = client.messages.create(
-        model=CLAUDE_MODEL,
-        max_tokens=512,
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return message.content[0].text
+
+SNAPSHOT_HEADER = "DATA SNAPSHOT (tables as {cols, rows}):\n"
+
+# Changes whenever any prompt text (or the encoding) changes, retiring cached responses with it
+PROMPT_VERSION = hashlib.sha1(
+    (SYSTEM_PROMPT + REPORT_INSTRUCTIONS + ANOMALY_INSTRUCTIONS + BRIEFING_INSTRUCTIONS
+     + DELTA_INSTRUCTIONS + SNAPSHOT_HEADER + str(snapshot_encoding.TOKEN_BUDGET)).encode()).hexdigest()[:12]
+
+
+# Per report kind: instructions, system prompt, max_tokens
+REPORT_KINDS = {
+    "weekly":   (REPORT_INSTRUCTIONS, SYSTEM_PROMPT, 2048),
+    "anomaly":  (ANOMALY_INSTRUCTIONS, None, 512),
+    "briefing": (BRIEFING_INSTRUCTIONS, SYSTEM_PROMPT, 1024),
+    "delta":    (DELTA_INSTRUCTIONS, SYSTEM_PROMPT, 400),
+}
+
+
+def _request(kind: str, data: dict, compact: bool = True) -> dict:
+    """messages.create arguments for one report.
+
+    The system prompt and instructions form one static system block marked
+    for prompt caching; only the encoded snapshot changes between calls.
+    compact=False builds the previous layout (instructions and pretty-printed
+    JSON in the user turn) for token comparisons.
+    """
+    instructions, system, max_tokens = REPORT_KINDS[kind]
+    request = dict(model=CLAUDE_MODEL, max_tokens=max_tokens)
+    if not compact:
+        request["messages"] = [{"role": "user", "content": (
+            f"{instructions}\nDATA SNAPSHOT:\n{json.dumps(data, indent=2, default=str)}")}]
+        if system:
+            request["system"] = system
+        return request
+
+    prefix = "\n".join(p.strip() for p in (system, instructions) if p)
+    request["system"] = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+    request["messages"] = [{"role": "user",
+                            "content": SNAPSHOT_HEADER + snapshot_encoding.encode(data)}]
+    return request
+
+
+def _cache_for(kind: str, request: dict, use_cache: bool):
+    """The cache is keyed on what is actually sent: the encoded snapshot."""
+    cache = ResponseCache() if use_cache and response_cache.ENABLED else None
+    key = response_cache.cache_key(kind, PROMPT_VERSION, CLAUDE_MODEL, request["max_tokens"],
+                                   request["messages"][-1]["content"])
+    return cache, key
+
+
+def input_tokens(request: dict, client=None):
+    """(input tokens, exact?) — from the token counting endpoint when the
+    client has one, otherwise estimated from the prompt length."""
+    counter = getattr(getattr(getattr(client, "beta", None), "messages", None), "count_tokens", None)
+    if counter:
+        import anthropic
+        try:
+            return counter(model=request["model"], messages=request["messages"],
+                           system=request.get("system", anthropic.NOT_GIVEN)).input_tokens, True
+        except anthropic.APIError:
+            pass
+    system = request.get("system") or ""
+    if isinstance(system, list):
+        system = "".join(block["text"] for block in system)
+    text = system + "".join(m["content"] for m in request["messages"])
+    return snapshot_encoding.estimate_tokens(text), False
+
+
+def token_report(inputs: dict, client=None) -> list:
+    """Input tokens per report kind (kind → its data), pretty JSON vs compact."""
+    rows = []
+    for kind, data in inputs.items():
+        before, exact = input_tokens(_request(kind, data, compact=False), client)
+        after, _      = input_tokens(_request(kind, data), client)
+        rows.append({"kind": kind, "before": before, "after": after, "exact": exact})
+    return rows
+
+
+def no_data(data: dict) -> str:
+    """The report for a snapshot without delivered orders — nothing to analyse."""
+    scope = ", ".join(f"{k} {v}" for k, v in data.get("scope", {}).items())
+    return ("## No data\n"
+            f"- No delivered orders{f' for {scope}' if scope else ''} in this period, "
+            "so there are no KPIs to report on.\n")
+
+
+def _local_answer(kind: str, data: dict):
+    """Text for reports that need no model call: an anomaly scan with no
+    findings, or a report or briefing on a scope with no delivered orders."""
+    if kind == "anomaly" and not data["findings"]:
+        from ai import anomaly_screen
+        return anomaly_screen.all_clear(data)
+    if kind in ("weekly", "briefing") and not data["kpis"]:
+        return no_data(data)
+    return None
+
+
+def _record_usage(sp, message):
+    usage = getattr(message, "usage", None)
+    if usage is not None:
+        sp.set(input_tokens=getattr(usage, "input_tokens", None),
+               output_tokens=getattr(usage, "output_tokens", None),
+               cache_read_tokens=getattr(usage, "cache_read_input_tokens", None))
+
+
+def _complete(kind: str, data: dict, client, use_cache: bool) -> str:
+    """messages.create, answered from the response cache when the inputs match."""
+    local = _local_answer(kind, data)
+    if local is not None:
+        return local
+    request = _request(kind, data)
+    cache, key = _cache_for(kind, request, use_cache)
+    hit = cache.get(key) if cache else None
+    if hit:
+        return hit["text"]
+
+    with tracing.span("report.llm", kind=kind, max_tokens=request["max_tokens"]) as sp:
+        message = client.messages.create(**request)
+        text = message.content[0].text
+        _record_usage(sp, message)
+    if cache:
+        cache.put(key, text, kind=kind, model=CLAUDE_MODEL, template=PROMPT_VERSION)
+    return text
+
+
+def stream_report(data: dict, client, kind: str = "weekly", use_cache: bool = True) -> Iterator[str]:
+    """Yield the report as text deltas while Claude writes it (messages.stream).
+
+    A cached response comes back as one chunk. The full text is cached only
+    once the stream has completed, so an interrupted stream is never stored.
+    """
+    local = _local_answer(kind, data)
+    if local is not None:
+        yield local
+        return
+    request = _request(kind, data)
+    cache, key = _cache_for(kind, request, use_cache)
+    hit = cache.get(key) if cache else None
+    if hit:
+        yield hit["text"]
+        return
+
+    parts = []
+    with tracing.span("report.llm", kind=kind, max_tokens=request["max_tokens"], stream=True) as sp, \
+            client.messages.stream(**request) as stream:
+        for delta in stream.text_stream:
+            if not parts:
+                sp.set(first_output_ms=round((time.perf_counter() - sp.t0) * 1000, 1))
+            parts.append(delta)
+            yield delta
+        _record_usage(sp, stream.get_final_message())
+    if cache:
+        cache.put(key, "".join(parts), kind=kind, model=CLAUDE_MODEL, template=PROMPT_VERSION)
+
+
+def generate_report(data: dict, client: "anthropic.Anthropic", use_cache: bool = True) -> str:
+    return _complete("weekly", data, client, use_cache)
+
+
+def generate_anomaly_alert(data: dict, client: "anthropic.Anthropic", use_cache: bool = True) -> str:
+    """Quick anomaly scan — returns a short alert summary.
+
+    `data` is anomaly_screen.context(); Claude is only called when it has findings.
+    """
+    return _complete("anomaly", data, client, use_cache)
+
+
+def generate_briefing(data: dict, client: "anthropic.Anthropic", use_cache: bool = True) -> str:
+    """One-page briefing for a scoped snapshot (data["scope"] names the scope)."""
+    return _complete("briefing", data, client, use_cache)
+
+
+def generate_delta_report(diff: dict, client: "anthropic.Anthropic", use_cache: bool = True) -> str:
+    """Short "what changed" note from a snapshot diff (see ai/scheduler.py)."""
+    return _complete("delta", diff, client, use_cache)
+
+
+def save_report(report: str, report_type: str, stamp: Optional[str] = None,
+                unique: bool = False) -> str:
+    out_dir = os.path.join(os.path.dirname(__file__), "..", "reports")
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, f"report_{report_type}_{stamp or date.today().isoformat()}")
+    out_path, n = f"{stem}.md", 1
+    # unique: never overwrite an earlier report, add -2, -3, … instead
+    while unique and os.path.exists(out_path):
+        n += 1
+        out_path = f"{stem}-{n}.md"
+    with open(out_path, "w") as f:
+        f.write(f"# Supply Chain {report_type.title()} Report — {date.today()}\n\n")
+        f.write(report)
+    return out_path
 
 
 # ─────────────────────────────────────────
 # MAIN
 # ─────────────────────────────────────────
-def main(report_type: str = "weekly"):
+@tracing.traced("report")
+def main(report_type: str = "weekly", use_cache: bool = True, stub_llm: bool = False,
+         show_tokens: bool = False):
     print("🔌  Connecting to Snowflake ...")
-    conn = snowflake.connector.connect(**SNOWFLAKE_CONFIG)
-
-    print("📊  Fetching KPI snapshot ...")
-    data = fetch_kpi_snapshot(conn)
+    with tracing.span("report.connect"):
+        conn = connect()
+
+    if show_tokens:
+        inputs = {"weekly": fetch_kpi_snapshot(conn), "anomaly": fetch_anomaly_context(conn)}
+    elif report_type == "anomaly":
+        print("🔎  Screening for anomalies ...")
+        data = fetch_anomaly_context(conn)
+    else:
+        print("📊  Fetching KPI snapshot ...")
+        data = fetch_kpi_snapshot(conn, show_timings=True)
     conn.close()
 
-    print("🤖  Generating AI report with Claude ...")
-    client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
-
+    if stub_llm:
+        from ai.stub_client import StubClient
+        client = StubClient()
+    else:
+        import anthropic
+        client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+
+    if show_tokens:
+        print("\n🔢  Input tokens per prompt (pretty JSON → compact encoding)")
+        for r in token_report(inputs, client):
+            change = r["after"] / r["before"] - 1
+            print(f"   {r['kind']:<8} {r['before']:>6,} → {r['after']:>6,}  ({change:+.0%})"
+                  + ("" if r["exact"] else "  estimated"))
+        return
+
+    if report_type == "anomaly" and not data["findings"]:
+        print("✅  No findings — skipping the Claude call")
+    elif report_type != "anomaly" and not data["kpis"]:
+        print("ℹ️   No delivered orders — skipping the Claude call")
+    else:
+        print("🤖  Generating AI report with Claude ...")
     if report_type == "anomaly":
-        report = generate_anomaly_alert(data, client)
         print("\n⚠️  ANOMALY ALERT\n" + "─" * 60)
     else:
-        report = generate_report(data, client)
         print(f"\n📋  WEEKLY SUPPLY CHAIN REPORT — {date.today()}\n" + "─" * 60)
 
-    print(report)
+    # Print deltas as they arrive
+    t0, first, parts = time.perf_counter(), None, []
+    for delta in stream_report(data, client, report_type, use_cache):
+        if first is None:
+            first = time.perf_counter() - t0
+        parts.append(delta)
+        print(delta, end="", flush=True)
+    report = "".join(parts)
+    print(f"\n\n⏱️   First output {first or 0:.2f}s · complete {time.perf_counter() - t0:.2f}s")
 
-    # Save to file
-    out_dir = os.path.join(os.path.dirname(__file__), "..", "reports")
-    os.makedirs(out_dir, exist_ok=True)
-    filename = f"report_{report_type}_{date.today().isoformat()}.md"
-    out_path = os.path.join(out_dir, filename)
-    with open(out_path, "w") as f:
-        f.write(f"# Supply Chain {report_type.title()} Report — {date.today()}\n\n")
-        f.write(report)
-    print(f"\n💾  Saved to: {out_path}")
+    with tracing.span("report.save"):
+        out_path = save_report(report, report_type)
+    print(f"💾  Saved to: {out_path}")
 
 
 if __name__ == "__main__":
-    rtype = sys.argv[1] if len(sys.argv) > 1 else "weekly"
-    main(rtype)
+    parser = argparse.ArgumentParser(description="Generate a Claude supply chain report")
+    parser.add_argument("report_type", nargs="?", default="weekly", choices=["weekly", "anomaly"])
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call Claude (skip the response cache)")
+    parser.add_argument("--stub-llm", action="store_true",
+                        help="Use the offline stand-in client instead of the Anthropic API")
+    parser.add_argument("--tokens", action="store_true",
+                        help="Only report prompt input tokens, before and after compact encoding")
+    args = parser.parse_args()
+    main(args.report_type, use_cache=not args.no_cache, stub_llm=args.stub_llm,
+         show_tokens=args.tokens)
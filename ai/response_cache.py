@@ -0,0 +1,95 @@
+"""
+Supply Chain Analytics — Claude Response Cache
+Content-addressed, on-disk store for generated report text. An entry's key
+is a hash of everything that determines the response — the KPI snapshot,
+the prompt template version, the model and max_tokens — so an unchanged
+snapshot never pays for a second LLM call, whether it comes from the
+nightly run, the dashboard button or an ad-hoc CLI run.
+
+Entries older than REPORT_CACHE_MAX_AGE_DAYS are dropped, and the store is
+trimmed (least recently used first) to REPORT_CACHE_MAX_MB. Set
+REPORT_CACHE=0, or pass use_cache=False / --no-cache, to bypass it.
+"""
+import hashlib
+import json
+import os
+import time
+
+ROOT      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(ROOT, os.environ.get("REPORT_CACHE_DIR", os.path.join("cache", "claude")))
+MAX_MB    = float(os.environ.get("REPORT_CACHE_MAX_MB", "50"))
+MAX_AGE_DAYS = float(os.environ.get("REPORT_CACHE_MAX_AGE_DAYS", "30"))
+ENABLED   = os.environ.get("REPORT_CACHE", "1") not in ("0", "false")
+
+
+def cache_key(kind: str, template_version: str, model: str, max_tokens: int, data: dict) -> str:
+    payload = json.dumps(
+        {"kind": kind, "template": template_version, "model": model,
+         "max_tokens": max_tokens, "data": data},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """One JSON file per entry; reads refresh the file's mtime for LRU trimming."""
+
+    def __init__(self, path: str = CACHE_DIR, max_bytes: int = int(MAX_MB * 2**20),
+                 max_age_s: float = MAX_AGE_DAYS * 86400):
+        self.path      = path
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str):
+        """The cached entry dict, or None on a miss (or an expired entry)."""
+        path = self._file(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age_s:
+                os.remove(path)
+                return None
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, text: str, **meta) -> dict:
+        os.makedirs(self.path, exist_ok=True)
+        entry = {"text": text, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **meta}
+        tmp = f"{self._file(key)}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._file(key))
+        self.evict()
+        return entry
+
+    def evict(self):
+        """Drop expired entries, then the least recently used until under max_bytes."""
+        now, entries = time.time(), []
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age_s:
+                os.remove(path)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def stats(self) -> dict:
+        files = [f for f in os.listdir(self.path) if f.endswith(".json")] if os.path.isdir(self.path) else []
+        return {"entries": len(files),
+                "kib": round(sum(os.path.getsize(os.path.join(self.path, f)) for f in files) / 1024, 1)}
@@ -0,0 +1,288 @@
+"""
+Supply Chain Analytics — Report Scheduler
+Long-running daemon that runs the weekly report and the anomaly alert on a
+fixed cadence, holding one warm warehouse connection and one Claude client
+for its whole life.
+
+Each run compares the new data with what the job last reported on:
+  - same data version                → skipped without fetching
+  - weekly: snapshot diff below REPORT_DIFF_SKIP_PCT  → skipped
+            below REPORT_DIFF_FULL_PCT                → short "what changed" report
+            otherwise, or a ranked list changed members → full weekly report
+  - anomaly: same findings as last time → skipped; otherwise a new alert
+
+Moves are measured in % for amounts and percentage points for *_pct fields.
+The last reported snapshot per job is kept in REPORT_SCHEDULER_STATE, so a
+restart diffs against it instead of starting over.
+
+Usage:
+    python ai/scheduler.py                             # weekly every 7d, anomaly every 1h
+    python ai/scheduler.py --weekly-every 1d --anomaly-every 15m
+    python ai/scheduler.py --once --stub-llm           # one pass of every job, then exit
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from etl import tracing, warehouse
+from ai import report_generator as rg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_PATH    = os.path.join(ROOT, os.environ.get("REPORT_SCHEDULER_STATE",
+                                                  os.path.join("cache", "scheduler_state.json")))
+WEEKLY_EVERY  = os.environ.get("REPORT_WEEKLY_EVERY", "7d")
+ANOMALY_EVERY = os.environ.get("REPORT_ANOMALY_EVERY", "1h")
+DIFF_SKIP_PCT = float(os.environ.get("REPORT_DIFF_SKIP_PCT", "0.5"))
+DIFF_FULL_PCT = float(os.environ.get("REPORT_DIFF_FULL_PCT", "5"))
+DELTA_MAX_CHANGES = 12
+
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_every(text: str) -> float:
+    """'90s', '15m', '1h', '7d' or plain seconds."""
+    text = str(text).strip().lower()
+    if text and text[-1] in UNITS:
+        return float(text[:-1]) * UNITS[text[-1]]
+    return float(text)
+
+
+# ─────────────────────────────────────────
+# SNAPSHOT DIFF
+# ─────────────────────────────────────────
+def _rows(section) -> dict:
+    """A snapshot section as {row key: {field: value}}; list rows are keyed by their first field."""
+    if isinstance(section, dict):
+        return {"total": section}
+    rows = {}
+    for r in section or []:
+        key, *_ = r
+        rows[str(r[key])] = {f: v for f, v in r.items() if f != key}
+    return rows
+
+
+def _move(field: str, before, after):
+    """(change, unit) — points for percentages, relative % for amounts."""
+    if field.endswith("_pct"):
+        return after - before, "pp"
+    if before:
+        return (after - before) / abs(before) * 100, "%"
+    return (0.0 if after == before else 100.0), "%"
+
+
+def diff_snapshots(prev: dict, cur: dict) -> dict:
+    """Structured diff of two report snapshots (snapshot_from_frames output).
+
+    score is the largest move in %/pp; a row entering or leaving a ranked
+    list scores infinity, since the report's framing changes with it.
+    """
+    changes, entered, left = [], [], []
+    for section in cur:
+        old, new = _rows(prev.get(section)), _rows(cur[section])
+        entered += [{"section": section, "key": k} for k in new if k not in old]
+        left    += [{"section": section, "key": k} for k in old if k not in new]
+        for key in new.keys() & old.keys():
+            for field, after in new[key].items():
+                before = old[key].get(field)
+                if not all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                           for v in (before, after)) or before == after:
+                    continue
+                change, unit = _move(field, before, after)
+                changes.append({"section": section, "key": key, "field": field,
+                                "before": before, "after": after,
+                                "change": round(change, 2), "unit": unit})
+    changes.sort(key=lambda c: -abs(c["change"]))
+    score = float("inf") if entered or left else max((abs(c["change"]) for c in changes), default=0.0)
+    return {"score": score, "changes": changes, "entered": entered, "left": left}
+
+
+def finding_keys(context: dict) -> set:
+    return {(f["rule"], f["subject"]) for f in context["findings"]}
+
+
+# ─────────────────────────────────────────
+# SCHEDULER
+# ─────────────────────────────────────────
+class Scheduler:
+    """Runs jobs ("weekly", "anomaly") on their cadence until stopped."""
+
+    def __init__(self, client, every: dict, pool=None, state_path: str = STATE_PATH,
+                 use_cache: bool = True):
+        # One warm session, kept across runs: never evicted for idling, and
+        # pinged (then replaced if dead) when it has been idle a while
+        self.pool       = pool or warehouse.ConnectionPool(size=1, idle_timeout=float("inf"))
+        self.client     = client
+        self.every      = every
+        self.state_path = state_path
+        self.use_cache  = use_cache
+        self.state      = self._load_state()
+        self.stop_event = threading.Event()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, default=str)
+        os.replace(tmp, self.state_path)
+
+    def _fetch(self, kind: str) -> dict:
+        if kind == "anomaly":
+            from ai import anomaly_screen
+            batch = self.pool.run(warehouse.fetch_many, rg.ANOMALY_QUERIES)
+            data = anomaly_screen.context(batch.frames)
+        else:
+            batch = self.pool.run(warehouse.fetch_many, rg.SNAPSHOT_QUERIES)
+            data = rg.snapshot_from_frames(batch.frames)
+        # Same types as a snapshot read back from the state file (dates → str)
+        return json.loads(json.dumps(data, default=str))
+
+    def _decide(self, kind: str, prev, data: dict):
+        """(action, detail): action is skip / delta / full."""
+        if prev is None:
+            return "full", "first run"
+        if kind == "anomaly":
+            new, gone = finding_keys(data) - finding_keys(prev), finding_keys(prev) - finding_keys(data)
+            if not new and not gone:
+                return "skip", "same findings"
+            return "full", f"{len(new)} new / {len(gone)} resolved finding(s)"
+        diff = diff_snapshots(prev, data)
+        if diff["score"] < DIFF_SKIP_PCT:
+            return "skip", f"largest move {diff['score']:.2f} < {DIFF_SKIP_PCT}"
+        if diff["score"] < DIFF_FULL_PCT:
+            return "delta", diff
+        return "full", ("ranked list changed" if diff["score"] == float("inf")
+                        else f"largest move {diff['score']:.1f} ≥ {DIFF_FULL_PCT}")
+
+    def run_job(self, kind: str) -> dict:
+        # One trace per run: a slow run can be compared with its neighbours
+        with tracing.trace(f"scheduler.{kind}") as sp:
+            result = self._run_job(kind)
+            sp.set(action=result["action"])
+        return result
+
+    def _run_job(self, kind: str) -> dict:
+        t0 = time.perf_counter()
+        last = self.state.get(kind, {})
+        version = self.pool.run(warehouse.data_version)
+        if version == last.get("version"):
+            return {"kind": kind, "action": "skip", "detail": "data version unchanged",
+                    "ms": (time.perf_counter() - t0) * 1000}
+
+        data = self._fetch(kind)
+        action, detail = self._decide(kind, last.get("data"), data)
+        out = None
+        if action == "delta":
+            diff = {"previous_version": last.get("version"), "version": version,
+                    "changes": detail["changes"][:DELTA_MAX_CHANGES],
+                    "entered": detail["entered"], "left": detail["left"]}
+            text = rg.generate_delta_report(diff, self.client, self.use_cache)
+            detail = f"largest move {detail['score']:.2f}"
+        elif action == "full":
+            gen = rg.generate_anomaly_alert if kind == "anomaly" else rg.generate_report
+            text = gen(data, self.client, self.use_cache)
+        if action != "skip":
+            # Several runs can land in the same second (--once, short cadences)
+            stamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+            if action == "delta":
+                out = rg.save_report(text, "delta", stamp=f"{kind}_{stamp}", unique=True)
+            else:
+                out = rg.save_report(text, kind, stamp=stamp, unique=True)
+        # Diffs are always taken against the last full report, so slow drift
+        # still adds up to a full one; the version is recorded either way
+        if action == "full":
+            self.state[kind] = {"version": version, "data": data,
+                                "reported_at": datetime.now().isoformat(timespec="seconds")}
+        else:
+            self.state[kind]["version"] = version
+        self._save_state()
+        return {"kind": kind, "action": action, "detail": detail, "file": out,
+                "ms": (time.perf_counter() - t0) * 1000}
+
+    def _log(self, r: dict):
+        icon = {"skip": "⏭️ ", "delta": "📝", "full": "📋"}.get(r["action"], "❌")
+        where = f" → {os.path.relpath(r['file'], ROOT)}" if r.get("file") else ""
+        print(f"{datetime.now():%Y-%m-%d %H:%M:%S}  {icon} {r['kind']:<8} {r['action']:<5} "
+              f"{r['detail']} ({r['ms']:,.0f} ms){where}", flush=True)
+
+    def run(self, once: bool = False):
+        due = {kind: 0.0 for kind in self.every}
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            for kind in [k for k, at in due.items() if at <= now]:
+                try:
+                    self._log(self.run_job(kind))
+                except Exception as e:
+                    # A failed run is retried at the next tick, not fatal to the daemon
+                    self._log({"kind": kind, "action": "error", "detail": f"{type(e).__name__}: {e}",
+                               "ms": (time.monotonic() - now) * 1000})
+                due[kind] = now + self.every[kind]
+            if once:
+                break
+            self.stop_event.wait(max(0.0, min(due.values()) - time.monotonic()))
+
+    def close(self):
+        self.pool.close()
+
+
+# ─────────────────────────────────────────
+# MAIN
+# ─────────────────────────────────────────
+def main(jobs=("weekly", "anomaly"), weekly_every: str = WEEKLY_EVERY,
+         anomaly_every: str = ANOMALY_EVERY, once: bool = False, stub_llm: bool = False,
+         use_cache: bool = True):
+    if stub_llm:
+        from ai.stub_client import StubClient
+        client = StubClient()
+    else:
+        import anthropic
+        client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+    every = {"weekly": parse_every(weekly_every), "anomaly": parse_every(anomaly_every)}
+    sched = Scheduler(client, {k: every[k] for k in jobs}, use_cache=use_cache)
+
+    def stop(signum, frame):
+        print("\n🛑  Stopping after the current job ...", flush=True)
+        sched.stop_event.set()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print("\n🗓️   Report scheduler — " + ", ".join(
+        f"{k} every {v}" for k, v in (("weekly", weekly_every), ("anomaly", anomaly_every)) if k in jobs))
+    try:
+        sched.run(once=once)
+    finally:
+        sched.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run report jobs on a schedule")
+    parser.add_argument("--jobs", default="weekly,anomaly", help="Comma-separated: weekly, anomaly")
+    parser.add_argument("--weekly-every",  default=WEEKLY_EVERY,  help="e.g. 7d, 12h (default %(default)s)")
+    parser.add_argument("--anomaly-every", default=ANOMALY_EVERY, help="e.g. 1h, 15m (default %(default)s)")
+    parser.add_argument("--once", action="store_true", help="Run every job once and exit")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call Claude (skip the response cache)")
+    parser.add_argument("--stub-llm", action="store_true",
+                        help="Use the offline stand-in client instead of the Anthropic API")
+    args = parser.parse_args()
+    jobs = tuple(args.jobs.split(","))
+    if set(jobs) - {"weekly", "anomaly"}:
+        parser.error(f"unknown job(s): {', '.join(sorted(set(jobs) - {'weekly', 'anomaly'}))}")
+    main(jobs, args.weekly_every, args.anomaly_every, once=args.once,
+         stub_llm=args.stub_llm, use_cache=not args.no_cache)
@@ -0,0 +1,106 @@
+"""
+Supply Chain Analytics — Compact Snapshot Encoding
+Serializes the report's KPI snapshot for a prompt in as few input tokens as
+it can carry the numbers in:
+  - tables are column-oriented ({"cols": [...], "rows": [[...], ...]}), so
+    each key is sent once instead of once per row, and a column that is
+    empty in every row (a rule-based finding's score) is left out
+  - numbers are rounded (integers from 100 up, one decimal below)
+  - no indentation or spaces between separators
+  - above the token budget, rows come off the longest table first, least
+    informative first: a ranked table loses its lowest-ranked row, so what is
+    left is still the top of the ranking; an unordered one, the row whose key
+    measure sits closest to the table's median
+"""
+import json
+import math
+import os
+import statistics
+
+TOKEN_BUDGET    = int(os.environ.get("REPORT_SNAPSHOT_TOKEN_BUDGET", "600"))
+CHARS_PER_TOKEN = 3.2   # compact JSON full of numbers tokenizes densely
+MIN_ROWS        = 1
+
+# Table → the measure that ranks its rows for trimming (None = never trimmed)
+TRIM_BY = {
+    "top_products": "revenue",
+    "top_regions":  "revenue",
+    "suppliers":    "on_time_pct",
+    "carriers":     "on_time_pct",
+    "mom_trend":    None,
+}
+# Tables that arrive in the order the report ranks them (top products first,
+# least punctual suppliers first)
+RANKED = {"top_products", "top_regions", "suppliers", "carriers"}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def num(x):
+    if isinstance(x, bool) or not isinstance(x, (int, float)):
+        return x
+    if x != x:   # NaN
+        return None
+    return int(round(x)) if abs(x) >= 100 else round(x, 1)
+
+
+def columnar(rows: list) -> dict:
+    cols = [c for c in (rows[0] if rows else []) if any(num(r.get(c)) is not None for r in rows)]
+    return {"cols": cols, "rows": [[num(r.get(c)) for c in cols] for r in rows]}
+
+
+def _render(data: dict, tables: dict, omitted: dict) -> str:
+    out = {}
+    for key, value in data.items():
+        if key in tables:
+            out[key] = columnar(tables[key])
+        elif isinstance(value, dict):
+            out[key] = {k: num(v) for k, v in value.items()}
+        else:
+            out[key] = num(value)
+    if omitted:
+        out["rows_omitted"] = omitted
+    return json.dumps(out, separators=(",", ":"), default=str)
+
+
+def _least_informative(tables: dict):
+    """(table, row index) of the next row to drop, from the longest table: its
+    last row if it is ranked, otherwise the row nearest its median by robust z."""
+    best = None
+    for name, rows in tables.items():
+        col = TRIM_BY.get(name)
+        if not col or len(rows) <= MIN_ROWS:
+            continue
+        values = [r.get(col) for r in rows]
+        if any(not isinstance(v, (int, float)) for v in values):
+            continue
+        median = statistics.median(values)
+        mad = statistics.median(abs(v - median) for v in values) or 1.0
+        # Equally long tables: the row nearer its median goes, then the later one
+        for i in [len(values) - 1] if name in RANKED else range(len(values)):
+            score = (-len(rows), abs(values[i] - median) / mad, -i)
+            if best is None or score < best[0]:
+                best = (score, name, i)
+    return best and best[1:]
+
+
+def encode(data: dict, budget: int = TOKEN_BUDGET) -> str:
+    """The snapshot as compact JSON within about `budget` tokens.
+
+    Trimmed tables keep their order; how many rows each lost is reported in
+    rows_omitted so the model does not read a cut list as the full one.
+    """
+    tables  = {k: list(v) for k, v in data.items() if isinstance(v, list)}
+    omitted = {}
+    text = _render(data, tables, omitted)
+    while estimate_tokens(text) > budget:
+        victim = _least_informative(tables)
+        if victim is None:
+            break
+        name, i = victim
+        del tables[name][i]
+        omitted[name] = omitted.get(name, 0) + 1
+        text = _render(data, tables, omitted)
+    return text
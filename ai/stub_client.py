@@ -0,0 +1,62 @@
+"""
+Supply Chain Analytics — Stub Claude Client
+A deterministic, offline stand-in for anthropic.Anthropic covering the
+calls the report generator makes (messages.create and messages.stream). The "report" is built
+from the prompt itself, so the same request always yields the same text.
+
+    python ai/report_generator.py weekly --stub-llm
+"""
+import hashlib
+import re
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+
+class StubClient:
+    def __init__(self, latency_s: float = 0.0, first_token_s: float = 0.0):
+        self.latency_s = latency_s          # whole response
+        self.first_token_s = first_token_s  # streaming only: delay before the first delta
+        self.calls     = 0
+        self._lock     = threading.Lock()
+        self.messages  = self      # client.messages.create(...)
+
+    def _text(self, model, max_tokens, messages, system):
+        if isinstance(system, list):
+            system = "\n".join(block["text"] for block in system)
+        prompt = f"{system}\n{messages[-1]['content']}"
+        digest = hashlib.sha1(f"{model}|{max_tokens}|{prompt}".encode()).hexdigest()[:12]
+        headings = [l for l in prompt.splitlines() if l.startswith("## ")] or ["## Summary"]
+        return prompt, "\n\n".join(f"{h}\n- Stub analysis ({digest})." for h in headings)
+
+    def _message(self, model, prompt, text):
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=text)],
+            model=model,
+            usage=SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=len(text) // 4),
+        )
+
+    def create(self, model: str, max_tokens: int, messages: list, system: str = "", **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency_s)
+        prompt, text = self._text(model, max_tokens, messages, system)
+        return self._message(model, prompt, text)
+
+    @contextmanager
+    def stream(self, model: str, max_tokens: int, messages: list, system: str = "", **kwargs):
+        """Word-sized deltas spread over latency_s, after first_token_s."""
+        with self._lock:
+            self.calls += 1
+        prompt, text = self._text(model, max_tokens, messages, system)
+        chunks = re.findall(r"\S+\s*|\s+", text)
+
+        def text_stream():
+            time.sleep(self.first_token_s)
+            for chunk in chunks:
+                time.sleep(max(0.0, self.latency_s - self.first_token_s) / len(chunks))
+                yield chunk
+
+        yield SimpleNamespace(text_stream=text_stream(),
+                              get_final_message=lambda: self._message(model, prompt, text))
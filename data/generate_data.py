@@ -2,17 +2,17 @@
 Supply Chain Analytics — Synthetic Data Generator
 Generates realistic supply chain data: orders, products, suppliers, customers, shipments
 """
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
 import random
 import os
+import sys
 
-random.seed(42)
-np.random.seed(42)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from etl import tracing
+
+SEED = 42
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "raw")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # ─────────────────────────────────────────
 # SUPPLIERS
@@ -62,17 +62,20 @@ PRODUCT_DATA = [
     ("Fire Extinguisher",   "Safety",       "Safety",        18, 49),
 ]
 
-products = []
-for i, (name, cat, subcat, cost, price) in enumerate(PRODUCT_DATA, start=1):
-    products.append({
-        "product_id":   f"P{i:03d}",
-        "product_name":  name,
-        "category":      cat,
-        "sub_category":  subcat,
-        "unit_cost":     cost,
-        "unit_price":    price,
-        "supplier_id":   f"S{random.randint(1,12):03d}",
-    })
+def make_products() -> list:
+    products = []
+    for i, (name, cat, subcat, cost, price) in enumerate(PRODUCT_DATA, start=1):
+        products.append({
+            "product_id":   f"P{i:03d}",
+            "product_name":  name,
+            "category":      cat,
+            "sub_category":  subcat,
+            "unit_cost":     cost,
+            "unit_price":    price,
+            "supplier_id":   f"S{random.randint(1,12):03d}",
+        })
+    return products
+
 
 # ─────────────────────────────────────────
 # CUSTOMERS
@@ -97,16 +100,19 @@ CITIES    = {
     "Middle East":   ["Dubai", "Riyadh", "Istanbul", "Cairo", "Tel Aviv"],
 }
 
-customers = []
-for i, name in enumerate(CUSTOMER_NAMES, start=1):
-    region = random.choice(REGIONS)
-    customers.append({
-        "customer_id":   f"C{i:03d}",
-        "customer_name":  name,
-        "segment":        random.choice(SEGMENTS),
-        "region":         region,
-        "city":           random.choice(CITIES[region]),
-    })
+def make_customers() -> list:
+    customers = []
+    for i, name in enumerate(CUSTOMER_NAMES, start=1):
+        region = random.choice(REGIONS)
+        customers.append({
+            "customer_id":   f"C{i:03d}",
+            "customer_name":  name,
+            "segment":        random.choice(SEGMENTS),
+            "region":         region,
+            "city":           random.choice(CITIES[region]),
+        })
+    return customers
+
 
 # ─────────────────────────────────────────
 # ORDERS + SHIPMENTS
@@ -116,74 +122,99 @@ STATUSES    = ["Delivered", "Delivered", "Delivered", "Shipped", "Processing", "
 START_DATE  = datetime(2022, 1, 1)
 END_DATE    = datetime(2024, 12, 31)
 
-orders, shipments = [], []
-for i in range(1, 10001):
-    order_date  = START_DATE + timedelta(days=random.randint(0, (END_DATE - START_DATE).days))
-    product     = random.choice(products)
-    customer    = random.choice(customers)
-    supplier    = next(s for s in SUPPLIERS if s["supplier_id"] == product["supplier_id"])
-    lead_days   = supplier["lead_time_days"] + random.randint(-2, 5)
-    ship_date   = order_date + timedelta(days=random.randint(1, 3))
-    est_del     = ship_date + timedelta(days=lead_days)
-    reliability = supplier["reliability_score"]
-    delay_days  = 0 if random.random() < reliability else random.randint(1, 10)
-    act_del     = est_del + timedelta(days=delay_days)
-    on_time     = delay_days == 0
-    qty         = random.randint(1, 50)
-    discount    = random.choice([0, 0, 0, 0.05, 0.10, 0.15])
-    status      = random.choice(STATUSES)
-
-    orders.append({
-        "order_id":       f"ORD{i:05d}",
-        "order_date":     order_date.date(),
-        "ship_date":      ship_date.date(),
-        "status":         status,
-        "customer_id":    customer["customer_id"],
-        "customer_name":  customer["customer_name"],
-        "segment":        customer["segment"],
-        "region":         customer["region"],
-        "city":           customer["city"],
-        "product_id":     product["product_id"],
-        "product_name":   product["product_name"],
-        "category":       product["category"],
-        "sub_category":   product["sub_category"],
-        "supplier_id":    supplier["supplier_id"],
-        "supplier_name":  supplier["supplier_name"],
-        "supplier_country": supplier["country"],
-        "quantity":       qty,
-        "unit_cost":      product["unit_cost"],
-        "unit_price":     product["unit_price"],
-        "discount":       discount,
-        "revenue":        round(qty * product["unit_price"] * (1 - discount), 2),
-        "cogs":           round(qty * product["unit_cost"], 2),
-    })
-
-    shipments.append({
-        "shipment_id":         f"SHP{i:05d}",
-        "order_id":            f"ORD{i:05d}",
-        "carrier":             random.choice(CARRIERS),
-        "ship_date":           ship_date.date(),
-        "estimated_delivery":  est_del.date(),
-        "actual_delivery":     act_del.date() if status not in ["Processing", "Cancelled"] else None,
-        "on_time":             on_time if status == "Delivered" else None,
-        "delay_days":          delay_days if status == "Delivered" else None,
-        "shipment_cost":       round(random.uniform(10, 150), 2),
-    })
+def make_orders(products: list, customers: list):
+    orders, shipments = [], []
+    for i in range(1, 10001):
+        order_date  = START_DATE + timedelta(days=random.randint(0, (END_DATE - START_DATE).days))
+        product     = random.choice(products)
+        customer    = random.choice(customers)
+        supplier    = next(s for s in SUPPLIERS if s["supplier_id"] == product["supplier_id"])
+        lead_days   = supplier["lead_time_days"] + random.randint(-2, 5)
+        ship_date   = order_date + timedelta(days=random.randint(1, 3))
+        est_del     = ship_date + timedelta(days=lead_days)
+        reliability = supplier["reliability_score"]
+        delay_days  = 0 if random.random() < reliability else random.randint(1, 10)
+        act_del     = est_del + timedelta(days=delay_days)
+        on_time     = delay_days == 0
+        qty         = random.randint(1, 50)
+        discount    = random.choice([0, 0, 0, 0.05, 0.10, 0.15])
+        status      = random.choice(STATUSES)
+
+        orders.append({
+            "order_id":       f"ORD{i:05d}",
+            "order_date":     order_date.date(),
+            "ship_date":      ship_date.date(),
+            "status":         status,
+            "customer_id":    customer["customer_id"],
+            "customer_name":  customer["customer_name"],
+            "segment":        customer["segment"],
+            "region":         customer["region"],
+            "city":           customer["city"],
+            "product_id":     product["product_id"],
+            "product_name":   product["product_name"],
+            "category":       product["category"],
+            "sub_category":   product["sub_category"],
+            "supplier_id":    supplier["supplier_id"],
+            "supplier_name":  supplier["supplier_name"],
+            "supplier_country": supplier["country"],
+            "quantity":       qty,
+            "unit_cost":      product["unit_cost"],
+            "unit_price":     product["unit_price"],
+            "discount":       discount,
+            "revenue":        round(qty * product["unit_price"] * (1 - discount), 2),
+            "cogs":           round(qty * product["unit_cost"], 2),
+        })
+
+        shipments.append({
+            "shipment_id":         f"SHP{i:05d}",
+            "order_id":            f"ORD{i:05d}",
+            "carrier":             random.choice(CARRIERS),
+            "ship_date":           ship_date.date(),
+            "estimated_delivery":  est_del.date(),
+            "actual_delivery":     act_del.date() if status not in ["Processing", "Cancelled"] else None,
+            "on_time":             on_time if status == "Delivered" else None,
+            "delay_days":          delay_days if status == "Delivered" else None,
+            "shipment_cost":       round(random.uniform(10, 150), 2),
+        })
+    return orders, shipments
+
 
 # ─────────────────────────────────────────
 # SAVE TO CSV
 # ─────────────────────────────────────────
-dfs = {
-    "suppliers":  pd.DataFrame(SUPPLIERS),
-    "products":   pd.DataFrame(products),
-    "customers":  pd.DataFrame(customers),
-    "orders":     pd.DataFrame(orders),
-    "shipments":  pd.DataFrame(shipments),
-}
+def generate() -> dict:
+    """All five tables as DataFrames; the same seed always gives the same data."""
+    import numpy as np
+    import pandas as pd
+    random.seed(SEED)
+    np.random.seed(SEED)
+    with tracing.span("generate.build"):
+        products  = make_products()
+        customers = make_customers()
+        orders, shipments = make_orders(products, customers)
+    return {
+        "suppliers":  pd.DataFrame(SUPPLIERS),
+        "products":   pd.DataFrame(products),
+        "customers":  pd.DataFrame(customers),
+        "orders":     pd.DataFrame(orders),
+        "shipments":  pd.DataFrame(shipments),
+    }
+
+
+@tracing.traced("generate")
+def main(output_dir: str = OUTPUT_DIR) -> dict:
+    """Generate the tables, write them to output_dir as CSV and return them."""
+    os.makedirs(output_dir, exist_ok=True)
+    dfs = generate()
+    for name, df in dfs.items():
+        path = os.path.join(output_dir, f"{name}.csv")
+        with tracing.span("generate.write", table=name, rows=len(df)):
+            df.to_csv(path, index=False)
+        print(f"✅  {name}.csv  ({len(df):,} rows)  →  {path}")
+
+    print("\n✅  All data generated successfully.")
+    return dfs
 
-for name, df in dfs.items():
-    path = os.path.join(OUTPUT_DIR, f"{name}.csv")
-    df.to_csv(path, index=False)
-    print(f"✅  {name}.csv  ({len(df):,} rows)  →  {path}")
 
-print("\n✅  All data generated successfully.")
+if __name__ == "__main__":
+    main()
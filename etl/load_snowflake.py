@@ -4,24 +4,22 @@ Loads generated CSV files into Snowflake tables using snowflake-connector-python
 """
 import os
 import sys
-import pandas as pd
-import snowflake.connector
+import uuid
+from typing import TYPE_CHECKING
+
 from dotenv import load_dotenv
 
 load_dotenv()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from etl import tracing, warehouse
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # ─────────────────────────────────────────
 # CONFIG
 # ─────────────────────────────────────────
-SNOWFLAKE_CONFIG = {
-    "account":   os.environ["SNOWFLAKE_ACCOUNT"],
-    "user":      os.environ["SNOWFLAKE_USER"],
-    "password":  os.environ["SNOWFLAKE_PASSWORD"],
-    "warehouse": os.environ.get("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH"),
-    "database":  os.environ.get("SNOWFLAKE_DATABASE", "SUPPLY_CHAIN"),
-    "schema":    os.environ.get("SNOWFLAKE_SCHEMA",   "ANALYTICS"),
-}
-
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "raw")
 SQL_DIR  = os.path.join(os.path.dirname(__file__), "..", "sql")
 
@@ -32,9 +30,11 @@ TABLE_ORDER = ["suppliers", "products", "customers", "orders", "shipments"]
 # HELPERS
 # ─────────────────────────────────────────
 def get_connection():
+    import snowflake.connector
+    config = warehouse.snowflake_config()
     print("🔌  Connecting to Snowflake ...")
-    conn = snowflake.connector.connect(**SNOWFLAKE_CONFIG)
-    print(f"✅  Connected → {SNOWFLAKE_CONFIG['account']} / {SNOWFLAKE_CONFIG['database']}.{SNOWFLAKE_CONFIG['schema']}")
+    conn = snowflake.connector.connect(**config)
+    print(f"✅  Connected → {config['account']} / {config['database']}.{config['schema']}")
     return conn
 
 
@@ -52,14 +52,20 @@ def run_sql_file(conn, filepath: str):
     cur.close()
 
 
-def load_table(conn, table_name: str):
-    """Load a CSV into a Snowflake table using direct INSERT via executemany."""
-    path = os.path.join(DATA_DIR, f"{table_name}.csv")
-    if not os.path.exists(path):
-        print(f"  ❌  Missing file: {path}")
-        return 0
+def load_table(conn, table_name: str, df: "pd.DataFrame" = None):
+    """Load a table into Snowflake using direct INSERT via executemany.
 
-    df = pd.read_csv(path)
+    `df` is the generator's DataFrame when it is already in memory; otherwise
+    the CSV in data/raw/ is read.
+    """
+    import pandas as pd
+    if df is None:
+        path = os.path.join(DATA_DIR, f"{table_name}.csv")
+        if not os.path.exists(path):
+            print(f"  ❌  Missing file: {path}")
+            return 0
+        with tracing.span("load.read", table=table_name):
+            df = pd.read_csv(path)
 
     # Replace NaN with None so Snowflake gets NULL
     df = df.where(pd.notnull(df), None)
@@ -87,37 +93,63 @@ def load_table(conn, table_name: str):
     # Batch in chunks of 1 000 to avoid request-size limits
     chunk = 1000
     for i in range(0, len(rows), chunk):
-        cur.executemany(insert_sql, rows[i:i+chunk])
+        with tracing.span("load.chunk", rows=len(rows[i:i+chunk])):
+            cur.executemany(insert_sql, rows[i:i+chunk])
 
     cur.close()
     print(f"  ✅  {table_name.upper():<15} {len(df):>6,} rows loaded")
     return len(df)
 
 
+def write_load_watermark(conn, total_rows: int) -> str:
+    """Record this load in ETL_LOAD_LOG so readers can tell their cached data is stale."""
+    load_id = uuid.uuid4().hex
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO ETL_LOAD_LOG (load_id, loaded_at, rows_loaded) "
+        "VALUES (%s, CURRENT_TIMESTAMP(), %s)",
+        (load_id, total_rows),
+    )
+    cur.close()
+    return load_id
+
+
 # ─────────────────────────────────────────
 # MAIN
 # ─────────────────────────────────────────
-def main():
-    conn = get_connection()
+@tracing.traced("load")
+def main(tables: dict = None):
+    tables = tables or {}
+    with tracing.span("load.connect"):
+        conn = get_connection()
 
     # 1. Create schema + tables
     print("\n📐  Creating schema and tables ...")
-    run_sql_file(conn, os.path.join(SQL_DIR, "schema.sql"))
+    with tracing.span("load.schema"):
+        run_sql_file(conn, os.path.join(SQL_DIR, "schema.sql"))
     print("✅  Schema ready")
 
     # 2. Load each table
     print("\n📤  Loading data ...")
     total_rows = 0
     for table in TABLE_ORDER:
-        total_rows += load_table(conn, table)
+        with tracing.span("load.table", table=table) as sp:
+            n = load_table(conn, table, tables.get(table))
+            sp.rows(n)
+        total_rows += n
 
     # 3. Create analytical views
     views_path = os.path.join(SQL_DIR, "create_views.sql")
     if os.path.exists(views_path):
         print("\n👁️   Creating analytical views ...")
-        run_sql_file(conn, views_path)
+        with tracing.span("load.views"):
+            run_sql_file(conn, views_path)
         print("✅  Views created")
 
+    # 4. Publish the new data version
+    load_id = write_load_watermark(conn, total_rows)
+    print(f"\n🔖  Data version → {load_id}")
+
     conn.close()
     print(f"\n🎉  ETL complete — {total_rows:,} total rows loaded into Snowflake")
 
@@ -0,0 +1,204 @@
+"""
+Supply Chain Analytics — Dashboard Warm-Start Snapshot
+Publishes the dashboard working set as uncompressed Arrow IPC files plus a
+manifest recording the data version they came from. Run after each ETL load;
+the Streamlit app renders from the snapshot at start-up and revalidates it
+against the warehouse in the background.
+
+Readers memory-map the files read-only, so every Streamlit worker process
+on the host shares one copy of the data through the page cache instead of
+holding its own deserialized heap copy.
+
+Usage:
+    python etl/snapshot.py
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from etl import tracing, warehouse, working_set
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+ROOT         = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Relative paths are taken from the project root
+SNAPSHOT_DIR = os.path.join(ROOT, os.environ.get("DASHBOARD_SNAPSHOT_DIR", os.path.join("data", "snapshot")))
+MANIFEST     = "manifest.json"
+LOCK_FILE    = ".publish.lock"
+
+# A snapshot taken with different working-set SQL has different columns;
+# readers ignore it rather than fail on the first query.
+SCHEMA_KEY = hashlib.sha1(
+    json.dumps(working_set.WORKING_SET_SQL, sort_keys=True).encode()).hexdigest()[:12]
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _tmp(dest: str) -> str:
+    # Unique per writing thread, so no two writers ever share a temp file
+    return f"{dest}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+
+@contextmanager
+def _publishing(path: str):
+    """One publisher per snapshot dir at a time: threads of this process queue
+    on a lock, other processes on an flock of LOCK_FILE (where there is one)."""
+    with _locks_guard:
+        lock = _locks.setdefault(os.path.abspath(path), threading.Lock())
+    with lock:
+        try:
+            os.makedirs(path, exist_ok=True)
+            f = open(os.path.join(path, LOCK_FILE), "a")
+        except OSError:
+            f = None   # read-only snapshot dir: the write itself will fail
+        try:
+            if f is not None and fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+        finally:
+            if f is not None:
+                f.close()   # releases the flock
+
+
+def _write_ipc(table: "pa.Table", dest: str):
+    import pyarrow as pa
+    tmp = _tmp(dest)
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, dest)
+
+
+def write(ws: working_set.WorkingSet, path: str = SNAPSHOT_DIR) -> dict:
+    """Publish a working set.
+
+    Data files are named per version and the manifest is swapped in last with
+    an atomic rename, so readers see either the previous snapshot or the whole
+    new one. Files of the version being replaced are kept one generation, for
+    workers that read the old manifest a moment earlier; anything older is
+    removed (mappings already open stay valid after the unlink).
+
+    Publishers take turns, and a version that is already published is not
+    written again.
+    """
+    with _publishing(path):
+        current = read_manifest(path)
+        if current is not None and current["version"] == ws.version:
+            return current
+        return _publish(ws, path)
+
+
+def _publish(ws: working_set.WorkingSet, path: str) -> dict:
+    os.makedirs(path, exist_ok=True)
+    previous = read_manifest(path, any_schema=True) or {"tables": {}}
+    tag = hashlib.sha1(ws.version.encode()).hexdigest()[:10]
+    tables = {}
+    for name, table in ws.tables.items():
+        fname = f"{name}-{tag}.arrow"
+        _write_ipc(table, os.path.join(path, fname))
+        tables[name] = {"file": fname, "rows": table.num_rows,
+                        "bytes": os.path.getsize(os.path.join(path, fname))}
+    manifest = {
+        "version":    ws.version,
+        "schema":     SCHEMA_KEY,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "tables":     tables,
+    }
+    tmp = _tmp(os.path.join(path, MANIFEST))
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(path, MANIFEST))
+
+    keep = {t["file"] for m in (manifest, previous) for t in m["tables"].values()}
+    for fname in os.listdir(path):
+        if fname.endswith((".arrow", ".parquet")) and fname not in keep:
+            try:
+                os.remove(os.path.join(path, fname))
+            except OSError:
+                pass  # still open on a platform that refuses to unlink it
+    return manifest
+
+
+def read_manifest(path: str = SNAPSHOT_DIR, any_schema: bool = False):
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if any_schema or manifest.get("schema") == SCHEMA_KEY else None
+
+
+def read(path: str = SNAPSHOT_DIR):
+    """The snapshot as a WorkingSet of memory-mapped tables, or None when there
+    is no usable one. Nothing is copied: the tables' buffers point straight
+    into the mapped files."""
+    manifest = read_manifest(path)
+    if manifest is None:
+        return None
+    import pyarrow as pa
+    try:
+        tables = {name: pa.ipc.open_file(pa.memory_map(os.path.join(path, t["file"]), "r")).read_all()
+                  for name, t in manifest["tables"].items()}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return working_set.WorkingSet(tables, manifest["version"])
+
+
+def load(conn, version: str, path: str = SNAPSHOT_DIR) -> working_set.WorkingSet:
+    """Working set for `version`, mapped from the snapshot when it is already
+    published there (by the ETL step or another worker process); otherwise
+    pulled from the warehouse and published, so the other workers map it
+    instead of pulling their own copy."""
+    snap = read(path)
+    if snap is not None and snap.version == version:
+        return snap
+    with _publishing(path):
+        # Whoever held the lock before us may have just published it
+        snap = read(path)
+        if snap is not None and snap.version == version:
+            return snap
+        ws = working_set.load(conn, version)
+        try:
+            _publish(ws, path)
+        except OSError:
+            return ws   # read-only snapshot dir: keep the heap copy
+    return read(path) or ws
+
+
+@tracing.traced("snapshot")
+def main():
+    print("\n📸  Snapshotting dashboard working set")
+    with tracing.span("snapshot.connect"):
+        conn = warehouse.connect()
+    try:
+        version = warehouse.data_version(conn)
+        ws = working_set.load(conn, version)
+    finally:
+        conn.close()
+    with tracing.span("snapshot.write") as sp:
+        manifest = write(ws)
+        sp.rows(sum(t["rows"] for t in manifest["tables"].values()))
+    for name, t in manifest["tables"].items():
+        print(f"   ✅  {name:<10} {t['rows']:>8,} rows  {t['bytes']/1024:>8,.0f} KiB")
+    print(f"🔖  Snapshot version → {version}  ({os.path.relpath(SNAPSHOT_DIR, ROOT)}/)")
+
+
+if __name__ == "__main__":
+    main()
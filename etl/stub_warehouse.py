@@ -0,0 +1,133 @@
+"""
+Supply Chain Analytics — Stub Warehouse
+A deterministic, in-process stand-in for Snowflake: the generated CSVs are
+loaded into DuckDB (tables, analytical views and one ETL_LOAD_LOG row), and
+every statement sleeps for a configurable, repeatable latency before it runs.
+
+Used by scripts/load_test.py; install() points warehouse.connect() at it.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import duckdb
+
+ROOT     = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "data", "raw")
+VIEWS_SQL = os.path.join(ROOT, "sql", "create_views.sql")
+TABLES   = ["suppliers", "products", "customers", "orders", "shipments"]
+VERSION  = "stub-0001"
+
+
+def build_db(data_dir: str = DATA_DIR, version: str = VERSION):
+    """DuckDB database shaped like SUPPLY_CHAIN.ANALYTICS, built from data/raw/*.csv."""
+    missing = [t for t in TABLES if not os.path.exists(os.path.join(data_dir, f"{t}.csv"))]
+    if missing:
+        raise FileNotFoundError(
+            f"No {', '.join(missing)} CSVs in {data_dir} — run `python data/generate_data.py` first")
+    db = duckdb.connect()
+    for t in TABLES:
+        path = os.path.join(data_dir, f"{t}.csv").replace("'", "''")
+        db.execute(f"CREATE TABLE {t.upper()} AS SELECT * FROM read_csv_auto('{path}')")
+    db.execute("CREATE TABLE ETL_LOAD_LOG (load_id VARCHAR, loaded_at TIMESTAMP, rows_loaded INT)")
+    db.execute("INSERT INTO ETL_LOAD_LOG VALUES (?, now(), 0)", [version])
+
+    # Views are Snowflake SQL; TO_CHAR is only used for 'Mon YYYY' labels
+    db.execute("CREATE MACRO to_char(d, f) AS strftime(CAST(d AS DATE), '%b %Y')")
+    with open(VIEWS_SQL) as f:
+        for stmt in f.read().split(";"):
+            body = "\n".join(l for l in stmt.splitlines() if not l.strip().startswith("--"))
+            if body.strip() and not body.strip().upper().startswith("USE "):
+                db.execute(body)
+    return db
+
+
+class StubCursor:
+    """The subset of the Snowflake cursor API that etl.warehouse uses."""
+
+    def __init__(self, conn):
+        self._conn   = conn
+        self._cur    = conn._db.cursor()
+        self._result = None
+        self.description = None
+
+    def execute(self, sql, params=None):
+        time.sleep(self._conn.latency_for(sql, params))
+        self._result = self._cur.execute(sql, params).arrow()
+        self.description = [(name.upper(),) for name in self._result.column_names]
+        with self._conn._lock:
+            self._conn.statements += 1
+        return self
+
+    def fetch_arrow_batches(self):
+        if self._result.num_rows:
+            yield self._result
+
+    def fetch_arrow_all(self, force_return_table=False):
+        return self._result if (self._result.num_rows or force_return_table) else None
+
+    def fetchall(self):
+        return list(zip(*(c.to_pylist() for c in self._result.columns)))
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StubConnection:
+    """One 'session' on the stub warehouse.
+
+    Each statement costs latency_s plus up to jitter_s, where the jitter is
+    derived from a hash of the SQL and its parameters — the same query always
+    costs the same, so runs are repeatable.
+    """
+
+    def __init__(self, db, latency_s: float = 0.0, jitter_s: float = 0.0):
+        self._db        = db
+        self._lock      = threading.Lock()
+        self._closed    = False
+        self.latency_s  = latency_s
+        self.jitter_s   = jitter_s
+        self.statements = 0
+
+    def latency_for(self, sql, params=None) -> float:
+        if not self.jitter_s:
+            return self.latency_s
+        h = hashlib.sha1(f"{' '.join(sql.split())}|{params}".encode()).digest()
+        return self.latency_s + self.jitter_s * int.from_bytes(h[:4], "big") / 0xFFFFFFFF
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        self._closed = True
+
+
+def install(latency_s: float = 0.0, jitter_s: float = 0.0, data_dir: str = DATA_DIR):
+    """Route warehouse.connect() — and so every default ConnectionPool — to the stub.
+
+    Returns the list of connections handed out, for statement counts.
+    """
+    from etl import warehouse
+    db, opened = build_db(data_dir), []
+
+    def connect():
+        conn = StubConnection(db, latency_s, jitter_s)
+        opened.append(conn)
+        return conn
+
+    warehouse.connect = connect
+    return opened
@@ -0,0 +1,94 @@
+"""
+Supply Chain Analytics — Time-Series Helpers
+Pick an aggregation grain that fits the visible date range into the chart's
+width, and downsample line series that still carry more points than pixels.
+"""
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Assumed plot width for full-width dashboard charts, and the minimum
+# horizontal pixels each drawn point (bar or line vertex) should get.
+CHART_WIDTH_PX    = int(os.environ.get("DASHBOARD_CHART_WIDTH_PX", "1400"))
+MIN_PX_PER_POINT  = int(os.environ.get("DASHBOARD_MIN_PX_PER_POINT", "20"))
+
+# DATE_TRUNC parts, finest first, with their approximate length in days
+GRAINS = (
+    ("day",     1.0),
+    ("week",    7.0),
+    ("month",   30.44),
+    ("quarter", 91.31),
+    ("year",    365.25),
+)
+GRAIN_LABELS = {"day": "Daily", "week": "Weekly", "month": "Monthly",
+                "quarter": "Quarterly", "year": "Yearly"}
+
+
+def max_points(width_px: int = CHART_WIDTH_PX, px_per_point: int = MIN_PX_PER_POINT) -> int:
+    return max(2, width_px // px_per_point)
+
+
+def pick_grain(start: date, end: date, width_px: int = CHART_WIDTH_PX,
+               px_per_point: int = MIN_PX_PER_POINT) -> str:
+    """Finest grain whose bucket count over [start, end] fits the chart width."""
+    span  = max((pd.Timestamp(end) - pd.Timestamp(start)).days + 1, 1)
+    limit = max_points(width_px, px_per_point)
+    for grain, days in GRAINS:
+        if span / days <= limit:
+            return grain
+    return GRAINS[-1][0]
+
+
+# ─────────────────────────────────────────
+# DOWNSAMPLING
+# ─────────────────────────────────────────
+def lttb_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of the n points that best keep the shape."""
+    size = len(y)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)   # n-2 inner buckets
+    keep  = np.empty(n, dtype=int)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, (edges[i + 2] if i + 2 < len(edges) else size)
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def minmax_indices(y: np.ndarray, n: int) -> np.ndarray:
+    """Keep the min and max of each of n/2 buckets — preserves every spike and dip."""
+    size = len(y)
+    if n >= size or n < 2:
+        return np.arange(size)
+    y = np.asarray(y, dtype=float)
+    keep = []
+    for chunk in np.array_split(np.arange(size), n // 2):
+        seg = y[chunk]
+        keep += [chunk[seg.argmin()], chunk[seg.argmax()]]
+    return np.unique(keep)
+
+
+def downsample(df: pd.DataFrame, x: str, y: str, n: int, method: str = "lttb") -> pd.DataFrame:
+    """Rows of df (sorted by x) reduced to at most ~n points along y."""
+    if len(df) <= n:
+        return df
+    if method == "minmax":
+        idx = minmax_indices(df[y].to_numpy(), n)
+    else:
+        xs = df[x].to_numpy()
+        if not np.issubdtype(xs.dtype, np.number):
+            xs = pd.to_datetime(df[x]).astype("int64").to_numpy()
+        idx = lttb_indices(xs, df[y].to_numpy(), n)
+    return df.iloc[idx]
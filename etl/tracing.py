@@ -0,0 +1,229 @@
+"""
+Supply Chain Analytics — Pipeline Tracing
+Nested timing spans for the command-line entry points (pipeline runner, data
+generator, Tableau export, ETL load, snapshot, reports, scheduler, fan-out):
+
+    @tracing.traced("load")                       # root span of the run
+    def main(): ...
+
+    with tracing.span("load.table", table="orders") as sp:
+        ...
+        sp.rows(len(df))
+
+Each span records wall time, CPU time of its own thread, the process's peak
+RSS when it closed, a row count and any attributes. When the root closes the
+trace is written to PIPELINE_TRACE_DIR twice: <root>_<time>.json (the span
+tree) and <root>_<time>.trace.json (Chrome trace events — open in
+chrome://tracing or https://ui.perfetto.dev). A root opened inside another
+span — a step run in-process by run_pipeline.py — is an ordinary child span.
+
+Spans follow contextvars, so asyncio tasks and asyncio.to_thread() nest
+under the span that started them; for executor threads submit
+tracing.bind(fn) instead of fn.
+
+PIPELINE_TRACE_PROFILE=load.table,report.* runs the matching spans under
+cProfile and saves one .prof per span next to the trace (pstats / snakeviz).
+"""
+import contextvars
+import cProfile
+import fnmatch
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+ROOT      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENABLED   = os.environ.get("PIPELINE_TRACE", "1") not in ("0", "false")
+TRACE_DIR = os.path.join(ROOT, os.environ.get("PIPELINE_TRACE_DIR", os.path.join("logs", "traces")))
+TRACE_KEEP = int(os.environ.get("PIPELINE_TRACE_KEEP", "200"))
+PROFILE   = [p.strip() for p in os.environ.get("PIPELINE_TRACE_PROFILE", "").split(",") if p.strip()]
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+def peak_rss_mb():
+    """Process high-water RSS in MiB (None where getrusage is unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+class Span:
+    def __init__(self, name: str, parent=None, **attrs):
+        self.name     = name
+        self.parent   = parent
+        self.attrs    = attrs
+        self.children = []
+        self.thread   = threading.current_thread().name
+        self.tid      = threading.get_native_id()
+        self.root     = parent.root if parent else self
+        self.t0       = time.perf_counter()
+        self.cpu0     = time.thread_time()
+        self.wall_s   = self.cpu_s = self.rss_mb = None
+        if parent:
+            parent.children.append(self)
+
+    def rows(self, n: int):
+        """Add n to the span's row count (call once, or once per batch)."""
+        self.attrs["rows"] = self.attrs.get("rows", 0) + int(n)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def close(self):
+        self.wall_s = time.perf_counter() - self.t0
+        self.cpu_s  = time.thread_time() - self.cpu0
+        self.rss_mb = peak_rss_mb()
+
+    def to_dict(self) -> dict:
+        return {"name": self.name,
+                "start_ms": round((self.t0 - self.root.t0) * 1000, 3),
+                "wall_ms":  None if self.wall_s is None else round(self.wall_s * 1000, 3),
+                "cpu_ms":   None if self.cpu_s is None else round(self.cpu_s * 1000, 3),
+                "peak_rss_mb": self.rss_mb, "thread": self.thread, **self.attrs,
+                "children": [c.to_dict() for c in self.children]}
+
+
+class _NullSpan:
+    def rows(self, n):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+
+def _profiled(name: str) -> bool:
+    # One profiler per thread: a span nested in a profiled one is already covered
+    return any(fnmatch.fnmatchcase(name, p) for p in PROFILE) and sys.getprofile() is None
+
+
+def _dump_profile(profiler, sp: Span):
+    profiled = [s for s in _walk(sp.root) if "profile" in s.attrs]
+    path = os.path.join(TRACE_DIR, f"{sp.root.attrs['trace_id']}.{sp.name}.{len(profiled)}.prof")
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    profiler.dump_stats(path)
+    sp.attrs["profile"] = os.path.relpath(path, ROOT)
+
+
+@contextmanager
+def _active(sp: Span):
+    token = _current.set(sp)
+    profiler = cProfile.Profile() if _profiled(sp.name) else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield sp
+    except BaseException as e:
+        sp.attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+            _dump_profile(profiler, sp)
+        sp.close()
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """A child of the current span; outside any trace it records nothing."""
+    parent = _current.get()
+    if not ENABLED or parent is None:
+        yield _NullSpan()
+        return
+    with _active(Span(name, parent, **attrs)) as sp:
+        yield sp
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Root span of a run, exported when it closes (a child span when nested)."""
+    if not ENABLED or _current.get() is not None:
+        with span(name, **attrs) as sp:
+            yield sp
+        return
+    root = Span(name, trace_id=f"{name}_{datetime.now():%Y%m%d-%H%M%S}_{os.getpid()}", **attrs)
+    try:
+        with _active(root):
+            yield root
+    finally:
+        try:
+            path = export(root)
+            print(f"🧭  Trace: {os.path.relpath(path, ROOT)} ({root.wall_s:.1f}s)", flush=True)
+        except OSError as e:
+            print(f"⚠️   Trace not written: {e}", flush=True)
+
+
+def traced(name: str):
+    """Decorator form of trace() for an entry point's main()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with trace(name):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+
+def bind(fn):
+    """fn bound to the current span, for executor.submit() on another thread."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+# ─────────────────────────────────────────
+# EXPORT
+# ─────────────────────────────────────────
+def _walk(sp: Span):
+    yield sp
+    for child in list(sp.children):
+        yield from _walk(child)
+
+
+def chrome_events(root: Span) -> list:
+    """Complete ("X") events plus thread names, timestamps in µs from the root's start."""
+    pid, events, threads = os.getpid(), [], {}
+    for sp in _walk(root):
+        threads[sp.tid] = sp.thread
+        args = {"cpu_ms": round((sp.cpu_s or 0.0) * 1000, 3), "peak_rss_mb": sp.rss_mb, **sp.attrs}
+        events.append({"name": sp.name, "ph": "X", "pid": pid, "tid": sp.tid,
+                       "ts": round((sp.t0 - root.t0) * 1e6, 1),
+                       "dur": round((sp.wall_s or 0.0) * 1e6, 1), "args": args})
+    events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+               for tid, name in threads.items()]
+    return events
+
+
+def export(root: Span, out_dir: str = TRACE_DIR) -> str:
+    """Write the span tree and the Chrome trace; returns the tree's path."""
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, root.attrs["trace_id"])
+    with open(f"{stem}.json", "w") as f:
+        json.dump({"started_at": datetime.fromtimestamp(time.time() - root.wall_s).isoformat(timespec="seconds"),
+                   "argv": sys.argv, **root.to_dict()}, f, indent=1, default=str)
+    with open(f"{stem}.trace.json", "w") as f:
+        json.dump({"traceEvents": chrome_events(root), "displayTimeUnit": "ms"}, f, default=str)
+    _prune(out_dir)
+    return f"{stem}.json"
+
+
+def _prune(out_dir: str):
+    """Keep the newest TRACE_KEEP traces (a daemon writes one per job run)."""
+    trees = sorted(glob.glob(os.path.join(out_dir, "*.json")), key=os.path.getmtime)
+    trees = [p for p in trees if not p.endswith(".trace.json")]
+    for old in trees[:max(0, len(trees) - TRACE_KEEP)]:
+        for path in glob.glob(old[:-len(".json")] + ".*"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
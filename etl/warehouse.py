@@ -0,0 +1,366 @@
+"""
+Supply Chain Analytics — Warehouse Access
+Shared Snowflake connection settings and query helpers used by the
+Streamlit dashboard and the AI report generator.
+
+pandas, pyarrow and the Snowflake connector are imported on first use, so
+importing this module (every entry point does) stays cheap.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from etl import tracing
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+# Upper bound on queries in flight per batch — keeps one dashboard render
+# from monopolising the warehouse's concurrency slots.
+MAX_CONCURRENT_QUERIES = int(os.environ.get("SNOWFLAKE_MAX_CONCURRENT_QUERIES", "16"))
+
+# Connection pool sizing (see ConnectionPool)
+POOL_SIZE             = int(os.environ.get("SNOWFLAKE_POOL_SIZE", "16"))
+POOL_IDLE_TIMEOUT     = float(os.environ.get("SNOWFLAKE_POOL_IDLE_TIMEOUT", "600"))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get("SNOWFLAKE_POOL_CHECKOUT_TIMEOUT", "30"))
+POOL_PING_AFTER       = float(os.environ.get("SNOWFLAKE_POOL_PING_AFTER", "60"))
+
+# Latest ETL watermark (see ETL_LOAD_LOG in sql/schema.sql). The fallback
+# fingerprint only touches micro-partition metadata, so it stays cheap on
+# warehouses loaded before the watermark table existed.
+DATA_VERSION_SQL = "SELECT load_id FROM ETL_LOAD_LOG ORDER BY loaded_at DESC LIMIT 1"
+DATA_VERSION_FALLBACK_SQL = "SELECT COUNT(*), MAX(order_date) FROM ORDERS"
+
+
+# ─────────────────────────────────────────
+# CONNECTION
+# ─────────────────────────────────────────
+def snowflake_config() -> dict:
+    """Connection kwargs for snowflake.connector.connect, read from the environment."""
+    return {
+        "account":   os.environ["SNOWFLAKE_ACCOUNT"],
+        "user":      os.environ["SNOWFLAKE_USER"],
+        "password":  os.environ["SNOWFLAKE_PASSWORD"],
+        "warehouse": os.environ.get("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH"),
+        "database":  os.environ.get("SNOWFLAKE_DATABASE", "SUPPLY_CHAIN"),
+        "schema":    os.environ.get("SNOWFLAKE_SCHEMA",   "ANALYTICS"),
+    }
+
+
+def connect():
+    """Open a connection that binds ? placeholders server-side (qmark paramstyle).
+
+    Server-side binding keeps the SQL text identical across parameter values,
+    which is what lets Snowflake's result cache serve repeated filter choices.
+    """
+    import snowflake.connector
+    return snowflake.connector.connect(**snowflake_config(), paramstyle="qmark")
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of Snowflake connections.
+
+    - At most `size` connections are open; callers beyond that wait up to
+      `checkout_timeout` seconds for one to come back.
+    - Every checkout is health-checked: closed connections are replaced, and
+      ones idle longer than `ping_after` seconds must answer SELECT 1 first.
+    - Connections idle longer than `idle_timeout` are closed and dropped.
+    - run() additionally caps statements in flight at `max_queries` and
+      retries once on a fresh connection when the session has died
+      (e.g. an expired token), so one bad session never breaks the app.
+
+    Pass a pool anywhere a connection is accepted in this module.
+    """
+
+    def __init__(self, connect=None, size: int = POOL_SIZE,
+                 max_queries: int = MAX_CONCURRENT_QUERIES,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 checkout_timeout: float = POOL_CHECKOUT_TIMEOUT,
+                 ping_after: float = POOL_PING_AFTER):
+        self._connect         = connect   # None → module-level connect(), looked up per call
+        self._size            = size
+        self._idle_timeout    = idle_timeout
+        self._checkout_timeout = checkout_timeout
+        self._ping_after      = ping_after
+        self._slots   = threading.BoundedSemaphore(size)
+        self._queries = threading.BoundedSemaphore(max_queries)
+        self._lock    = threading.Lock()
+        self._idle    = deque()          # (conn, returned_at), most recent on the right
+        self._open    = 0
+        self._in_use  = 0
+        self._metrics = Counter()
+
+    # ── metrics ──
+    def _count(self, key: str, n: float = 1):
+        with self._lock:
+            self._metrics[key] += n
+
+    def stats(self) -> dict:
+        """Counters since start-up plus current occupancy."""
+        with self._lock:
+            return {
+                "open":         self._open,
+                "in_use":       self._in_use,
+                "idle":         len(self._idle),
+                "size":         self._size,
+                "checkouts":    self._metrics["checkouts"],
+                "waits":        self._metrics["waits"],
+                "wait_ms":      round(self._metrics["wait_s"] * 1000, 1),
+                "timeouts":     self._metrics["timeouts"],
+                "errors":       self._metrics["errors"],
+                "reconnects":   self._metrics["reconnects"],
+                "evictions":    self._metrics["evictions"],
+                "queries":      self._metrics["queries"],
+            }
+
+    # ── checkout / checkin ──
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+
+    def _evict_idle(self):
+        now, stale = time.monotonic(), []
+        with self._lock:
+            while self._idle and now - self._idle[0][1] > self._idle_timeout:
+                stale.append(self._idle.popleft()[0])
+        for conn in stale:
+            self._close(conn)
+            self._count("evictions")
+
+    def _healthy(self, conn, idle_s: float) -> bool:
+        if conn.is_closed():
+            return False
+        if idle_s < self._ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        self._evict_idle()
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                break
+            conn, returned_at = entry
+            if self._healthy(conn, time.monotonic() - returned_at):
+                return conn
+            self._close(conn)
+            self._count("reconnects")
+        conn = (self._connect or connect)()
+        with self._lock:
+            self._open += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out for the duration of the block."""
+        t0 = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            if not self._slots.acquire(timeout=self._checkout_timeout):
+                self._count("timeouts")
+                raise TimeoutError(
+                    f"No Snowflake connection free after {self._checkout_timeout:.0f}s "
+                    f"(pool size {self._size})")
+        self._count("wait_s", time.perf_counter() - t0)
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            self._count("errors")
+            raise
+        with self._lock:
+            self._in_use += 1
+            self._metrics["checkouts"] += 1
+        try:
+            yield conn
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            if conn.is_closed():
+                self._close(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            self._slots.release()
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn(conn, *args, **kwargs) on a pooled connection under the query cap."""
+        with self._queries:
+            self._count("queries")
+            for attempt in (1, 2):
+                with self.connection() as conn:
+                    try:
+                        return fn(conn, *args, **kwargs)
+                    except Exception:
+                        if attempt == 2 or not _session_lost(conn):
+                            raise
+                        conn.close()  # dropped on checkin; retry on a new session
+                        self._count("reconnects")
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close(conn)
+
+
+def _session_lost(conn) -> bool:
+    """True when a failed statement left its connection unusable."""
+    if conn.is_closed():
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1").fetchone()
+        return False
+    except Exception:
+        return True
+
+
+# ─────────────────────────────────────────
+# QUERIES
+# ─────────────────────────────────────────
+def fetch_arrow(cur) -> "pa.Table":
+    """Collect a cursor's result as an Arrow table with lower-cased column names.
+
+    Result chunks are pulled one Arrow batch at a time and stitched together
+    column-wise, so large results (daily order volume, fulfilment detail)
+    never materialise as per-row Python tuples. Statements without an Arrow
+    result set (SHOW / DESCRIBE) fall back to fetchall().
+    """
+    import pandas as pd
+    import pyarrow as pa
+    from snowflake.connector.errors import NotSupportedError
+    try:
+        batches = list(cur.fetch_arrow_batches())
+        table = (pa.concat_tables(batches) if batches
+                 else cur.fetch_arrow_all(force_return_table=True))
+    except NotSupportedError:
+        cols = [d[0] for d in cur.description]
+        table = pa.Table.from_pandas(pd.DataFrame(cur.fetchall(), columns=cols),
+                                     preserve_index=False)
+    return table.rename_columns([c.lower() for c in table.column_names])
+
+
+def run_query_arrow(conn, sql: str, params=None) -> "pa.Table":
+    """Execute one statement on its own cursor and return the result as Arrow."""
+    if isinstance(conn, ConnectionPool):
+        return conn.run(run_query_arrow, sql, params)
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return fetch_arrow(cur)
+    finally:
+        cur.close()
+
+
+def run_query(conn, sql: str, params=None) -> "pd.DataFrame":
+    """Execute one statement on its own cursor and return the result as a DataFrame."""
+    return run_query_arrow(conn, sql, params).to_pandas()
+
+
+def split_query(query):
+    """Accept either a bare SQL string or a (sql, params) pair."""
+    if isinstance(query, str):
+        return query, None
+    sql, params = query
+    return sql, (list(params) or None)
+
+
+def data_version(conn) -> str:
+    """Identifier of the data currently in the warehouse; changes on every ETL load."""
+    if isinstance(conn, ConnectionPool):
+        return conn.run(data_version)
+    from snowflake.connector.errors import ProgrammingError
+    cur = conn.cursor()
+    try:
+        try:
+            row = cur.execute(DATA_VERSION_SQL).fetchone()
+            if row:
+                return str(row[0])
+        except ProgrammingError:
+            pass  # no watermark table yet
+        n, latest = cur.execute(DATA_VERSION_FALLBACK_SQL).fetchone()
+        return f"orders-{n}-{latest}"
+    finally:
+        cur.close()
+
+
+@dataclass
+class BatchResult:
+    """Frames from a fetch_many() call plus per-query and wall-clock timings (seconds)."""
+    frames:  dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    wall_s:  float = 0.0
+
+    def __getitem__(self, name: str) -> "pd.DataFrame":
+        return self.frames[name]
+
+    @property
+    def serial_s(self) -> float:
+        """What the batch would have cost run one query after another."""
+        return sum(self.timings.values())
+
+    @property
+    def slowest_s(self) -> float:
+        return max(self.timings.values(), default=0.0)
+
+    def timing_table(self) -> "pd.DataFrame":
+        import pandas as pd
+        df = pd.DataFrame(
+            [(name, round(s * 1000, 1)) for name, s in self.timings.items()],
+            columns=["query", "ms"],
+        )
+        return df.sort_values("ms", ascending=False, ignore_index=True)
+
+
+def fetch_many(conn, queries: dict, max_workers: int = MAX_CONCURRENT_QUERIES,
+               as_arrow: bool = False) -> BatchResult:
+    """Run a batch of named queries concurrently and gather them into one result.
+
+    Values in `queries` are SQL strings or (sql, params) pairs.
+
+    Each query gets its own cursor — on the shared connection (the connector
+    is thread-safe at the connection level) or on its own pooled connection
+    when `conn` is a ConnectionPool — so the batch costs roughly the slowest
+    query rather than the sum of all of them. With as_arrow=True the frames
+    are left as Arrow tables.
+    """
+    fetch = run_query_arrow if as_arrow else run_query
+
+    def timed(name, query):
+        sql, params = split_query(query)
+        with tracing.span("query", query=name) as sp:
+            t0 = time.perf_counter()
+            df = fetch(conn, sql, params)
+            sp.rows(len(df))
+        return df, time.perf_counter() - t0
+
+    result = BatchResult()
+    t0 = time.perf_counter()
+    workers = max(1, min(max_workers, len(queries)))
+    with tracing.span("fetch", queries=len(queries)), \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sf-query") as pool:
+        futures = {name: pool.submit(tracing.bind(timed), name, query) for name, query in queries.items()}
+        for name, fut in futures.items():
+            result.frames[name], result.timings[name] = fut.result()
+    result.wall_s = time.perf_counter() - t0
+    return result
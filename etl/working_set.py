@@ -0,0 +1,84 @@
+"""
+Supply Chain Analytics — Dashboard Working Set
+A compact columnar copy of the fact data the dashboard slices, pulled from
+Snowflake once per data version as Arrow and queried locally with DuckDB.
+"""
+import time
+from typing import TYPE_CHECKING
+
+from etl import warehouse
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Only the columns the dashboard reads. ORDERS keeps every status because
+# the order funnel and daily heatmap count all orders; SHIPMENTS is limited
+# to delivered orders, the only ones any tab joins against.
+WORKING_SET_SQL = {
+    "orders": """
+        SELECT order_id, order_date, status, region, segment,
+               product_name, category, sub_category,
+               supplier_id, supplier_name, supplier_country,
+               quantity, discount, revenue, cogs
+        FROM ORDERS
+    """,
+    "shipments": """
+        SELECT sh.shipment_id, sh.order_id, sh.carrier, sh.actual_delivery,
+               sh.on_time, sh.delay_days, sh.shipment_cost
+        FROM SHIPMENTS sh
+        JOIN ORDERS o ON o.order_id = sh.order_id
+        WHERE o.status = 'Delivered'
+    """,
+    "suppliers": """
+        SELECT supplier_id, reliability_score, lead_time_days, category
+        FROM SUPPLIERS
+    """,
+}
+
+
+class WorkingSet:
+    """Arrow tables exposed to DuckDB under their warehouse table names.
+
+    The tables are registered on a fresh DuckDB cursor per query, which is
+    zero-copy and keeps concurrent Streamlit sessions off a shared cursor.
+    """
+
+    def __init__(self, tables: dict, version: str = ""):
+        self.tables  = tables
+        self.version = version
+        import duckdb
+        self._db     = duckdb.connect()
+
+    @property
+    def rows(self) -> int:
+        return sum(t.num_rows for t in self.tables.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.nbytes for t in self.tables.values())
+
+    def query(self, sql: str, params=None) -> "pd.DataFrame":
+        cur = self._db.cursor()
+        try:
+            for name, table in self.tables.items():
+                cur.register(name, table)
+            return cur.execute(sql, params).df()
+        finally:
+            cur.close()
+
+    def fetch_many(self, queries: dict) -> warehouse.BatchResult:
+        """Local counterpart of warehouse.fetch_many — same result shape, no round trips."""
+        result = warehouse.BatchResult()
+        t0 = time.perf_counter()
+        for name, query in queries.items():
+            q0 = time.perf_counter()
+            result.frames[name]  = self.query(*warehouse.split_query(query))
+            result.timings[name] = time.perf_counter() - q0
+        result.wall_s = time.perf_counter() - t0
+        return result
+
+
+def load(conn, version: str = "") -> WorkingSet:
+    """Pull the working set from Snowflake as Arrow (tables fetched concurrently)."""
+    batch = warehouse.fetch_many(conn, WORKING_SET_SQL, as_arrow=True)
+    return WorkingSet(batch.frames, version)
@@ -0,0 +1,146 @@
+"""
+Supply Chain Analytics — Import-Time Budget
+Imports each entry point in a fresh interpreter under `python -X importtime`,
+with the Snowflake and Anthropic credentials removed from the environment,
+and fails when one of them
+  - raises on import (reads a credential or does work at import time),
+  - pulls in a dependency it should only import on first use, or
+  - takes longer than its budget.
+
+Targets:
+    CLI start            — every command-line entry point, imported as a
+                           module: no pandas / NumPy / Arrow / DuckDB /
+                           anthropic / Snowflake connector until they run
+    Streamlit cold start — streamlit/app.py's module-level imports plus the
+                           project modules it imports while rendering (the
+                           heavy third-party ones it needs are allowed)
+
+Usage:
+    python scripts/import_budget.py                # table; exit 1 on a breach
+    python scripts/import_budget.py --top 10       # also the slowest imports
+    python scripts/import_budget.py --cli-ms 100 --app-ms 1000
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP  = os.path.join(ROOT, "streamlit", "app.py")
+
+CREDENTIALS = ("SNOWFLAKE_ACCOUNT", "SNOWFLAKE_USER", "SNOWFLAKE_PASSWORD", "ANTHROPIC_API_KEY")
+HEAVY = ("pandas", "numpy", "pyarrow", "duckdb", "anthropic", "snowflake.connector",
+         "plotly", "streamlit")
+# The dashboard needs these to draw its first page; the rest wait for first use
+APP_ALLOWED = ("pandas", "numpy", "pyarrow", "plotly", "streamlit")
+
+CLI_MODULES = [
+    "scripts/run_pipeline.py",
+    "data/generate_data.py",
+    "data/generate_tableau_csvs.py",
+    "etl/load_snowflake.py",
+    "etl/snapshot.py",
+    "ai/report_generator.py",
+    "ai/fanout.py",
+    "ai/scheduler.py",
+]
+REPEATS = 3   # best of, to keep disk-cache noise out of the verdict
+
+
+def import_line(path: str) -> str:
+    """`import data.generate_data`; scripts/ is not a package, so its modules import bare."""
+    module = os.path.splitext(path)[0].replace("/", ".")
+    return f"import {module.removeprefix('scripts.')}"
+
+
+def app_imports() -> str:
+    """Import statements of the dashboard's cold start: its module-level
+    imports, plus the project modules (etl.*, ai.*) imported while rendering."""
+    tree = ast.parse(open(APP).read())
+    lines = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module in ("etl", "ai") and node.col_offset:
+            lines.append(ast.unparse(node))
+    return "\n".join(dict.fromkeys(lines))
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self µs, cumulative µs, depth) per `-X importtime` line."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line.split(":", 1)[1].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative), depth))
+    return rows
+
+
+def measure(code: str) -> dict:
+    """Best-of-REPEATS import cost of `code` over a bare interpreter start."""
+    env = {k: v for k, v in os.environ.items() if k not in CREDENTIALS}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    best = None
+    for _ in range(REPEATS):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              cwd=ROOT, env=env, capture_output=True, text=True)
+        if proc.returncode:
+            errors = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+            return {"error": errors[-1] if errors else f"exit {proc.returncode}"}
+        rows = parse_importtime(proc.stderr)
+        run = {"ms": sum(c for _, _, c, d in rows if d == 0) / 1000, "rows": rows}
+        if best is None or run["ms"] < best["ms"]:
+            best = run
+    return best
+
+
+def check(name: str, code: str, budget_ms: float, allowed=(), baseline_ms: float = 0.0) -> dict:
+    result = measure(code)
+    result.update(name=name, budget_ms=budget_ms, problems=[])
+    if "error" in result:
+        result["problems"].append(f"import failed: {result['error']}")
+        return result
+    result["ms"] = max(0.0, result["ms"] - baseline_ms)
+    loaded = {n for n, *_ in result["rows"]}
+    heavy = [h for h in HEAVY if h in loaded and h not in allowed]
+    if heavy:
+        result["problems"].append(f"imports {', '.join(heavy)}")
+    if result["ms"] > budget_ms:
+        result["problems"].append(f"{result['ms']:,.0f} ms > {budget_ms:,.0f} ms budget")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check entry-point import time against a budget")
+    parser.add_argument("--cli-ms", type=float, default=150, help="Budget per CLI entry point")
+    parser.add_argument("--app-ms", type=float, default=1500, help="Budget for the Streamlit cold start")
+    parser.add_argument("--top",    type=int,   default=0, help="Also list the N slowest imports per target")
+    args = parser.parse_args()
+
+    print("\n⏱️   Import-time budget (python -X importtime, no credentials)")
+    baseline = measure("pass")["ms"]   # interpreter start-up (site, encodings)
+    prelude = f"import sys; sys.path.insert(0, {ROOT!r}); sys.path.insert(0, {os.path.join(ROOT, 'scripts')!r})\n"
+    results = [check(path, prelude + import_line(path), args.cli_ms, baseline_ms=baseline)
+               for path in CLI_MODULES]
+    results.append(check("streamlit cold start", prelude + app_imports(), args.app_ms,
+                         allowed=APP_ALLOWED, baseline_ms=baseline))
+
+    for r in results:
+        mark = "✅" if not r["problems"] else "❌"
+        ms = f"{r['ms']:>8,.0f} ms" if "ms" in r else f"{'—':>11}"
+        print(f"   {mark}  {r['name']:<32} {ms}  / {r['budget_ms']:,.0f}"
+              + (f"   {'; '.join(r['problems'])}" if r["problems"] else ""))
+        if args.top and "rows" in r:
+            for mod, self_us, _, _ in sorted(r["rows"], key=lambda row: -row[1])[:args.top]:
+                print(f"          {self_us/1000:>8.1f} ms  {mod}")
+
+    failed = [r for r in results if r["problems"]]
+    if failed:
+        print(f"\n❌  {len(failed)} of {len(results)} over budget")
+        sys.exit(1)
+    print(f"\n🎉  All {len(results)} within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Supply Chain Analytics — Dashboard Load Test
+Runs streamlit/app.py headless (Streamlit AppTest) for N concurrent sessions
+against the stub warehouse (etl/stub_warehouse.py) and reports render
+latency percentiles, CPU and memory.
+
+Usage:
+    python scripts/load_test.py                          # 8 sessions, 10 actions each
+    python scripts/load_test.py --sessions 1,4,16,32     # sweep concurrency levels
+    python scripts/load_test.py --latency-ms 400 --backend warehouse
+    python scripts/load_test.py --json logs/load_test.json
+
+Every session renders the page once, then performs --actions interactions
+picked (per session, from --seed) among:
+    filter  — change the Region / Segment / Supplier multiselects
+    dates   — pick a new order-date range
+    tab     — use a widget on another tab (Products category, AI report type).
+              Switching tabs is client-side in Streamlit; the server only sees
+              the rerun triggered by interacting with the tab's widgets.
+
+All sessions share one process — and so the same st.cache_data /
+st.cache_resource entries and connection pool — exactly like sessions on one
+Streamlit server. Each concurrency level starts from cleared caches; its
+first render is reported separately as the cold render.
+
+A render fails when it shows an exception, when the script runner stops it
+without one (e.g. a compile error) or when it comes back empty. Failed
+renders are counted as errors and left out of the latency figures, and the
+session reloads the page before its next action.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import traceback
+from datetime import timedelta
+from urllib import parse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP  = os.path.join(ROOT, "streamlit", "app.py")
+sys.path.insert(0, ROOT)
+
+from etl import stub_warehouse
+
+ACTIONS = (("filter", 0.4), ("dates", 0.3), ("tab", 0.3))
+
+
+# ─────────────────────────────────────────
+# HEADLESS SESSIONS
+# ─────────────────────────────────────────
+def install_runtime():
+    """One mock Streamlit runtime for the whole process.
+
+    AppTest installs (and tears down) a global runtime around every run, which
+    breaks as soon as two sessions run at once; Session skips that and relies
+    on this shared one instead, as a real server would.
+    """
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    rt = MagicMock(spec=Runtime)
+    rt.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    rt.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = rt
+
+
+def session_class():
+    from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    class Session(AppTest):
+        """AppTest without the per-run global runtime swap (see install_runtime)."""
+
+        def _run(self, widget_state=None, timeout=None):
+            runner = LocalScriptRunner(self._script_path, self.session_state)
+            self._tree = runner.run(widget_state, self.query_params,
+                                    timeout or self.default_timeout)
+            self._tree._runner = self
+            self._events = list(zip(runner.events, runner.event_data))
+            self.query_params = parse.parse_qs(
+                runner.event_data[-1]["client_state"].query_string)
+            return self
+
+        def run_error(self):
+            """Why the last run failed, or None. Besides an exception shown on
+            the page, the runner can stop a run without one — a compile error
+            (concurrent runs have hit "AST constructor recursion depth
+            mismatch") — and a run can come back with nothing rendered."""
+            if self.exception:
+                return self.exception[0].message
+            for event, data in self._events:
+                if event == ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR:
+                    exc = data.get("exception")
+                    return f"script not run: {type(exc).__name__}: {exc}"
+            if not self.main.children:
+                return "empty render"
+            return None
+
+    return Session
+
+
+def widget(elements, label):
+    return next(w for w in elements if w.label == label)
+
+
+def act(at, action, rng, lo, hi):
+    """Apply one interaction to the session and rerun it."""
+    if action == "filter":
+        box = widget(at.multiselect, rng.choice(["Region", "Segment", "Supplier"]))
+        box.set_value(rng.sample(box.options, rng.randint(0, min(2, len(box.options)))))
+    elif action == "dates":
+        span  = (hi - lo).days
+        days  = rng.randint(7, max(7, span))
+        start = lo + timedelta(days=rng.randint(0, max(0, span - days)))
+        at.date_input[0].set_value((start, min(hi, start + timedelta(days=days))))
+    elif action == "tab":
+        if rng.random() < 0.5:
+            box = at.selectbox(key="product_category")
+            box.set_value(rng.choice(box.options))
+        else:
+            radio = widget(at.radio, "Report type")
+            radio.set_value(rng.choice(radio.options))
+    return at.run()
+
+
+def run_session(Session, idx, args, start_at, results):
+    rng = random.Random(args.seed * 1_000_003 + idx)
+    time.sleep(max(0.0, start_at - time.perf_counter()))
+    at = Session(APP, default_timeout=args.timeout)
+
+    def timed(action, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+            error = at.run_error()
+        except Exception as e:
+            where = traceback.extract_tb(e.__traceback__)[-1]
+            error = (f"{type(e).__name__}: {e} "
+                     f"({os.path.basename(where.filename)}:{where.lineno})")
+        record = {"session": idx, "action": action,
+                  "ms": (time.perf_counter() - t0) * 1000, "error": error}
+        results.append(record)
+        return record
+
+    load = timed("load", at.run)
+    if load["error"]:
+        return
+    try:
+        lo, hi = at.date_input[0].value
+    except (IndexError, ValueError) as e:
+        # A page without its date filter did not render; count it, don't lose the session
+        load["error"] = f"no order-date filter on the page ({type(e).__name__}: {e})"
+        return
+    names, weights = zip(*ACTIONS)
+    broken = False
+    for _ in range(args.actions):
+        if args.think_ms:
+            time.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+        if broken:
+            # Nothing on a failed page to interact with; a user reloads it
+            broken = timed("load", at.run)["error"] is not None
+            continue
+        action = rng.choices(names, weights)[0]
+        broken = timed(action, lambda: act(at, action, rng, lo, hi))["error"] is not None
+
+
+# ─────────────────────────────────────────
+# RESOURCE SAMPLING
+# ─────────────────────────────────────────
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # macOS reports ru_maxrss in bytes, Linux in KiB
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler(threading.Thread):
+    """Tracks peak RSS while a concurrency level runs."""
+
+    def __init__(self, every_s: float = 0.1):
+        super().__init__(daemon=True)
+        self.every_s = every_s
+        self.peak    = rss_bytes()
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        while not self._stop_evt.wait(self.every_s):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self):
+        self._stop_evt.set()
+        self.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+# ─────────────────────────────────────────
+# ONE CONCURRENCY LEVEL
+# ─────────────────────────────────────────
+def pct(values, q):
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+
+def ms(value, width=0) -> str:
+    """Latency for the summary lines; — when every render at that level failed."""
+    return f"{'—' if value is None else f'{value:,.0f}':>{width}}"
+
+
+def run_level(Session, n, args, opened):
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    statements0 = sum(c.statements for c in opened)
+
+    # Cold render: first visitor after a restart
+    cold = []
+    run_session(Session, -1, argparse.Namespace(**{**vars(args), "actions": 0}),
+                time.perf_counter(), cold)
+
+    results, rss0 = [], rss_bytes()
+    sampler = RssSampler()
+    sampler.start()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    threads = [threading.Thread(target=run_session, name=f"session-{i}",
+                                args=(Session, i, args, t0 + i * args.ramp_s, results))
+               for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_s = time.perf_counter() - t0
+    cpu_s  = time.process_time() - cpu0
+    sampler.stop()
+
+    ok  = [r["ms"] for r in results if not r["error"]]
+    by_action = {}
+    for r in results:
+        if not r["error"]:
+            by_action.setdefault(r["action"], []).append(r["ms"])
+    errors = [r for r in results if r["error"]]
+    return {
+        "sessions":       n,
+        "renders":        len(results),
+        "errors":         len(errors),
+        "first_errors":   sorted({r["error"] for r in errors})[:3],
+        # A failed cold render is no cold-start latency
+        "cold_ms":        round(cold[0]["ms"], 1) if cold and not cold[0]["error"] else None,
+        "cold_error":     cold[0]["error"] if cold else None,
+        "p50_ms":         pct(ok, 50),
+        "p95_ms":         pct(ok, 95),
+        "p99_ms":         pct(ok, 99),
+        "max_ms":         round(max(ok), 1) if ok else None,
+        "by_action_p95":  {a: pct(v, 95) for a, v in sorted(by_action.items())},
+        "throughput_rps": round(len(results) / wall_s, 2),
+        "wall_s":         round(wall_s, 2),
+        "cpu_s":          round(cpu_s, 2),
+        "cpu_cores":      round(cpu_s / wall_s, 2),
+        "cpu_s_per_session": round(cpu_s / n, 3),
+        "rss_mb":         round(rss0 / 2**20, 1),
+        "peak_rss_mb":    round(sampler.peak / 2**20, 1),
+        "mb_per_session": round(max(0, sampler.peak - rss0) / 2**20 / n, 2),
+        "warehouse_statements": sum(c.statements for c in opened) - statements0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit dashboard headless")
+    parser.add_argument("--sessions",   default="8",
+                        help="Concurrent sessions; comma-separated to sweep (e.g. 1,4,16)")
+    parser.add_argument("--actions",    type=int,   default=10, help="Interactions per session")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stub latency per statement")
+    parser.add_argument("--jitter-ms",  type=float, default=25,
+                        help="Extra per-statement latency, fixed per query text + params")
+    parser.add_argument("--think-ms",   type=float, default=0,  help="Mean pause between actions")
+    parser.add_argument("--ramp-s",     type=float, default=0.0, help="Delay between session starts")
+    parser.add_argument("--backend",    choices=["local", "warehouse"],
+                        default=os.environ.get("DASHBOARD_BACKEND", "local"),
+                        help="DASHBOARD_BACKEND for the app under test")
+    parser.add_argument("--seed",       type=int,   default=42)
+    parser.add_argument("--timeout",    type=float, default=120, help="Per-render timeout (s)")
+    parser.add_argument("--data-dir",   default=stub_warehouse.DATA_DIR)
+    parser.add_argument("--json",       help="Also write results to this file")
+    args = parser.parse_args()
+    levels = [int(n) for n in args.sessions.split(",")]
+
+    os.environ["DASHBOARD_BACKEND"] = args.backend
+    os.environ.setdefault("DASHBOARD_PROFILE", "0")
+    for var in ("SNOWFLAKE_ACCOUNT", "SNOWFLAKE_USER", "SNOWFLAKE_PASSWORD"):
+        os.environ.setdefault(var, "stub")
+
+    print("\n🧪  Dashboard load test")
+    print("=" * 60)
+    print(f"   backend={args.backend}  latency={args.latency_ms:.0f}+{args.jitter_ms:.0f}ms  "
+          f"actions/session={args.actions}  seed={args.seed}")
+    opened = stub_warehouse.install(args.latency_ms / 1000, args.jitter_ms / 1000, args.data_dir)
+    install_runtime()
+    Session = session_class()
+
+    runs = []
+    for n in levels:
+        print(f"\n▶  {n} concurrent session{'s' if n != 1 else ''} ...")
+        r = run_level(Session, n, args, opened)
+        runs.append(r)
+        print(f"   cold {ms(r['cold_ms'])} ms · p50 {ms(r['p50_ms'])} · p95 {ms(r['p95_ms'])} · "
+              f"p99 {ms(r['p99_ms'])} ms · {r['throughput_rps']} renders/s")
+        print(f"   CPU {r['cpu_s']:.1f}s ({r['cpu_cores']} cores, {r['cpu_s_per_session']}s/session) · "
+              f"RSS {r['rss_mb']:,.0f}→{r['peak_rss_mb']:,.0f} MB ({r['mb_per_session']} MB/session)")
+        if r["cold_error"]:
+            print(f"   ⚠️  cold render failed: {r['cold_error']}")
+        if r["errors"]:
+            print(f"   ⚠️  {r['errors']} failed renders (left out of the percentiles): {r['first_errors']}")
+
+    print(f"\n{'sessions':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>7} {'cores':>6} "
+          f"{'MB/sess':>8} {'errors':>7}")
+    for r in runs:
+        print(f"{r['sessions']:>8} {ms(r['p50_ms'], 8)} {ms(r['p95_ms'], 8)} {ms(r['p99_ms'], 8)} "
+              f"{r['throughput_rps']:>7} {r['cpu_cores']:>6} {r['mb_per_session']:>8} {r['errors']:>7}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "levels": runs}, f, indent=2)
+        print(f"\n✅  Results → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,53 +4,380 @@ Usage:
     python scripts/run_pipeline.py           # full pipeline
     python scripts/run_pipeline.py --data    # generate data only
     python scripts/run_pipeline.py --etl     # load to Snowflake only
+    python scripts/run_pipeline.py --tableau # rebuild the Tableau CSVs only
+    python scripts/run_pipeline.py --snapshot  # refresh dashboard warm-start snapshot only
     python scripts/run_pipeline.py --report  # generate AI report only
     python scripts/run_pipeline.py --app     # launch Streamlit app
+    python scripts/run_pipeline.py --force   # rerun steps even when their inputs are unchanged
+    python scripts/run_pipeline.py --subprocess  # run each step in its own interpreter
+
+The steps form a small DAG:
+
+    data ──┬──► tableau
+           └──► etl ──┬──► snapshot
+                      └──► report
+
+Each step declares the data, SQL and environment settings it reads; its code
+is its script plus every project module reachable from it through imports
+(found by parsing them, so a new import needs no bookkeeping). A step is
+skipped when the hash of all that (plus the keys of the steps it depends on)
+matches its last successful run and its outputs still exist. Steps whose
+dependencies are done run in parallel (the Tableau export next to the
+warehouse load, the snapshot next to the report).
+
+Steps run in this process by default: each is its module's main(), so
+pandas, the Snowflake connector and the rest are imported once for the whole
+run, and the generated tables are handed to the Tableau export and the
+warehouse load as DataFrames instead of being read back from data/raw/.
+--subprocess runs every step in a fresh interpreter instead.
+
+Each run writes a trace of every step and its sub-phases to logs/traces/
+(see etl/tracing.py); with --subprocess each step writes its own.
 """
 import argparse
+import ast
+import glob
+import hashlib
+import importlib
+import json
+import os
 import subprocess
 import sys
-import os
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
 
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PYTHON = sys.executable
+STATE_PATH = os.path.join(ROOT, "cache", "pipeline_state.json")
+sys.path.insert(0, ROOT)
+
+from etl import tracing
+
+RAW_CSVS     = [f"data/raw/{t}.csv" for t in ("suppliers", "products", "customers", "orders", "shipments")]
+TABLEAU_CSVS = [f"data/tableau/vw_{v}.csv" for v in
+                ("monthly_revenue", "product_performance", "supplier_scorecard",
+                 "regional_summary", "carrier_performance")]
+SNOWFLAKE_ENV = ["SNOWFLAKE_ACCOUNT", "SNOWFLAKE_USER", "SNOWFLAKE_WAREHOUSE",
+                 "SNOWFLAKE_DATABASE", "SNOWFLAKE_SCHEMA"]
+
+# fn: "module:function" run in-process, with args and, under takes, keyword
+# arguments filled from what an upstream step returned (when it ran in this
+# run); cmd: the same step as a script, for --subprocess.
+# inputs: data files / globs relative to ROOT besides the step's code (see
+# local_modules); env: settings whose values matter
+# (never secrets); outputs: files that must exist for a cached run to count
+STEPS = {
+    "data": {
+        "label":   "Generate synthetic data",
+        "fn":      "data.generate_data:main",
+        "cmd":     ["data/generate_data.py"],
+        "deps":    [],
+        "inputs":  [],
+        "env":     [],
+        "outputs": RAW_CSVS,
+    },
+    "tableau": {
+        "label":   "Export Tableau CSVs",
+        "fn":      "data.generate_tableau_csvs:main",
+        "takes":   {"tables": "data"},
+        "cmd":     ["data/generate_tableau_csvs.py"],
+        "deps":    ["data"],
+        "inputs":  RAW_CSVS,
+        "env":     [],
+        "outputs": TABLEAU_CSVS,
+    },
+    "etl": {
+        "label":   "ETL: Load data to Snowflake",
+        "fn":      "etl.load_snowflake:main",
+        "takes":   {"tables": "data"},
+        "cmd":     ["etl/load_snowflake.py"],
+        "deps":    ["data"],
+        "inputs":  ["sql/schema.sql", "sql/create_views.sql", *RAW_CSVS],
+        "env":     SNOWFLAKE_ENV,
+        "outputs": [],
+    },
+    "snapshot": {
+        "label":   "Snapshot dashboard data for warm start",
+        "fn":      "etl.snapshot:main",
+        "cmd":     ["etl/snapshot.py"],
+        "deps":    ["etl"],
+        "inputs":  [],
+        "env":     SNOWFLAKE_ENV + ["DASHBOARD_SNAPSHOT_DIR"],
+        "outputs": [os.path.join(os.environ.get("DASHBOARD_SNAPSHOT_DIR", "data/snapshot"),
+                                 "manifest.json")],
+    },
+    "report": {
+        "label":   "Generate AI report",
+        "fn":      "ai.report_generator:main",
+        "args":    ["weekly"],
+        "cmd":     ["ai/report_generator.py", "weekly"],
+        "deps":    ["etl"],
+        "inputs":  [],
+        "env":     SNOWFLAKE_ENV + ["REPORT_SNAPSHOT_TOKEN_BUDGET"],
+        # One report per day, even when nothing upstream changed
+        "outputs": [f"reports/report_weekly_{date.today().isoformat()}.md"],
+    },
+}
+
+_print_lock = threading.RLock()
+
+
+def say(*lines):
+    with _print_lock:
+        for line in lines:
+            print(line, flush=True)
+
+
+class StepOutput:
+    """sys.stdout stand-in that prefixes each line with the step printing it.
+
+    Which step is printing is tracked per thread; output from any other
+    thread passes straight through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local  = threading.local()
+
+    def write(self, text):
+        name = getattr(self.local, "name", None)
+        if name is None:
+            return self.stream.write(text)
+        *lines, self.local.partial = (self.local.partial + text).split("\n")
+        with _print_lock:
+            for line in lines:
+                self.stream.write(f"  [{name}] {line}\n")
+            self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, attr):
+        return getattr(self.stream, attr)
+
+    def start(self, name):
+        self.local.name, self.local.partial = name, ""
+
+    def stop(self):
+        if self.local.partial:
+            self.write("\n")
+        self.local.name = None
 
 
-def step(label: str, cmd: list[str]):
-    print(f"\n{'='*60}")
-    print(f"  {label}")
-    print(f"{'='*60}")
-    result = subprocess.run(cmd, cwd=ROOT)
-    if result.returncode != 0:
-        print(f"\n❌  Step failed: {label}")
-        sys.exit(result.returncode)
-    print(f"✅  Done: {label}")
+# ─────────────────────────────────────────
+# STEP CACHE
+# ─────────────────────────────────────────
+def load_state() -> dict:
+    try:
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = f"{STATE_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STATE_PATH)
+
+
+def local_modules(script: str) -> list:
+    """`script` plus every project module it imports, directly or through
+    another project module; imports inside functions count too."""
+    seen, todo = set(), [script]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        try:
+            with open(os.path.join(ROOT, path)) as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                # `from etl import warehouse` names a module; `from etl.warehouse import connect` a function
+                names = [node.module, *(f"{node.module}.{alias.name}" for alias in node.names)]
+            else:
+                continue
+            for module in names:
+                rel = module.replace(".", "/") + ".py"
+                if os.path.isfile(os.path.join(ROOT, rel)):
+                    todo.append(rel)
+    return sorted(seen)
+
+
+def step_key(name: str, keys: dict) -> str:
+    """Hash of a step's command, code, input file contents, env settings and upstream keys."""
+    spec = STEPS[name]
+    h = hashlib.sha256(json.dumps(spec["cmd"]).encode())
+    paths = [os.path.join(ROOT, p) for p in local_modules(spec["cmd"][0])]
+    for pattern in spec["inputs"]:
+        paths += sorted(glob.glob(os.path.join(ROOT, pattern))) or [os.path.join(ROOT, pattern)]
+    for path in paths:
+        h.update(os.path.relpath(path, ROOT).encode())
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+        except OSError:
+            h.update(b"<missing>")
+    for var in spec["env"]:
+        h.update(f"{var}={os.environ.get(var, '')}".encode())
+    for dep in spec["deps"]:
+        h.update(keys.get(dep, "").encode())
+    return h.hexdigest()
+
+
+def is_fresh(name: str, key: str, state: dict) -> bool:
+    if state.get(name, {}).get("key") != key:
+        return False
+    return all(os.path.exists(os.path.join(ROOT, out)) for out in STEPS[name]["outputs"])
+
+
+# ─────────────────────────────────────────
+# RUNNER
+# ─────────────────────────────────────────
+def call_step(name: str, artifacts: dict) -> int:
+    """Run one step's function in this process; its return value goes into artifacts."""
+    spec = STEPS[name]
+    module, func = spec["fn"].split(":")
+    kwargs = {arg: artifacts[dep] for arg, dep in spec.get("takes", {}).items() if dep in artifacts}
+    out = sys.stdout if isinstance(sys.stdout, StepOutput) else None
+    if out:
+        out.start(name)
+    try:
+        artifacts[name] = getattr(importlib.import_module(module), func)(*spec.get("args", []), **kwargs)
+        return 0
+    except SystemExit as e:
+        # Same exit status the step would have as a script: sys.exit() and
+        # sys.exit(None) succeed, sys.exit("message") fails
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    except Exception:
+        print(traceback.format_exc().rstrip())
+        return 1
+    finally:
+        if out:
+            out.stop()
+
+
+def run_step(name: str) -> int:
+    """Run one step as a subprocess, streaming its output prefixed with the step name."""
+    proc = subprocess.Popen([PYTHON, *STEPS[name]["cmd"]], cwd=ROOT, text=True, bufsize=1,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    for line in proc.stdout:
+        say(f"  [{name}] {line.rstrip()}")
+    return proc.wait()
+
+
+def traced_step(name: str, artifacts: dict, subprocesses: bool) -> int:
+    with tracing.span("step", step=name) as sp:
+        code = run_step(name) if subprocesses else call_step(name, artifacts)
+        sp.set(exit_code=code)
+    return code
+
+
+def run_dag(selected: list, force: bool = False, jobs: int = 4, subprocesses: bool = False) -> dict:
+    """Run `selected` steps in dependency order, in parallel where possible.
+
+    Dependencies outside `selected` are taken as already done (their last
+    recorded key is used). Returns name → "ran" / "cached" / "failed" / "blocked".
+    """
+    state, keys, status, artifacts = load_state(), {}, {}, {}
+    for name in STEPS:
+        if name not in selected:
+            keys[name] = state.get(name, {}).get("key", "")
+    pending = [n for n in STEPS if n in selected]   # STEPS is in topological order
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="step") as pool:
+        while pending or running:
+            for name in list(pending):
+                deps = [d for d in STEPS[name]["deps"] if d in selected]
+                if any(status.get(d) in ("failed", "blocked") for d in deps):
+                    status[name] = "blocked"
+                    pending.remove(name)
+                    say(f"⏭️   {name}: skipped — upstream step failed")
+                    continue
+                if not all(status.get(d) in ("ran", "cached") for d in deps):
+                    continue
+                pending.remove(name)
+                keys[name] = step_key(name, keys)
+                if not force and is_fresh(name, keys[name], state):
+                    status[name] = "cached"
+                    say(f"♻️   {STEPS[name]['label']} — inputs unchanged, skipped")
+                    continue
+                say("", "=" * 60, f"  ▶  {STEPS[name]['label']}  ({name})", "=" * 60)
+                fut = pool.submit(tracing.bind(traced_step), name, artifacts, subprocesses)
+                running[fut] = (name, time.perf_counter())
+
+            if not running:
+                if pending:   # only possible with a dependency cycle in STEPS
+                    raise RuntimeError(f"Unrunnable steps: {pending}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name, t0 = running.pop(fut)
+                code, secs = fut.result(), time.perf_counter() - t0
+                if code == 0:
+                    status[name] = "ran"
+                    state[name] = {"key": keys[name], "seconds": round(secs, 2),
+                                   "finished_at": datetime.now().isoformat(timespec="seconds")}
+                    save_state(state)
+                    say(f"✅  Done: {STEPS[name]['label']} ({secs:.1f}s)")
+                else:
+                    status[name] = "failed"
+                    say(f"❌  Step failed: {STEPS[name]['label']} (exit {code})")
+    return status
 
 
 def main():
     parser = argparse.ArgumentParser(description="Supply Chain Analytics pipeline runner")
     parser.add_argument("--data",   action="store_true", help="Generate synthetic data only")
     parser.add_argument("--etl",    action="store_true", help="Load data to Snowflake only")
+    parser.add_argument("--tableau", action="store_true", help="Export the Tableau CSVs only")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Write the dashboard warm-start snapshot only")
     parser.add_argument("--report", action="store_true", help="Generate AI report only")
     parser.add_argument("--app",    action="store_true", help="Launch Streamlit app only")
+    parser.add_argument("--force",  action="store_true", help="Rerun steps even if their inputs are unchanged")
+    parser.add_argument("--jobs",   type=int, default=4, help="Steps to run at once")
+    parser.add_argument("--subprocess", action="store_true",
+                        help="Run each step in its own Python process instead of in this one")
     args = parser.parse_args()
 
-    run_all = not any([args.data, args.etl, args.report, args.app])
+    selected = [n for n in STEPS if getattr(args, n)]
+    run_all = not selected and not args.app
+    if run_all:
+        selected = list(STEPS)
 
     print("\n🏭  Supply Chain Analytics Pipeline")
     print("=" * 60)
 
-    if args.data or run_all:
-        step("Step 1/3 — Generate synthetic data",
-             [PYTHON, "data/generate_data.py"])
-
-    if args.etl or run_all:
-        step("Step 2/3 — ETL: Load data to Snowflake",
-             [PYTHON, "etl/load_snowflake.py"])
-
-    if args.report or run_all:
-        step("Step 3/3 — Generate AI report",
-             [PYTHON, "ai/report_generator.py", "weekly"])
+    if not args.subprocess:
+        sys.stdout = StepOutput(sys.stdout)
+    t0 = time.perf_counter()
+    status = {}
+    if selected:
+        with tracing.trace("pipeline") as sp:
+            status = run_dag(selected, force=args.force, jobs=args.jobs, subprocesses=args.subprocess)
+            sp.set(status=status)
+    if status:
+        print(f"\n⏱️   {time.perf_counter() - t0:.1f}s · " +
+              " · ".join(f"{n} {s}" for n, s in status.items()))
+    if any(s in ("failed", "blocked") for s in status.values()):
+        sys.exit(1)
 
     if args.app or run_all:
         print("\n🚀  Launching Streamlit dashboard ...")
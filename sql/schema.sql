@@ -74,3 +74,15 @@ CREATE OR REPLACE TABLE SHIPMENTS (
     delay_days          INT,
     shipment_cost       FLOAT
 );
+
+-- ─────────────────────────────────────────
+-- LOAD WATERMARK
+-- One row per successful ETL run. Readers key their caches on the
+-- latest load_id, so it is never replaced — only appended to.
+-- ─────────────────────────────────────────
+
+CREATE TABLE IF NOT EXISTS ETL_LOAD_LOG (
+    load_id      VARCHAR(32)    PRIMARY KEY,
+    loaded_at    TIMESTAMP_NTZ  DEFAULT CURRENT_TIMESTAMP(),
+    rows_loaded  INT
+);
@@ -3,8 +3,10 @@ Supply Chain Analytics — Command Center
 Warm amber/teal dark theme · Sankey · Waterfall · Calendar heatmap ·
 Parallel coordinates · Asymmetric masonry layout
 """
-import os, sys, json
-from datetime import date
+import os, sys, json, time, hashlib, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
 import streamlit as st
 import pandas as pd
 import plotly.express as px
@@ -15,6 +17,10 @@ from dotenv import load_dotenv
 load_dotenv()
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
+from etl import timeseries
+
+_RUN_T0 = time.perf_counter()
+
 # ─────────────────────────────────────────
 # PAGE CONFIG
 # ─────────────────────────────────────────
@@ -188,6 +194,15 @@ section[data-testid="stSidebar"] { display: none; }
   background: #1f1b16 !important; border-color: #2e2820 !important; color: #e8e0d5 !important;
 }
 
+/* ── Filter bar ── */
+.stMultiSelect > div > div, .stDateInput > div > div {
+  background: #1f1b16 !important; border-color: #2e2820 !important; color: #e8e0d5 !important;
+}
+.stMultiSelect label, .stDateInput label {
+  color: #7a6e62 !important; font-size: 11px !important;
+  text-transform: uppercase; letter-spacing: 1px;
+}
+
 /* ── Dataframe ── */
 .stDataFrame { border-radius: 10px; overflow: hidden; }
 </style>
@@ -198,23 +213,249 @@ section[data-testid="stSidebar"] { display: none; }
 # SNOWFLAKE
 # ─────────────────────────────────────────
 @st.cache_resource
-def get_conn():
-    import snowflake.connector
-    return snowflake.connector.connect(
-        account   = os.environ["SNOWFLAKE_ACCOUNT"],
-        user      = os.environ["SNOWFLAKE_USER"],
-        password  = os.environ["SNOWFLAKE_PASSWORD"],
-        warehouse = os.environ.get("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH"),
-        database  = os.environ.get("SNOWFLAKE_DATABASE", "SUPPLY_CHAIN"),
-        schema    = os.environ.get("SNOWFLAKE_SCHEMA",   "ANALYTICS"),
+def get_pool():
+    """One bounded connection pool per server process, shared by every session."""
+    from etl import warehouse
+    return warehouse.ConnectionPool()
+
+# How long a data-version probe is trusted before the warehouse is asked again.
+VERSION_PROBE_TTL = int(os.environ.get("DATA_VERSION_PROBE_TTL", "30"))
+
+# "local" answers every tab from an in-process DuckDB copy of the fact data,
+# refreshed once per data version; "warehouse" sends each query to Snowflake.
+BACKEND = os.environ.get("DASHBOARD_BACKEND", "local")
+
+@st.cache_resource(show_spinner=False)
+def warm_start():
+    """Working set from the post-ETL snapshot (etl/snapshot.py), if there is one."""
+    from etl import snapshot
+    return snapshot.read()
+
+class VersionWatch:
+    """The data version pages render at, revalidated off the render path.
+
+    Starts at the snapshot's version when there is one, so the first render
+    never waits on the warehouse. From then on, a rerun that finds the last
+    probe older than VERSION_PROBE_TTL starts a background probe; a new
+    version is prepared (its working set loaded) before it is published, so
+    sessions switch to it without blocking. The watch thread never touches
+    Streamlit itself; `prepared` hands the result to the next rerun.
+
+    With no snapshot, the first render of the process revalidates in the
+    foreground; concurrent first renders wait for that one pull instead of
+    each starting their own.
+    """
+
+    def __init__(self, probe, prepare, ttl, version=None, prepared=None):
+        self._probe     = probe
+        self._prepare   = prepare
+        self._ttl       = ttl
+        self._lock      = threading.Lock()
+        self._cold      = threading.Lock()   # held by the one cold-start revalidation
+        self._busy      = False
+        self._checked   = float("-inf")
+        self.version    = version
+        self.prepared   = prepared  # prepare(version)'s result, for the current version
+        self.confirmed  = False     # has the warehouse agreed with self.version yet?
+        self.error      = None
+
+    def current(self):
+        if self.version is None:
+            # Nothing to render from yet — wait for the warehouse. If that
+            # caller fails, the next waiter in line tries again.
+            with self._cold:
+                if self.version is None:
+                    self._revalidate()
+            return self.version
+        with self._lock:
+            due = not self._busy and time.monotonic() - self._checked >= self._ttl
+            self._busy |= due
+        if due:
+            threading.Thread(target=self._revalidate, name="version-watch", daemon=True).start()
+        return self.version
+
+    def _revalidate(self):
+        try:
+            version = self._probe()
+            if version != self.version:
+                self.prepared = self._prepare(version)
+            self.version, self.confirmed, self.error = version, True, None
+        except Exception as e:
+            self.error = e          # keep serving the version we have
+            if self.version is None:
+                raise
+        finally:
+            with self._lock:
+                self._checked, self._busy = time.monotonic(), False
+
+@st.cache_resource
+def version_watch():
+    from etl import warehouse, snapshot
+    pool, snap = get_pool(), warm_start()
+    # Local: map the version's published snapshot (publishing it first if no
+    # worker has yet). Warehouse: nothing to prepare.
+    prepare = ((lambda version: snapshot.load(pool, version)) if BACKEND == "local"
+               else (lambda version: None))
+    return VersionWatch(
+        probe=lambda: warehouse.data_version(pool),
+        prepare=prepare,
+        ttl=VERSION_PROBE_TTL,
+        version=snap.version if snap else None,
+        prepared=snap,
     )
 
-@st.cache_data(ttl=300)
-def q(sql):
-    cur = get_conn().cursor()
-    cur.execute(sql)
-    cols = [d[0].lower() for d in cur.description]
-    return pd.DataFrame(cur.fetchall(), columns=cols)
+@st.cache_resource(max_entries=2, show_spinner="Loading working set …")
+def working_set(version):
+    ready = version_watch().prepared
+    if ready is not None and ready.version == version:
+        return ready
+    from etl import snapshot
+    return snapshot.load(get_pool(), version)
+
+# How many times _q_page's body has run on this thread. st.cache_data runs it
+# on the calling session's own script thread, and only on a miss, so
+# q_page() tells a miss from a hit by comparing the count around its call.
+_page_fetches = threading.local()
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _q_page(queries, version):
+    _page_fetches.n = getattr(_page_fetches, "n", 0) + 1
+    # Until the warehouse has confirmed the snapshot, serve it locally either way
+    if BACKEND == "local" or not version_watch().confirmed:
+        return working_set(version).fetch_many(queries)
+    from etl import warehouse
+    return warehouse.fetch_many(get_pool(), queries)
+
+def q_page(queries, version, label="page"):
+    """Submit every query a render needs as one batch.
+
+    Cached per data version rather than on a timer: frames stay valid until
+    the ETL publishes a new load, and a new load is picked up on the next probe.
+    """
+    fetches = getattr(_page_fetches, "n", 0)
+    t0 = time.perf_counter()
+    batch = _q_page(queries, version)
+    prof.record_batch(label, queries, batch, hit=getattr(_page_fetches, "n", 0) == fetches,
+                      lookup_s=time.perf_counter() - t0)
+    return batch
+
+
+# ─────────────────────────────────────────
+# AI REPORT
+# ─────────────────────────────────────────
+@st.cache_resource
+def claude_client():
+    import anthropic
+    return anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+
+REPORT_STORE_ENTRIES = 8
+
+@st.cache_resource
+def report_store():
+    """Finished reports by (data version, report type), shared by all sessions."""
+    return OrderedDict()
+
+def ai_report(version, report_type, placeholder):
+    """One Claude call per (data version, report type), streamed into placeholder.
+
+    The KPI snapshot goes through q_page like any tab, so it is answered from
+    the working set (or the pool) and cached for the version. Deltas are
+    rendered as they arrive; the finished report is kept in report_store().
+    """
+    store = report_store()
+    if (version, report_type) in store:
+        return store[(version, report_type)]
+
+    from ai import anomaly_screen, report_generator as rg
+    if report_type == "anomaly":
+        # Screened locally; Claude only narrates when there are findings
+        batch = q_page(rg.ANOMALY_QUERIES, version, label="ai_report")
+        data  = anomaly_screen.context(batch.frames)
+    else:
+        batch = q_page(rg.SNAPSHOT_QUERIES, version, label="ai_report")
+        data  = rg.snapshot_from_frames(batch.frames)
+    parts, shown = [], 0.0
+    for delta in rg.stream_report(data, claude_client(), report_type):
+        parts.append(delta)
+        if time.perf_counter() - shown > 0.05:     # at most ~20 redraws a second
+            placeholder.markdown(f'<div class="rpt">{"".join(parts).replace(chr(10), "<br>")}▍</div>',
+                                 unsafe_allow_html=True)
+            shown = time.perf_counter()
+    rpt = {"text": "".join(parts), "model": rg.CLAUDE_MODEL,
+           "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M")}
+    store[(version, report_type)] = rpt
+    while len(store) > REPORT_STORE_ENTRIES:
+        store.popitem(last=False)
+    return rpt
+
+# ─────────────────────────────────────────
+# PROFILER  (opt-in: ?profile=1 or DASHBOARD_PROFILE=1)
+# ─────────────────────────────────────────
+PROFILE_LOG = os.environ.get("DASHBOARD_PROFILE_LOG",
+                             os.path.join(os.path.dirname(__file__), "..", "logs",
+                                          "dashboard_profile.jsonl"))
+
+class Profiler:
+    """Query, figure and total timings for one script rerun."""
+
+    def __init__(self, enabled, t0):
+        self.enabled = enabled
+        self.t0      = t0
+        self.queries = []
+        self.figures = []
+
+    def record_batch(self, label, queries, batch, hit, lookup_s):
+        if not self.enabled:
+            return
+        for name, query in queries.items():
+            sql = query if isinstance(query, str) else query[0]
+            df  = batch.frames[name]
+            self.queries.append({
+                "batch":       label,
+                "query":       name,
+                "fingerprint": hashlib.sha1(" ".join(sql.split()).encode()).hexdigest()[:12],
+                "cache":       "hit" if hit else "miss",
+                "rows":        len(df),
+                "bytes":       int(df.memory_usage(deep=True).sum()),
+                # A hit costs one lookup for the whole batch; a miss, the query itself
+                "latency_ms":  round((lookup_s if hit else batch.timings[name]) * 1000, 2),
+            })
+
+    @contextmanager
+    def figure(self, name):
+        rec = {"figure": name}
+        if not self.enabled:
+            yield rec
+            return
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            self.figures.append(rec)
+
+    def finish(self, **context):
+        """Close the rerun and append it to PROFILE_LOG as one JSON line."""
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        record = {
+            "ts":       datetime.now().isoformat(timespec="seconds"),
+            "session":  ctx.session_id if ctx else None,
+            "rerun_ms": round((time.perf_counter() - self.t0) * 1000, 2),
+            **context,
+            "queries":  self.queries,
+            "figures":  self.figures,
+        }
+        os.makedirs(os.path.dirname(PROFILE_LOG), exist_ok=True)
+        with open(PROFILE_LOG, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+        return record
+
+prof = Profiler(
+    enabled=(st.query_params.get("profile", "") in ("1", "true")
+             or os.environ.get("DASHBOARD_PROFILE", "") in ("1", "true")),
+    t0=_RUN_T0,
+)
 
 
 # ─────────────────────────────────────────
@@ -231,6 +472,8 @@ T    = dict(
     hoverlabel=dict(bgcolor="#1f1b16", font_color="#f0e6d3", bordercolor="#2e2820"),
 )
 AXIS = dict(gridcolor=GRID, linecolor=GRID, zerolinecolor=GRID)
+TREND_HOVER_FORMAT = {"day": "%d %b %Y", "week": "Wk of %d %b %Y", "month": "%b %Y",
+                      "quarter": "Q%q %Y", "year": "%Y"}
 
 def th(fig, h=None):
     fig.update_layout(**T)
@@ -241,25 +484,571 @@ def th(fig, h=None):
 
 
 # ─────────────────────────────────────────
-# GLOBAL DATA (fetched once for ticker)
+# PAGE QUERIES
+# Every query a render needs is declared here and submitted together,
+# so the page waits on the slowest query rather than the sum of them.
+# Written against the base tables in SQL that both Snowflake and the
+# local DuckDB working set accept. `{f}` marks where the header filters
+# are spliced in as bind-parameter predicates on ORDERS (alias o);
+# `{grain}` is the trend chart's DATE_TRUNC part from etl/timeseries.
 # ─────────────────────────────────────────
-@st.cache_data(ttl=300)
-def global_kpis():
-    return q("""
+PAGE_QUERIES = {
+    # Ticker
+    "ticker": """
+        WITH d AS (
+            SELECT o.supplier_name, sh.carrier, sh.on_time
+            FROM ORDERS o JOIN SHIPMENTS sh ON o.order_id = sh.order_id
+            WHERE o.status='Delivered' {f}
+        ),
+        sup AS (SELECT supplier_name, SUM(CASE WHEN on_time THEN 1 ELSE 0 END)*100.0/COUNT(*) AS otr
+                FROM d GROUP BY 1),
+        car AS (SELECT carrier, SUM(CASE WHEN on_time THEN 1 ELSE 0 END)*100.0/COUNT(*) AS otr
+                FROM d GROUP BY 1)
         SELECT ROUND(SUM(revenue)/1e6,2) AS rev_m,
                ROUND(SUM(revenue-cogs)/NULLIF(SUM(revenue),0)*100,2) AS margin,
                COUNT(DISTINCT order_id) AS orders,
-               (SELECT ROUND(AVG(on_time_rate_pct),1) FROM VW_SUPPLIER_SCORECARD) AS otr,
-               (SELECT ROUND(AVG(on_time_pct),1) FROM VW_CARRIER_PERFORMANCE) AS carrier_otr
-        FROM ORDERS WHERE status='Delivered'
-    """).iloc[0]
+               (SELECT ROUND(AVG(otr),1) FROM sup) AS otr,
+               (SELECT ROUND(AVG(otr),1) FROM car) AS carrier_otr
+        FROM ORDERS o WHERE o.status='Delivered' {f}
+    """,
+    # Tab 1 — Overview
+    "kpis": """
+        SELECT ROUND(SUM(revenue),2) r, ROUND(SUM(cogs),2) c,
+               ROUND(SUM(revenue-cogs),2) p,
+               ROUND(SUM(revenue-cogs)/NULLIF(SUM(revenue),0)*100,2) m,
+               COUNT(DISTINCT order_id) o, ROUND(AVG(revenue),2) aov
+        FROM ORDERS o WHERE o.status='Delivered' {f}
+    """,
+    "placed": """
+        SELECT COUNT(*) n,
+               COALESCE(SUM(CASE WHEN o.status='Cancelled' THEN 1 ELSE 0 END),0) cancelled,
+               MIN(o.order_date) lo, MAX(o.order_date) hi
+        FROM ORDERS o WHERE 1=1 {f}
+    """,
+    "waterfall": """
+        SELECT category,
+               ROUND(SUM(revenue),0) AS revenue,
+               ROUND(SUM(cogs),0) AS cogs,
+               ROUND(SUM(revenue-cogs),0) AS profit
+        FROM ORDERS o WHERE o.status='Delivered' {f}
+        GROUP BY 1 ORDER BY revenue DESC
+    """,
+    "funnel": """
+        SELECT status, COUNT(*) AS n FROM ORDERS o WHERE 1=1 {f} GROUP BY 1
+        ORDER BY CASE status
+          WHEN 'Delivered' THEN 1 WHEN 'Shipped' THEN 2
+          WHEN 'Processing' THEN 3 WHEN 'Cancelled' THEN 4 END
+    """,
+    "trend": """
+        SELECT DATE_TRUNC('{grain}', o.order_date) AS period,
+               ROUND(SUM(revenue),2) AS revenue,
+               ROUND(SUM(revenue-cogs),2) AS gross_profit,
+               COUNT(DISTINCT order_id) AS orders
+        FROM ORDERS o WHERE o.status='Delivered' {f}
+        GROUP BY 1 ORDER BY 1
+    """,
+    # Heatmap shows one year, so only that year's days leave the engine
+    "daily": """
+        SELECT order_date, COUNT(*) AS orders, ROUND(SUM(revenue),0) AS revenue
+        FROM ORDERS o WHERE o.order_date >= ? {f} GROUP BY 1 ORDER BY 1
+    """,
+    # Tab 2 — Products
+    "products": """
+        SELECT product_name, category, sub_category,
+               COUNT(DISTINCT order_id) AS orders,
+               SUM(quantity) AS units_sold,
+               ROUND(SUM(revenue),2) AS revenue,
+               ROUND(SUM(revenue-cogs),2) AS gross_profit,
+               ROUND(SUM(revenue-cogs)/NULLIF(SUM(revenue),0)*100,2) AS margin_pct,
+               ROUND(AVG(discount)*100,1) AS avg_discount_pct
+        FROM ORDERS o WHERE o.status='Delivered' {f}
+        GROUP BY 1,2,3 ORDER BY revenue DESC
+    """,
+    "category_tree": """
+        SELECT category, sub_category,
+               ROUND(SUM(revenue),0) revenue, ROUND(SUM(revenue-cogs),0) profit
+        FROM ORDERS o WHERE o.status='Delivered' {f}
+        GROUP BY 1,2
+    """,
+    # Tab 3 — Suppliers
+    "suppliers": """
+        SELECT o.supplier_name, o.supplier_country, s.category AS supplier_category,
+               ROUND(SUM(CASE WHEN sh.on_time THEN 1 ELSE 0 END)*100.0
+                     /NULLIF(COUNT(DISTINCT sh.shipment_id),0),2) AS on_time_rate_pct,
+               ROUND(AVG(sh.delay_days),2) AS avg_delay_days,
+               COUNT(DISTINCT sh.shipment_id) AS total_shipments,
+               ROUND(SUM(sh.shipment_cost),2) AS total_shipping_cost,
+               ROUND(SUM(o.revenue),2) AS revenue_handled,
+               s.reliability_score
+        FROM ORDERS o
+        JOIN SHIPMENTS sh ON o.order_id = sh.order_id
+        JOIN SUPPLIERS s  ON o.supplier_id = s.supplier_id
+        WHERE o.status='Delivered' {f}
+        GROUP BY o.supplier_name, o.supplier_country, s.category, s.reliability_score
+        ORDER BY on_time_rate_pct
+    """,
+    "supply_flow": """
+        SELECT o.supplier_name, o.category,
+               ROUND(SUM(o.revenue),0) AS revenue
+        FROM ORDERS o WHERE o.status='Delivered' {f}
+        GROUP BY 1,2
+        HAVING SUM(o.revenue) > 100000
+        ORDER BY revenue DESC
+        LIMIT 30
+    """,
+    # Tab 4 — Logistics
+    "carriers": """
+        SELECT sh.carrier,
+               COUNT(*) AS total_shipments,
+               SUM(CASE WHEN sh.on_time THEN 1 ELSE 0 END) AS on_time_shipments,
+               ROUND(SUM(CASE WHEN sh.on_time THEN 1 ELSE 0 END)*100.0/NULLIF(COUNT(*),0),2) AS on_time_pct,
+               ROUND(AVG(sh.delay_days),2) AS avg_delay_days,
+               ROUND(AVG(sh.shipment_cost),2) AS avg_shipment_cost,
+               ROUND(SUM(sh.shipment_cost),2) AS total_shipment_cost
+        FROM SHIPMENTS sh JOIN ORDERS o ON sh.order_id = o.order_id
+        WHERE o.status='Delivered' {f}
+        GROUP BY 1 ORDER BY on_time_pct DESC
+    """,
+    "fulfillment": """
+        SELECT o.region,
+               ROUND(AVG(DATEDIFF('day', o.order_date, sh.actual_delivery)),1) avg_days,
+               ROUND(AVG(sh.delay_days),2) avg_delay,
+               ROUND(AVG(sh.shipment_cost),2) avg_cost,
+               COUNT(*) shipments
+        FROM ORDERS o JOIN SHIPMENTS sh ON o.order_id = sh.order_id
+        WHERE o.status='Delivered' {f}
+        GROUP BY o.region ORDER BY avg_days DESC
+    """,
+}
+
+FILTER_OPTION_QUERIES = {
+    "dates":      "SELECT MIN(order_date) lo, MAX(order_date) hi FROM ORDERS",
+    "regions":    "SELECT DISTINCT region FROM ORDERS ORDER BY 1",
+    "segments":   "SELECT DISTINCT segment FROM ORDERS ORDER BY 1",
+    "suppliers":  "SELECT DISTINCT supplier_name FROM ORDERS ORDER BY 1",
+    "categories": "SELECT DISTINCT category FROM ORDERS ORDER BY 1",
+}
+
+# Header filter → ORDERS column it constrains
+FILTER_COLUMNS = {
+    "region":   "region",
+    "segment":  "segment",
+    "supplier": "supplier_name",
+    "category": "category",
+}
+
+def filter_predicates(filters):
+    """AND-ed predicates for the active filters, with ? placeholders and their values."""
+    sql, params = "", []
+    if filters.get("dates"):
+        sql += " AND o.order_date BETWEEN ? AND ?"
+        params += list(filters["dates"])
+    for key, col in FILTER_COLUMNS.items():
+        values = filters.get(key)
+        if values:
+            sql += f" AND o.{col} IN ({', '.join('?' * len(values))})"
+            params += list(values)
+    return sql, params
+
+def bind(template, filters, **fmt):
+    """Render a `{f}` query template into a (sql, params) pair for the given filters."""
+    pred, params = filter_predicates(filters)
+    return template.format(f=pred, **fmt), tuple(params) * template.count("{f}")
 
-gk = global_kpis()
 
 # ─────────────────────────────────────────
-# TICKER + HEADER
+# FIGURES
+# Each builder is a pure function of its query frames (plus plain kwargs),
+# so a figure's JSON is fully determined by the data version, the bound
+# queries it reads and the theme — which is exactly what chart() keys on.
 # ─────────────────────────────────────────
-st.markdown(f"""
+FIGURE_CACHE_ENTRIES = int(os.environ.get("DASHBOARD_FIGURE_CACHE_ENTRIES", "256"))
+FIGURE_CACHE_MB      = float(os.environ.get("DASHBOARD_FIGURE_CACHE_MB", "64"))
+THEME_KEY = hashlib.sha1(json.dumps([T, AXIS, TREND_HOVER_FORMAT],
+                                    sort_keys=True).encode()).hexdigest()[:12]
+
+class FigureCache:
+    """LRU of serialized figure JSON, bounded by entry count and total bytes.
+
+    Shared by every session in the process; an entry for an old data version
+    simply ages out, since its key can no longer be asked for.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.nbytes      = 0
+        self.hits        = 0
+        self.misses      = 0
+        self._specs      = OrderedDict()
+        self._lock       = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._specs.move_to_end(key)
+            return spec
+
+    def put(self, key, spec):
+        with self._lock:
+            if key in self._specs:
+                return
+            self._specs[key] = spec
+            self.nbytes += len(spec)
+            while self._specs and (len(self._specs) > self.max_entries
+                                   or self.nbytes > self.max_bytes):
+                _, old = self._specs.popitem(last=False)
+                self.nbytes -= len(old)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._specs), "kib": round(self.nbytes / 1024, 1),
+                    "hits": self.hits, "misses": self.misses}
+
+@st.cache_resource
+def figure_cache():
+    return FigureCache(FIGURE_CACHE_ENTRIES, int(FIGURE_CACHE_MB * 1024 * 1024))
+
+PLOTLY_CONFIG = json.dumps({"showLink": False, "linkText": False})   # st.plotly_chart's defaults
+
+def show_spec(spec):
+    """st.plotly_chart(fig, use_container_width=True) for an already serialized
+    figure. st.plotly_chart rebuilds and validates a go.Figure from whatever it
+    is given (a dict included), which costs more than building the figure did;
+    the cached JSON is sent to the frontend as it is instead."""
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart
+    proto = PlotlyChart()
+    proto.use_container_width = True
+    proto.figure.spec   = spec
+    proto.figure.config = PLOTLY_CONFIG
+    proto.theme = "streamlit"
+    st._main._enqueue("plotly_chart", proto)   # into the active `with` container
+
+def chart(name, builder, *inputs, **kw):
+    """Render builder(*page frames, **kw), reusing the serialized figure when the
+    same version, queries, theme and kwargs were rendered before in this process."""
+    with prof.figure(name) as rec:
+        key = hashlib.sha1(json.dumps(
+            [name, version, THEME_KEY, [queries[i] for i in inputs], kw],
+            default=str).encode()).hexdigest()
+        cache = figure_cache()
+        spec  = cache.get(key)
+        rec["cache"] = "miss" if spec is None else "hit"
+        if spec is None:
+            fig = builder(*(page[i] for i in inputs), **kw)
+            if fig is None:
+                return
+            spec = fig.to_json()
+            cache.put(key, spec)
+        show_spec(spec)
+
+def supplier_risk(sup):
+    sup = sup.copy()
+    sup["risk"] = sup["on_time_rate_pct"].apply(
+        lambda v: "HIGH" if v < 85 else ("MEDIUM" if v < 92 else "LOW"))
+    return sup
+
+def fig_waterfall(wf):
+    # Horizontal grouped bar as a waterfall proxy
+    fig = go.Figure()
+    fig.add_trace(go.Bar(name="COGS",        y=wf["category"], x=wf["cogs"],
+                          orientation="h", marker_color="#2e2820",
+                          marker_line_width=0))
+    fig.add_trace(go.Bar(name="Gross Profit", y=wf["category"], x=wf["profit"],
+                          orientation="h", marker_color="#f0a500",
+                          marker_line_width=0,
+                          text=[f"${v/1000:.0f}K" for v in wf["profit"]],
+                          textposition="outside",
+                          textfont=dict(size=11, color="#7a6e62")))
+    fig.update_layout(**T, height=360, barmode="stack",
+        yaxis=dict(autorange="reversed", gridcolor="rgba(0,0,0,0)"),
+        xaxis=dict(tickprefix="$", tickformat=",.0f"),
+    )
+    return fig
+
+def fig_funnel(funnel_df):
+    fig2 = go.Figure(go.Funnel(
+        y=funnel_df["status"],
+        x=funnel_df["n"],
+        marker=dict(color=["#2ec4a9","#4e9eff","#f0a500","#e05c4b"],
+                    line=dict(width=0)),
+        textinfo="value+percent initial",
+        textfont=dict(size=13, color="#f0e6d3"),
+        connector=dict(line=dict(color=GRID, width=1)),
+    ))
+    fig2.update_layout(**T, height=360)
+    return fig2
+
+def fig_trend(trend, grain):
+    trend = trend.copy()
+    trend["period"] = pd.to_datetime(trend["period"])
+    # Lines are capped at one vertex per MIN_PX_PER_POINT even if the grain overshoots
+    line = timeseries.downsample(trend, "period", "revenue", timeseries.max_points())
+    xfmt = TREND_HOVER_FORMAT[grain]
+
+    fig3 = make_subplots(specs=[[{"secondary_y": True}]])
+    fig3.add_trace(go.Scatter(
+        x=line["period"], y=line["revenue"],
+        fill="tozeroy", fillcolor="rgba(240,165,0,0.08)",
+        line=dict(color="#f0a500", width=2.5), name="Revenue",
+        hovertemplate=f"<b>%{{x|{xfmt}}}</b><br>Revenue: $%{{y:,.0f}}<extra></extra>",
+    ), secondary_y=False)
+    fig3.add_trace(go.Scatter(
+        x=line["period"], y=line["gross_profit"],
+        line=dict(color="#2ec4a9", width=1.5, dash="dot"), name="Gross Profit",
+        hovertemplate=f"<b>%{{x|{xfmt}}}</b><br>Profit: $%{{y:,.0f}}<extra></extra>",
+    ), secondary_y=False)
+    fig3.add_trace(go.Bar(
+        x=trend["period"], y=trend["orders"],
+        marker_color="rgba(155,109,255,0.2)", name="Orders",
+    ), secondary_y=True)
+
+    fig3.update_layout(**T, height=280,
+        yaxis =dict(tickprefix="$", gridcolor=GRID),
+        yaxis2=dict(gridcolor="rgba(0,0,0,0)", overlaying="y", side="right"),
+    )
+    return fig3
+
+def fig_heatmap(daily):
+    daily = daily.copy()
+    daily["order_date"] = pd.to_datetime(daily["order_date"])
+    daily["dow"] = daily["order_date"].dt.dayofweek
+    daily["week"] = daily["order_date"].dt.isocalendar().week.astype(int)
+    daily["year"] = daily["order_date"].dt.year
+
+    # Show just the latest year in range for visual clarity
+    d24 = daily[daily["year"] == daily["year"].max()].copy()
+    if d24.empty:
+        return None
+    pivot = d24.pivot_table(index="dow", columns="week", values="orders", aggfunc="sum").fillna(0)
+    days = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+    fig4 = go.Figure(go.Heatmap(
+        z=pivot.values,
+        x=[str(w) for w in pivot.columns],
+        y=[days[i] for i in pivot.index],
+        colorscale=[[0,"#1a1612"],[0.3,"#3d2800"],[0.7,"#8a5a00"],[1,"#f0a500"]],
+        showscale=False,
+        hovertemplate="Week %{x} · %{y}<br>Orders: %{z:.0f}<extra></extra>",
+        xgap=2, ygap=3,
+    ))
+    th(fig4, h=200)
+    fig4.update_layout(margin=dict(l=0,r=0,t=10,b=0))
+    fig4.update_xaxes(showgrid=False, showticklabels=False, linecolor="rgba(0,0,0,0)")
+    fig4.update_yaxes(showgrid=False, linecolor="rgba(0,0,0,0)", tickfont=dict(size=10))
+    return fig4
+
+def fig_top_products(prod):
+    top = prod.head(12)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=top["product_name"], x=top["revenue"],
+        orientation="h", name="Revenue",
+        marker=dict(color="rgba(240,165,0,0.18)", line=dict(color="#f0a500", width=1.5)),
+        hovertemplate="%{y}<br>Revenue: $%{x:,.0f}<extra></extra>",
+    ))
+    fig.add_trace(go.Bar(
+        y=top["product_name"], x=top["gross_profit"],
+        orientation="h", name="Gross Profit",
+        marker=dict(color="#2ec4a9"),
+        hovertemplate="%{y}<br>Profit: $%{x:,.0f}<extra></extra>",
+    ))
+    fig.update_layout(**T, height=420, barmode="overlay",
+        yaxis=dict(autorange="reversed", gridcolor="rgba(0,0,0,0)"),
+        xaxis=dict(tickprefix="$"),
+    )
+    return fig
+
+def fig_treemap(cat_agg):
+    fig2 = px.treemap(cat_agg, path=["category","sub_category"],
+                       values="revenue", color="profit",
+                       color_continuous_scale=[[0,"#1a1612"],[0.5,"#8a5a00"],[1,"#f0a500"]])
+    fig2.update_traces(
+        texttemplate="<b>%{label}</b><br>$%{value:,.0f}",
+        textfont=dict(size=11, color="#f0e6d3"),
+        marker_line_width=2, marker_line_color="#111010",
+    )
+    fig2.update_layout(**T, height=420, coloraxis_showscale=False)
+    return fig2
+
+def fig_parcoords(prod):
+    fig3 = go.Figure(go.Parcoords(
+        line=dict(
+            color=prod["margin_pct"],
+            colorscale=[[0,"#e05c4b"],[0.5,"#f0a500"],[1,"#2ec4a9"]],
+            showscale=True,
+            colorbar=dict(title="Margin %", tickfont=dict(color="#7a6e62"),
+                          titlefont=dict(color="#7a6e62"), bgcolor=BG,
+                          outlinecolor=GRID),
+        ),
+        dimensions=[
+            dict(label="Revenue",      values=prod["revenue"],       tickformat="$,.0f"),
+            dict(label="Gross Profit", values=prod["gross_profit"],   tickformat="$,.0f"),
+            dict(label="Units Sold",   values=prod["units_sold"]),
+            dict(label="Orders",       values=prod["orders"]),
+            dict(label="Margin %",     values=prod["margin_pct"],    range=[0,100]),
+            dict(label="Discount %",   values=prod["avg_discount_pct"], range=[0,20]),
+        ],
+    ))
+    th(fig3, h=320)
+    fig3.update_traces(
+        unselected_line_color="rgba(46,196,169,0.1)",
+        labelangle=0,
+        labelfont=dict(color="#c4b8aa", size=11),
+    )
+    return fig3
+
+def fig_supplier_bubble(sup):
+    sup = supplier_risk(sup)
+    fig = px.scatter(sup, x="avg_delay_days", y="on_time_rate_pct",
+                      size="revenue_handled", color="risk",
+                      hover_name="supplier_name",
+                      size_max=55, text="supplier_name",
+                      color_discrete_map={"HIGH":"#e05c4b","MEDIUM":"#f0a500","LOW":"#2ec4a9"},
+                      labels={"avg_delay_days":"Avg Delay (days)","on_time_rate_pct":"On-Time Rate %"})
+    fig.update_traces(textposition="top center",
+                       textfont=dict(size=9, color="#c4b8aa"),
+                       marker=dict(line=dict(width=1.5, color="#111010")))
+    fig.add_hline(y=92, line_dash="dot", line_color="#2e2820",
+                   annotation_text="  92% target", annotation_font_color="#7a6e62")
+    fig.update_layout(**T, height=420, showlegend=True)
+    return fig
+
+def fig_sankey(flow):
+    suppliers = list(flow["supplier_name"].unique())
+    categories = list(flow["category"].unique())
+    all_nodes  = suppliers + categories
+    node_idx   = {n: i for i, n in enumerate(all_nodes)}
+
+    node_colors = (["rgba(240,165,0,0.8)"] * len(suppliers) +
+                   ["rgba(46,196,169,0.8)"]  * len(categories))
+
+    fig_s = go.Figure(go.Sankey(
+        arrangement="snap",
+        node=dict(
+            pad=20, thickness=18, line=dict(color="#111010", width=1),
+            label=all_nodes, color=node_colors,
+            hovertemplate="%{label}<extra></extra>",
+        ),
+        link=dict(
+            source=[node_idx[s] for s in flow["supplier_name"]],
+            target=[node_idx[c] for c in flow["category"]],
+            value=flow["revenue"].tolist(),
+            color=["rgba(240,165,0,0.12)"] * len(flow),
+            hovertemplate="$%{value:,.0f}<extra></extra>",
+        ),
+    ))
+    th(fig_s, h=380)
+    fig_s.update_layout(font=dict(size=11, color="#c4b8aa"))
+    return fig_s
+
+def fig_carrier_lollipop(carrier):
+    srt = carrier.sort_values("on_time_pct")
+    fig = go.Figure()
+    # Stems
+    for _, r in srt.iterrows():
+        fig.add_shape(type="line",
+            x0=0, x1=r["on_time_pct"], y0=r["carrier"], y1=r["carrier"],
+            line=dict(color=GRID, width=1.5))
+    # Dots
+    color = ["#e05c4b" if v<90 else "#f0a500" if v<95 else "#2ec4a9"
+             for v in srt["on_time_pct"]]
+    fig.add_trace(go.Scatter(
+        x=srt["on_time_pct"], y=srt["carrier"],
+        mode="markers+text",
+        marker=dict(size=18, color=color, line=dict(width=2, color="#111010")),
+        text=[f"{v:.1f}%" for v in srt["on_time_pct"]],
+        textposition="middle right",
+        textfont=dict(size=11, color="#c4b8aa"),
+        hovertemplate="%{y}<br>On-Time: %{x:.1f}%<extra></extra>",
+    ))
+    fig.add_vline(x=92, line_dash="dot", line_color="#2e2820",
+                   annotation_text="Target 92%", annotation_font_color="#7a6e62",
+                   annotation_position="top right")
+    fig.update_layout(**T, height=340, showlegend=False,
+        xaxis=dict(range=[80,100], ticksuffix="%"),
+        yaxis=dict(gridcolor="rgba(0,0,0,0)"),
+    )
+    return fig
+
+def fig_delivery_days(fulfill):
+    fig2 = go.Figure()
+    fig2.add_trace(go.Bar(
+        y=fulfill["region"], x=fulfill["avg_days"],
+        orientation="h", name="Total Days",
+        marker=dict(
+            color=fulfill["avg_delay"],
+            colorscale=[[0,"#0c2018"],[0.5,"#3d2800"],[1,"#5c1a12"]],
+            showscale=False, line=dict(width=0),
+        ),
+        text=[f"{d:.1f}d" for d in fulfill["avg_days"]],
+        textposition="outside", textfont=dict(size=11, color="#7a6e62"),
+    ))
+    fig2.update_layout(**T, height=340,
+        yaxis=dict(autorange="reversed", gridcolor="rgba(0,0,0,0)"),
+        xaxis=dict(title="Days"),
+    )
+    return fig2
+
+
+watch   = version_watch()
+version = watch.current()
+opts    = q_page(FILTER_OPTION_QUERIES, version, label="filter_options")
+
+# ─────────────────────────────────────────
+# TICKER + HEADER  (filled in once the page data is back)
+# ─────────────────────────────────────────
+header = st.empty()
+
+# ─────────────────────────────────────────
+# GLOBAL FILTERS
+# ─────────────────────────────────────────
+lo, hi = (pd.Timestamp(v).date() for v in opts["dates"].iloc[0])
+_, c_dates, c_region, c_segment, c_supplier, _ = st.columns([0.25, 2, 2, 2, 3, 0.25])
+with c_dates:
+    picked = st.date_input("Order date", value=(lo, hi), min_value=lo, max_value=hi)
+with c_region:
+    regions = st.multiselect("Region", opts["regions"]["region"].tolist(), placeholder="All regions")
+with c_segment:
+    segments = st.multiselect("Segment", opts["segments"]["segment"].tolist(), placeholder="All segments")
+with c_supplier:
+    sup_pick = st.multiselect("Supplier", opts["suppliers"]["supplier_name"].tolist(),
+                              placeholder="All suppliers")
+
+filters = {
+    # A half-picked range (one date) keeps the full range until the second click
+    "dates":    tuple(picked) if len(picked) == 2 and tuple(picked) != (lo, hi) else None,
+    "region":   regions,
+    "segment":  segments,
+    "supplier": sup_pick,
+}
+# Products tab category picker — read from session state so it can be pushed
+# into the products query, which is fetched before the tab renders.
+category = st.session_state.get("product_category", "All")
+
+# Trend grain follows the visible range so the chart only gets drawable points
+start, end = filters["dates"] or (lo, hi)
+grain = timeseries.pick_grain(start, end)
+
+queries = {name: bind(sql, filters, grain=grain) for name, sql in PAGE_QUERIES.items()}
+daily_sql, daily_params = queries["daily"]
+queries["daily"] = (daily_sql, (date(end.year, 1, 1),) + daily_params)
+if category != "All":
+    queries["products"] = bind(PAGE_QUERIES["products"], {**filters, "category": [category]})
+
+page = q_page(queries, version)
+gk = page["ticker"].iloc[0]
+# Orders placed under the current filters: denominator of the KPI tiles and
+# the range shown in the header
+placed = page["placed"].iloc[0]
+n_placed = int(placed["n"])
+date_span = (f"{pd.Timestamp(placed['lo']):%b %Y} – {pd.Timestamp(placed['hi']):%b %Y}"
+             if n_placed else "no orders in range")
+
+header.markdown(f"""
 <div class="ticker-strip">
   <span class="ticker-item">REVENUE &nbsp;<span>${gk['rev_m']}M</span></span>
   <span class="ticker-item">MARGIN &nbsp;<span class="ticker-up">{gk['margin']}%</span></span>
@@ -271,7 +1060,7 @@ st.markdown(f"""
 <div class="page-header">
   <div>
     <div class="page-title">Supply Chain <em>Command Center</em></div>
-    <div class="page-meta">SUPPLY_CHAIN.ANALYTICS &nbsp;·&nbsp; Jan 2022 – Dec 2024 &nbsp;·&nbsp; 10,000 orders</div>
+    <div class="page-meta">SUPPLY_CHAIN.ANALYTICS &nbsp;·&nbsp; {date_span} &nbsp;·&nbsp; {n_placed:,} orders &nbsp;·&nbsp; data {version[:12]}{"" if watch.confirmed else " (snapshot)"}</div>
   </div>
   <div class="live-dot">Live · Snowflake</div>
 </div>
@@ -293,15 +1082,11 @@ with t1:
     st.markdown('<div class="tab-body">', unsafe_allow_html=True)
 
     # ── KPI tiles ──
-    k = q("""
-        SELECT ROUND(SUM(revenue),2) r, ROUND(SUM(cogs),2) c,
-               ROUND(SUM(revenue-cogs),2) p,
-               ROUND(SUM(revenue-cogs)/NULLIF(SUM(revenue),0)*100,2) m,
-               COUNT(DISTINCT order_id) o, ROUND(AVG(revenue),2) aov
-        FROM ORDERS WHERE status='Delivered'
-    """).iloc[0]
+    k = page["kpis"].iloc[0]
 
-    cancelled = int(q("SELECT COUNT(*) n FROM ORDERS WHERE status='Cancelled'").iloc[0,0])
+    cancelled = int(placed["cancelled"])
+    delivered_pct = int(k['o']) / n_placed * 100 if n_placed else 0.0
+    cancelled_pct = cancelled / n_placed * 100 if n_placed else 0.0
 
     st.markdown(f"""
     <div class="kpi-strip">
@@ -320,8 +1105,8 @@ with t1:
       <div class="kpi-tile">
         <div class="kpi-tile-label">Delivered Orders</div>
         <div class="kpi-tile-value">{int(k['o']):,}</div>
-        <div class="kpi-tile-sub">of 10,000 placed</div>
-        <div class="kpi-bar"><div class="kpi-bar-fill fill-purple" style="width:{int(k['o'])/100}%"></div></div>
+        <div class="kpi-tile-sub">of {n_placed:,} placed</div>
+        <div class="kpi-bar"><div class="kpi-bar-fill fill-purple" style="width:{delivered_pct:.1f}%"></div></div>
       </div>
       <div class="kpi-tile">
         <div class="kpi-tile-label">Avg Order Value</div>
@@ -332,8 +1117,8 @@ with t1:
       <div class="kpi-tile">
         <div class="kpi-tile-label">Cancelled Orders</div>
         <div class="kpi-tile-value kpi-red">{cancelled:,}</div>
-        <div class="kpi-tile-sub">{cancelled/100:.1f}% of total</div>
-        <div class="kpi-bar"><div class="kpi-bar-fill fill-red" style="width:{cancelled/100:.1f}%"></div></div>
+        <div class="kpi-tile-sub">{cancelled_pct:.1f}% of total</div>
+        <div class="kpi-bar"><div class="kpi-bar-fill fill-red" style="width:{cancelled_pct:.1f}%"></div></div>
       </div>
     </div>
     """, unsafe_allow_html=True)
@@ -343,109 +1128,19 @@ with t1:
 
     with col_left:
         st.markdown('<p class="sh">Revenue Waterfall — Cost Breakdown</p>', unsafe_allow_html=True)
-        wf = q("""
-            SELECT category,
-                   ROUND(SUM(revenue),0) AS revenue,
-                   ROUND(SUM(cogs),0) AS cogs,
-                   ROUND(SUM(revenue-cogs),0) AS profit
-            FROM ORDERS WHERE status='Delivered'
-            GROUP BY 1 ORDER BY revenue DESC
-        """)
-        # Horizontal grouped bar as a waterfall proxy
-        fig = go.Figure()
-        fig.add_trace(go.Bar(name="COGS",        y=wf["category"], x=wf["cogs"],
-                              orientation="h", marker_color="#2e2820",
-                              marker_line_width=0))
-        fig.add_trace(go.Bar(name="Gross Profit", y=wf["category"], x=wf["profit"],
-                              orientation="h", marker_color="#f0a500",
-                              marker_line_width=0,
-                              text=[f"${v/1000:.0f}K" for v in wf["profit"]],
-                              textposition="outside",
-                              textfont=dict(size=11, color="#7a6e62")))
-        fig.update_layout(**T, height=360, barmode="stack",
-            yaxis=dict(autorange="reversed", gridcolor="rgba(0,0,0,0)"),
-            xaxis=dict(tickprefix="$", tickformat=",.0f"),
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        chart("waterfall", fig_waterfall, "waterfall")
 
     with col_right:
         st.markdown('<p class="sh">Order Pipeline — Funnel</p>', unsafe_allow_html=True)
-        funnel_df = q("""
-            SELECT status, COUNT(*) AS n FROM ORDERS GROUP BY 1
-            ORDER BY CASE status
-              WHEN 'Delivered' THEN 1 WHEN 'Shipped' THEN 2
-              WHEN 'Processing' THEN 3 WHEN 'Cancelled' THEN 4 END
-        """)
-        fig2 = go.Figure(go.Funnel(
-            y=funnel_df["status"],
-            x=funnel_df["n"],
-            marker=dict(color=["#2ec4a9","#4e9eff","#f0a500","#e05c4b"],
-                        line=dict(width=0)),
-            textinfo="value+percent initial",
-            textfont=dict(size=13, color="#f0e6d3"),
-            connector=dict(line=dict(color=GRID, width=1)),
-        ))
-        fig2.update_layout(**T, height=360)
-        st.plotly_chart(fig2, use_container_width=True)
-
-    # ── Monthly trend — Candlestick-style (OHLC monthly) ──
-    st.markdown('<p class="sh" style="margin-top:8px">Monthly Revenue — Open / High / Low / Close (Quarterly Candles)</p>', unsafe_allow_html=True)
-    monthly = q("SELECT month, revenue, gross_profit, orders FROM VW_MONTHLY_REVENUE ORDER BY month")
-    monthly["month"] = pd.to_datetime(monthly["month"])
-
-    fig3 = make_subplots(specs=[[{"secondary_y": True}]])
-    fig3.add_trace(go.Scatter(
-        x=monthly["month"], y=monthly["revenue"],
-        fill="tozeroy", fillcolor="rgba(240,165,0,0.08)",
-        line=dict(color="#f0a500", width=2.5), name="Revenue",
-        hovertemplate="<b>%{x|%b %Y}</b><br>Revenue: $%{y:,.0f}<extra></extra>",
-    ), secondary_y=False)
-    fig3.add_trace(go.Scatter(
-        x=monthly["month"], y=monthly["gross_profit"],
-        line=dict(color="#2ec4a9", width=1.5, dash="dot"), name="Gross Profit",
-        hovertemplate="<b>%{x|%b %Y}</b><br>Profit: $%{y:,.0f}<extra></extra>",
-    ), secondary_y=False)
-    fig3.add_trace(go.Bar(
-        x=monthly["month"], y=monthly["orders"],
-        marker_color="rgba(155,109,255,0.2)", name="Orders",
-    ), secondary_y=True)
+        chart("funnel", fig_funnel, "funnel")
 
-    fig3.update_layout(**T, height=280,
-        yaxis =dict(tickprefix="$", gridcolor=GRID),
-        yaxis2=dict(gridcolor="rgba(0,0,0,0)", overlaying="y", side="right"),
-    )
-    st.plotly_chart(fig3, use_container_width=True)
+    # ── Revenue trend — grain picked from the visible range ──
+    st.markdown(f'<p class="sh" style="margin-top:8px">{timeseries.GRAIN_LABELS[grain]} Revenue — Revenue / Profit / Orders</p>', unsafe_allow_html=True)
+    chart("trend", fig_trend, "trend", grain=grain)
 
     # ── Calendar heatmap (daily orders density) ──
     st.markdown('<p class="sh">Daily Order Volume — Calendar Heatmap</p>', unsafe_allow_html=True)
-    daily = q("""
-        SELECT order_date, COUNT(*) AS orders, ROUND(SUM(revenue),0) AS revenue
-        FROM ORDERS GROUP BY 1 ORDER BY 1
-    """)
-    daily["order_date"] = pd.to_datetime(daily["order_date"])
-    daily["dow"] = daily["order_date"].dt.dayofweek
-    daily["week"] = daily["order_date"].dt.isocalendar().week.astype(int)
-    daily["year"] = daily["order_date"].dt.year
-
-    # Show just 2024 for visual clarity
-    d24 = daily[daily["year"] == 2024].copy()
-    if not d24.empty:
-        pivot = d24.pivot_table(index="dow", columns="week", values="orders", aggfunc="sum").fillna(0)
-        days = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-        fig4 = go.Figure(go.Heatmap(
-            z=pivot.values,
-            x=[str(w) for w in pivot.columns],
-            y=[days[i] for i in pivot.index],
-            colorscale=[[0,"#1a1612"],[0.3,"#3d2800"],[0.7,"#8a5a00"],[1,"#f0a500"]],
-            showscale=False,
-            hovertemplate="Week %{x} · %{y}<br>Orders: %{z:.0f}<extra></extra>",
-            xgap=2, ygap=3,
-        ))
-        th(fig4, h=200)
-        fig4.update_layout(margin=dict(l=0,r=0,t=10,b=0))
-        fig4.update_xaxes(showgrid=False, showticklabels=False, linecolor="rgba(0,0,0,0)")
-        fig4.update_yaxes(showgrid=False, linecolor="rgba(0,0,0,0)", tickfont=dict(size=10))
-        st.plotly_chart(fig4, use_container_width=True)
+    chart("heatmap", fig_heatmap, "daily")
 
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -456,85 +1151,24 @@ with t1:
 with t2:
     st.markdown('<div class="tab-body">', unsafe_allow_html=True)
 
-    prod = q("""
-        SELECT product_name, category, sub_category, orders,
-               units_sold, revenue, gross_profit, margin_pct, avg_discount_pct
-        FROM VW_PRODUCT_PERFORMANCE ORDER BY revenue DESC
-    """)
+    prod = page["products"]
 
-    cats = ["All"] + sorted(prod["category"].unique().tolist())
-    sel  = st.selectbox("Filter", cats, label_visibility="collapsed")
-    if sel != "All": prod = prod[prod["category"] == sel]
+    cats = ["All"] + opts["categories"]["category"].tolist()
+    st.selectbox("Filter", cats, key="product_category", label_visibility="collapsed")
 
     col1, col2 = st.columns([3, 2])
 
     with col1:
         st.markdown('<p class="sh">Top Products — Revenue vs Profit Overlay</p>', unsafe_allow_html=True)
-        top = prod.head(12)
-        fig = go.Figure()
-        fig.add_trace(go.Bar(
-            y=top["product_name"], x=top["revenue"],
-            orientation="h", name="Revenue",
-            marker=dict(color="rgba(240,165,0,0.18)", line=dict(color="#f0a500", width=1.5)),
-            hovertemplate="%{y}<br>Revenue: $%{x:,.0f}<extra></extra>",
-        ))
-        fig.add_trace(go.Bar(
-            y=top["product_name"], x=top["gross_profit"],
-            orientation="h", name="Gross Profit",
-            marker=dict(color="#2ec4a9"),
-            hovertemplate="%{y}<br>Profit: $%{x:,.0f}<extra></extra>",
-        ))
-        fig.update_layout(**T, height=420, barmode="overlay",
-            yaxis=dict(autorange="reversed", gridcolor="rgba(0,0,0,0)"),
-            xaxis=dict(tickprefix="$"),
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        chart("top_products", fig_top_products, "products")
 
     with col2:
         st.markdown('<p class="sh">Category Treemap</p>', unsafe_allow_html=True)
-        cat_agg = q("""
-            SELECT category, sub_category,
-                   ROUND(SUM(revenue),0) revenue, ROUND(SUM(gross_profit),0) profit
-            FROM VW_PRODUCT_PERFORMANCE GROUP BY 1,2
-        """)
-        fig2 = px.treemap(cat_agg, path=["category","sub_category"],
-                           values="revenue", color="profit",
-                           color_continuous_scale=[[0,"#1a1612"],[0.5,"#8a5a00"],[1,"#f0a500"]])
-        fig2.update_traces(
-            texttemplate="<b>%{label}</b><br>$%{value:,.0f}",
-            textfont=dict(size=11, color="#f0e6d3"),
-            marker_line_width=2, marker_line_color="#111010",
-        )
-        fig2.update_layout(**T, height=420, coloraxis_showscale=False)
-        st.plotly_chart(fig2, use_container_width=True)
+        chart("treemap", fig_treemap, "category_tree")
 
     # Parallel coordinates — multi-dim product view
     st.markdown('<p class="sh">Multi-Dimensional Product Analysis — Parallel Coordinates</p>', unsafe_allow_html=True)
-    fig3 = go.Figure(go.Parcoords(
-        line=dict(
-            color=prod["margin_pct"],
-            colorscale=[[0,"#e05c4b"],[0.5,"#f0a500"],[1,"#2ec4a9"]],
-            showscale=True,
-            colorbar=dict(title="Margin %", tickfont=dict(color="#7a6e62"),
-                          titlefont=dict(color="#7a6e62"), bgcolor=BG,
-                          outlinecolor=GRID),
-        ),
-        dimensions=[
-            dict(label="Revenue",      values=prod["revenue"],       tickformat="$,.0f"),
-            dict(label="Gross Profit", values=prod["gross_profit"],   tickformat="$,.0f"),
-            dict(label="Units Sold",   values=prod["units_sold"]),
-            dict(label="Orders",       values=prod["orders"]),
-            dict(label="Margin %",     values=prod["margin_pct"],    range=[0,100]),
-            dict(label="Discount %",   values=prod["avg_discount_pct"], range=[0,20]),
-        ],
-    ))
-    th(fig3, h=320)
-    fig3.update_traces(
-        unselected_line_color="rgba(46,196,169,0.1)",
-        labelangle=0,
-        labelfont=dict(color="#c4b8aa", size=11),
-    )
-    st.plotly_chart(fig3, use_container_width=True)
+    chart("parcoords", fig_parcoords, "products")
 
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -545,14 +1179,7 @@ with t2:
 with t3:
     st.markdown('<div class="tab-body">', unsafe_allow_html=True)
 
-    sup = q("""
-        SELECT supplier_name, supplier_country, supplier_category,
-               on_time_rate_pct, avg_delay_days, total_shipments,
-               total_shipping_cost, revenue_handled, reliability_score
-        FROM VW_SUPPLIER_SCORECARD ORDER BY on_time_rate_pct
-    """)
-    sup["risk"] = sup["on_time_rate_pct"].apply(
-        lambda v: "HIGH" if v < 85 else ("MEDIUM" if v < 92 else "LOW"))
+    sup = supplier_risk(page["suppliers"])
 
     # KPI row
     k1,k2,k3,k4 = st.columns(4)
@@ -571,7 +1198,7 @@ with t3:
       <div class="kpi-tile"><div class="kpi-tile-label">High Risk</div>
         <div class="kpi-tile-value {'kpi-red' if high else 'kpi-teal'}">{high}</div>
         <div class="kpi-tile-sub">OTR &lt; 85%</div>
-        <div class="kpi-bar"><div class="kpi-bar-fill fill-red" style="width:{high/len(sup)*100:.0f}%"></div></div></div>
+        <div class="kpi-bar"><div class="kpi-bar-fill fill-red" style="width:{high/max(len(sup), 1)*100:.0f}%"></div></div></div>
       <div class="kpi-tile"><div class="kpi-tile-label">Total Shipping Cost</div>
         <div class="kpi-tile-value">${sup['total_shipping_cost'].sum()/1e6:.2f}<span style="font-size:16px;color:#7a6e62">M</span></div>
         <div class="kpi-tile-sub">All shipments</div>
@@ -601,58 +1228,11 @@ with t3:
 
     with col_r:
         st.markdown('<p class="sh">Delay vs Revenue Handled — Bubble</p>', unsafe_allow_html=True)
-        fig = px.scatter(sup, x="avg_delay_days", y="on_time_rate_pct",
-                          size="revenue_handled", color="risk",
-                          hover_name="supplier_name",
-                          size_max=55, text="supplier_name",
-                          color_discrete_map={"HIGH":"#e05c4b","MEDIUM":"#f0a500","LOW":"#2ec4a9"},
-                          labels={"avg_delay_days":"Avg Delay (days)","on_time_rate_pct":"On-Time Rate %"})
-        fig.update_traces(textposition="top center",
-                           textfont=dict(size=9, color="#c4b8aa"),
-                           marker=dict(line=dict(width=1.5, color="#111010")))
-        fig.add_hline(y=92, line_dash="dot", line_color="#2e2820",
-                       annotation_text="  92% target", annotation_font_color="#7a6e62")
-        fig.update_layout(**T, height=420, showlegend=True)
-        st.plotly_chart(fig, use_container_width=True)
+        chart("supplier_bubble", fig_supplier_bubble, "suppliers")
 
     # Sankey: Supplier → Category → Revenue
     st.markdown('<p class="sh">Supply Chain Flow — Sankey Diagram</p>', unsafe_allow_html=True)
-    flow = q("""
-        SELECT o.supplier_name, o.category,
-               ROUND(SUM(o.revenue),0) AS revenue
-        FROM ORDERS o WHERE o.status='Delivered'
-        GROUP BY 1,2
-        HAVING SUM(o.revenue) > 100000
-        ORDER BY revenue DESC
-        LIMIT 30
-    """)
-
-    suppliers = list(flow["supplier_name"].unique())
-    categories = list(flow["category"].unique())
-    all_nodes  = suppliers + categories
-    node_idx   = {n: i for i, n in enumerate(all_nodes)}
-
-    node_colors = (["rgba(240,165,0,0.8)"] * len(suppliers) +
-                   ["rgba(46,196,169,0.8)"]  * len(categories))
-
-    fig_s = go.Figure(go.Sankey(
-        arrangement="snap",
-        node=dict(
-            pad=20, thickness=18, line=dict(color="#111010", width=1),
-            label=all_nodes, color=node_colors,
-            hovertemplate="%{label}<extra></extra>",
-        ),
-        link=dict(
-            source=[node_idx[s] for s in flow["supplier_name"]],
-            target=[node_idx[c] for c in flow["category"]],
-            value=flow["revenue"].tolist(),
-            color=["rgba(240,165,0,0.12)"] * len(flow),
-            hovertemplate="$%{value:,.0f}<extra></extra>",
-        ),
-    ))
-    th(fig_s, h=380)
-    fig_s.update_layout(font=dict(size=11, color="#c4b8aa"))
-    st.plotly_chart(fig_s, use_container_width=True)
+    chart("sankey", fig_sankey, "supply_flow")
 
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -663,19 +1243,13 @@ with t3:
 with t4:
     st.markdown('<div class="tab-body">', unsafe_allow_html=True)
 
-    carrier = q("SELECT * FROM VW_CARRIER_PERFORMANCE ORDER BY on_time_pct DESC")
-    fulfill = q("""
-        SELECT region,
-               ROUND(AVG(days_to_deliver),1) avg_days,
-               ROUND(AVG(delay_days),2) avg_delay,
-               ROUND(AVG(shipment_cost),2) avg_cost,
-               COUNT(*) shipments
-        FROM VW_ORDER_FULFILLMENT WHERE status='Delivered'
-        GROUP BY region ORDER BY avg_days DESC
-    """)
+    carrier = page["carriers"]
+    fulfill = page["fulfillment"]
 
-    best = carrier.loc[carrier["on_time_pct"].idxmax()]
-    worst = carrier.loc[carrier["on_time_pct"].idxmin()]
+    # Narrow filters can leave no delivered shipments to rank
+    none  = pd.Series({**dict.fromkeys(carrier.columns, 0.0), "carrier": "—"})
+    best  = carrier.loc[carrier["on_time_pct"].idxmax()] if len(carrier) else none
+    worst = carrier.loc[carrier["on_time_pct"].idxmin()] if len(carrier) else none
 
     st.markdown(f"""
     <div class="kpi-strip" style="grid-template-columns:repeat(4,1fr)">
@@ -702,53 +1276,11 @@ with t4:
 
     with col1:
         st.markdown('<p class="sh">Carrier — On-Time Rate Lollipop</p>', unsafe_allow_html=True)
-        srt = carrier.sort_values("on_time_pct")
-        fig = go.Figure()
-        # Stems
-        for _, r in srt.iterrows():
-            fig.add_shape(type="line",
-                x0=0, x1=r["on_time_pct"], y0=r["carrier"], y1=r["carrier"],
-                line=dict(color=GRID, width=1.5))
-        # Dots
-        color = ["#e05c4b" if v<90 else "#f0a500" if v<95 else "#2ec4a9"
-                 for v in srt["on_time_pct"]]
-        fig.add_trace(go.Scatter(
-            x=srt["on_time_pct"], y=srt["carrier"],
-            mode="markers+text",
-            marker=dict(size=18, color=color, line=dict(width=2, color="#111010")),
-            text=[f"{v:.1f}%" for v in srt["on_time_pct"]],
-            textposition="middle right",
-            textfont=dict(size=11, color="#c4b8aa"),
-            hovertemplate="%{y}<br>On-Time: %{x:.1f}%<extra></extra>",
-        ))
-        fig.add_vline(x=92, line_dash="dot", line_color="#2e2820",
-                       annotation_text="Target 92%", annotation_font_color="#7a6e62",
-                       annotation_position="top right")
-        fig.update_layout(**T, height=340, showlegend=False,
-            xaxis=dict(range=[80,100], ticksuffix="%"),
-            yaxis=dict(gridcolor="rgba(0,0,0,0)"),
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        chart("carrier_lollipop", fig_carrier_lollipop, "carriers")
 
     with col2:
         st.markdown('<p class="sh">Avg Days to Deliver by Region</p>', unsafe_allow_html=True)
-        fig2 = go.Figure()
-        fig2.add_trace(go.Bar(
-            y=fulfill["region"], x=fulfill["avg_days"],
-            orientation="h", name="Total Days",
-            marker=dict(
-                color=fulfill["avg_delay"],
-                colorscale=[[0,"#0c2018"],[0.5,"#3d2800"],[1,"#5c1a12"]],
-                showscale=False, line=dict(width=0),
-            ),
-            text=[f"{d:.1f}d" for d in fulfill["avg_days"]],
-            textposition="outside", textfont=dict(size=11, color="#7a6e62"),
-        ))
-        fig2.update_layout(**T, height=340,
-            yaxis=dict(autorange="reversed", gridcolor="rgba(0,0,0,0)"),
-            xaxis=dict(title="Days"),
-        )
-        st.plotly_chart(fig2, use_container_width=True)
+        chart("delivery_days", fig_delivery_days, "fulfillment")
 
     # Alert cards
     st.markdown('<p class="sh" style="margin-top:8px">Carrier Alerts</p>', unsafe_allow_html=True)
@@ -802,44 +1334,37 @@ with t5:
 
     st.markdown('<hr style="border-color:#2e2820;margin:20px 0">', unsafe_allow_html=True)
 
+    # Keep the last requested report on screen across reruns of this session
     if run_btn:
-        import anthropic as _ant
-        from ai.report_generator import fetch_kpi_snapshot, generate_report, generate_anomaly_alert
-        with st.spinner("Querying Snowflake · Generating report with Claude AI …"):
-            try:
-                import snowflake.connector as _sf
-                conn = _sf.connect(
-                    account=os.environ["SNOWFLAKE_ACCOUNT"],
-                    user=os.environ["SNOWFLAKE_USER"],
-                    password=os.environ["SNOWFLAKE_PASSWORD"],
-                    warehouse=os.environ.get("SNOWFLAKE_WAREHOUSE","COMPUTE_WH"),
-                    database=os.environ.get("SNOWFLAKE_DATABASE","SUPPLY_CHAIN"),
-                    schema=os.environ.get("SNOWFLAKE_SCHEMA","ANALYTICS"),
-                )
-                data   = fetch_kpi_snapshot(conn); conn.close()
-                client = _ant.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
-                report = generate_anomaly_alert(data, client) if "Anomaly" in rtype \
-                         else generate_report(data, client)
-
-                st.markdown(f"""
-                <div style="display:flex;gap:12px;align-items:center;margin-bottom:20px">
-                  <div style="background:#0c2018;border:1px solid rgba(46,196,169,.3);
-                              border-radius:6px;padding:5px 14px;font-size:12px;
-                              color:#2ec4a9;font-weight:600">✓ Generated {date.today()}</div>
-                  <div style="font-size:12px;color:#7a6e62;font-family:'DM Mono',monospace">
-                    claude-sonnet-4-6</div>
-                </div>
-                <div class="rpt">{report.replace(chr(10),'<br>')}</div>
-                """, unsafe_allow_html=True)
-
-                st.download_button("Download .md", report,
-                                    f"sc_report_{date.today()}.md", "text/markdown")
-            except Exception as e:
-                st.markdown(f"""
-                <div class="alert-card danger">
-                  <div class="alert-hdr">Error generating report</div>
-                  <div class="alert-txt">{e}</div>
-                </div>""", unsafe_allow_html=True)
+        st.session_state["report_for"] = (version, rtype)
+
+    if st.session_state.get("report_for") == (version, rtype):
+        badge, body = st.empty(), st.empty()
+        try:
+            body.markdown('<div class="rpt">Building KPI snapshot · Generating report with Claude AI …</div>',
+                          unsafe_allow_html=True)
+            rpt    = ai_report(version, "anomaly" if "Anomaly" in rtype else "weekly", body)
+            report = rpt["text"]
+
+            badge.markdown(f"""
+            <div style="display:flex;gap:12px;align-items:center;margin-bottom:20px">
+              <div style="background:#0c2018;border:1px solid rgba(46,196,169,.3);
+                          border-radius:6px;padding:5px 14px;font-size:12px;
+                          color:#2ec4a9;font-weight:600">✓ Generated {rpt['generated_at']}</div>
+              <div style="font-size:12px;color:#7a6e62;font-family:'DM Mono',monospace">
+                {rpt['model']} · data {version[:12]}</div>
+            </div>""", unsafe_allow_html=True)
+            body.markdown(f'<div class="rpt">{report.replace(chr(10),"<br>")}</div>',
+                          unsafe_allow_html=True)
+
+            st.download_button("Download .md", report,
+                                f"sc_report_{date.today()}.md", "text/markdown")
+        except Exception as e:
+            body.markdown(f"""
+            <div class="alert-card danger">
+              <div class="alert-hdr">Error generating report</div>
+              <div class="alert-txt">{e}</div>
+            </div>""", unsafe_allow_html=True)
     else:
         st.markdown("""
         <div class="alert-card" style="border-left-color:#2e2820;margin-bottom:24px">
@@ -863,3 +1388,53 @@ with t5:
         """, unsafe_allow_html=True)
 
     st.markdown('</div>', unsafe_allow_html=True)
+
+
+# ─────────────────────────────────────────
+# RENDER TIMINGS
+# ─────────────────────────────────────────
+with st.expander("Query timings"):
+    st.markdown(f"""
+    <div class="alert-txt" style="margin-bottom:10px">
+      {len(page.timings)} queries &nbsp;·&nbsp;
+      wall <b>{page.wall_s*1000:,.0f} ms</b> &nbsp;·&nbsp;
+      slowest {page.slowest_s*1000:,.0f} ms &nbsp;·&nbsp;
+      serial sum {page.serial_s*1000:,.0f} ms
+    </div>""", unsafe_allow_html=True)
+    st.dataframe(page.timing_table(), use_container_width=True, hide_index=True)
+    ps = get_pool().stats()
+    st.markdown(f"""
+    <div class="alert-txt">
+      Pool &nbsp;·&nbsp; {ps['in_use']}/{ps['size']} in use, {ps['idle']} idle &nbsp;·&nbsp;
+      {ps['checkouts']:,} checkouts &nbsp;·&nbsp; {ps['waits']:,} waits ({ps['wait_ms']:,.0f} ms)
+      &nbsp;·&nbsp; {ps['errors']:,} errors &nbsp;·&nbsp; {ps['reconnects']:,} reconnects
+      &nbsp;·&nbsp; {ps['evictions']:,} evicted
+    </div>""", unsafe_allow_html=True)
+    fc = figure_cache().stats()
+    st.markdown(f"""
+    <div class="alert-txt">
+      Figures &nbsp;·&nbsp; {fc['entries']} cached ({fc['kib']:,.0f} KiB) &nbsp;·&nbsp;
+      {fc['hits']:,} hits &nbsp;·&nbsp; {fc['misses']:,} misses
+    </div>""", unsafe_allow_html=True)
+
+
+# ─────────────────────────────────────────
+# PROFILER PANEL
+# ─────────────────────────────────────────
+if prof.enabled:
+    run = prof.finish(version=version, backend=BACKEND, filters=filters, grain=grain)
+    q_df = pd.DataFrame(run["queries"])
+    f_df = pd.DataFrame(run["figures"])
+    with st.expander(f"Profiler — rerun {run['rerun_ms']:,.0f} ms", expanded=False):
+        st.markdown(f"""
+        <div class="alert-txt" style="margin-bottom:10px">
+          queries {q_df['latency_ms'].sum():,.0f} ms
+          ({(q_df['cache'] == 'hit').sum()} hit / {(q_df['cache'] == 'miss').sum()} miss,
+          {q_df['rows'].sum():,} rows, {q_df['bytes'].sum()/1024:,.0f} KiB) &nbsp;·&nbsp;
+          figures {f_df['ms'].sum():,.0f} ms
+          ({(f_df['cache'] == 'hit').sum()} hit / {(f_df['cache'] == 'miss').sum()} miss) &nbsp;·&nbsp;
+          logged to {os.path.relpath(PROFILE_LOG)}
+        </div>""", unsafe_allow_html=True)
+        st.dataframe(q_df, use_container_width=True, hide_index=True)
+        st.dataframe(f_df.sort_values("ms", ascending=False),
+                     use_container_width=True, hide_index=True)
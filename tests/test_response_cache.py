@@ -0,0 +1,115 @@
+"""
+Supply Chain Analytics — Response Cache Tests
+The Claude response cache, driven through the report generator with the
+offline StubClient standing in for Anthropic: python -m pytest tests/
+"""
+import copy
+import functools
+import os
+import time
+
+import pytest
+
+from ai import report_generator as rg
+from ai import response_cache
+from ai.response_cache import ResponseCache
+from ai.stub_client import StubClient
+
+SNAPSHOT = {
+    "kpis": {"gross_revenue": 26144396.3, "margin_pct": 56.47, "total_orders": 4996},
+    "top_products": [{"product_name": "Laptop Pro 15", "revenue": 5533929.0},
+                     {"product_name": "Hydraulic Pump", "revenue": 3436745.0}],
+    "mom_trend": [{"month": "2024-12-01", "revenue": 629719.0, "mom_revenue_growth_pct": -17.7}],
+}
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Point the report generator's cache at a fresh directory."""
+    monkeypatch.setattr(response_cache, "ENABLED", True)
+    monkeypatch.setattr(rg, "ResponseCache", functools.partial(ResponseCache, path=str(tmp_path)))
+    return tmp_path
+
+
+def entries(path) -> list:
+    return sorted(f for f in os.listdir(path) if f.endswith(".json"))
+
+
+def test_identical_snapshot_is_a_hit(cache_dir):
+    client = StubClient()
+    first = rg.generate_report(SNAPSHOT, client)
+    # An equal snapshot built separately, and the streaming path
+    again = rg.generate_report(copy.deepcopy(SNAPSHOT), client)
+    streamed = "".join(rg.stream_report(SNAPSHOT, client, "weekly"))
+    assert client.calls == 1
+    assert first == again == streamed
+    assert len(entries(cache_dir)) == 1
+
+
+@pytest.mark.parametrize("change", ["template", "model", "max_tokens", "snapshot"])
+def test_changed_input_is_a_miss(cache_dir, monkeypatch, change):
+    client = StubClient()
+    rg.generate_report(SNAPSHOT, client)
+    data = SNAPSHOT
+    if change == "template":
+        monkeypatch.setattr(rg, "PROMPT_VERSION", rg.PROMPT_VERSION + "-next")
+    elif change == "model":
+        monkeypatch.setattr(rg, "CLAUDE_MODEL", "claude-other-model")
+    elif change == "max_tokens":
+        instructions, system, max_tokens = rg.REPORT_KINDS["weekly"]
+        monkeypatch.setitem(rg.REPORT_KINDS, "weekly", (instructions, system, max_tokens + 1))
+    else:
+        data = {**SNAPSHOT, "kpis": {**SNAPSHOT["kpis"], "total_orders": 4997}}
+    rg.generate_report(data, client)
+    assert client.calls == 2
+    assert len(entries(cache_dir)) == 2
+
+
+@pytest.mark.parametrize("bypass", ["use_cache", "REPORT_CACHE=0"])
+def test_bypass_neither_reads_nor_writes(cache_dir, monkeypatch, bypass):
+    client = StubClient()
+    rg.generate_report(SNAPSHOT, client)                 # one entry that a read would hit
+    before = {f: os.path.getmtime(cache_dir / f) for f in entries(cache_dir)}
+    if bypass == "REPORT_CACHE=0":
+        monkeypatch.setattr(response_cache, "ENABLED", False)
+        use_cache = True
+    else:
+        use_cache = False
+    rg.generate_report(SNAPSHOT, client, use_cache=use_cache)
+    rg.generate_report({**SNAPSHOT, "mom_trend": []}, client, use_cache=use_cache)
+    assert client.calls == 3
+    # Nothing written, and the existing entry was not read (a read refreshes its mtime)
+    assert {f: os.path.getmtime(cache_dir / f) for f in entries(cache_dir)} == before
+
+
+def test_entries_past_max_age_are_dropped(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=2**20, max_age_s=3600)
+    cache.put("old", "stale report")
+    cache.put("other", "another stale report")
+    cache.put("fresh", "current report")
+    long_ago = time.time() - 7200
+    for key in ("old", "other"):
+        os.utime(tmp_path / f"{key}.json", (long_ago, long_ago))
+
+    assert cache.get("old") is None                      # expired on read …
+    assert not (tmp_path / "old.json").exists()
+    cache.evict()                                        # … or on the next trim
+    assert entries(tmp_path) == ["fresh.json"]
+    assert cache.get("fresh")["text"] == "current report"
+
+
+def test_size_limit_evicts_least_recently_used(tmp_path):
+    text = "x" * 1000
+    cache = ResponseCache(str(tmp_path), max_bytes=10 * 2**20, max_age_s=3600)
+    cache.put("a", text)
+    cache.put("b", text)
+    entry_bytes = os.path.getsize(tmp_path / "a.json")
+    now = time.time()
+    os.utime(tmp_path / "a.json", (now - 30, now - 30))
+    os.utime(tmp_path / "b.json", (now - 20, now - 20))
+    assert cache.get("a")["text"] == text                # a read makes "a" the most recent
+
+    cache.max_bytes = int(entry_bytes * 2.5)             # room for two of three
+    cache.put("c", text)
+    assert entries(tmp_path) == ["a.json", "c.json"]
+    assert cache.stats()["entries"] == 2